@@ -0,0 +1,139 @@
+"""
+参考图缩放策略微基准
+对比 quality / balanced / fast 三种策略的解码+缩放耗时、相对 quality 的加速比和解码内存
+（单次解码+缩放使峰值 RSS 增加的量）
+
+用法:
+    python examples/benchmark_image_resize.py [图片目录，默认 ./output/pages] [--max-width 1024] [--repeat 5]
+
+目录中没有图片时，自动生成宽 1792（Gemini 2K 竖版）、2048、3584（Gemini 4K 竖版）、4096 的 PNG 和 JPEG
+样本，对应缩放比（原宽 / 目标宽）1.75、2、3.5、4。各策略只在缩放比足够大时才比 quality 快、省内存
+（见 image_processing.RESIZE_MODES）：JPEG 在 balanced 和 fast 下缩放比 ≥2 时按 1/2 起解码，
+PNG 在 balanced 下需要 ≥4 倍、fast 下需要 ≥2 倍；不到 2 倍时三种策略都全尺寸解码，fast 只省在双线性插值上
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PIL import Image, ImageDraw
+
+from src.image_gen.image_processing import RESIZE_MODES, load_resized
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+def _make_samples(directory: Path) -> list[Path]:
+    """生成类似漫画页面的样本图（线条 + 色块，避免纯色图过于好压缩）"""
+    samples = []
+    for label, size in (("1792", (1792, 2400)), ("2048", (2048, 2048)), ("3584", (3584, 4778)), ("4096", (4096, 4096))):
+        img = Image.new("RGB", size, (250, 248, 240))
+        draw = ImageDraw.Draw(img)
+        step = size[0] // 32
+        for i in range(0, size[0], step):
+            draw.line([(i, 0), (size[0] - i, size[1])], fill=(20, 20, 20), width=3)
+            draw.rectangle([i, i // 2, i + step // 2, i // 2 + step], fill=(i % 255, 120, 200))
+        for fmt, suffix in (("PNG", ".png"), ("JPEG", ".jpg")):
+            path = directory / f"sample_{label}{suffix}"
+            img.save(path, format=fmt, quality=95)
+            samples.append(path)
+    return samples
+
+
+def _peak_rss_mb() -> float:
+    """
+    当前进程的峰值 RSS
+
+    优先读取 /proc/self/status 的 VmHWM：ru_maxrss 在 exec 后保留父进程的峰值，spawn 出的子进程
+    会读到生成样本时主进程的占用
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # macOS 上 ru_maxrss 单位为字节
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _run_mode(args):
+    """
+    在新进程中运行一种策略
+
+    解码内存取第一次解码+缩放前后峰值 RSS 的差：进程的基础占用（解释器、导入的模块、图片字节）
+    在解码前已计入峰值，差值只包含解码缓冲区和缩放的中间图。Pillow 的像素缓冲区由 C 代码分配，
+    tracemalloc 统计不到
+    """
+    image_data, max_width, mode, repeat = args
+
+    # loguru 的缩放日志会干扰输出
+    from loguru import logger
+    logger.remove()
+
+    timings = []
+    decode_mb = None
+    for _ in range(repeat):
+        baseline = _peak_rss_mb()
+        started = time.perf_counter()
+        img = load_resized(image_data, max_width=max_width, resize_mode=mode)
+        img.load()
+        timings.append(time.perf_counter() - started)
+        if decode_mb is None:
+            decode_mb = _peak_rss_mb() - baseline
+        del img
+    return min(timings), sorted(timings)[len(timings) // 2], decode_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="参考图缩放策略微基准")
+    parser.add_argument("directory", nargs="?", default="./output/pages")
+    parser.add_argument("--max-width", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = Path(args.directory)
+    paths = sorted(p for p in directory.glob("*") if p.suffix.lower() in IMAGE_SUFFIXES) if directory.is_dir() else []
+    tmp_dir = None
+    if not paths:
+        tmp_dir = tempfile.TemporaryDirectory()
+        print(f"⚠️  {directory} 中没有图片，使用生成的样本\n")
+        paths = _make_samples(Path(tmp_dir.name))
+
+    ctx = multiprocessing.get_context("spawn")
+    print(
+        f"{'图片':<28}{'尺寸':>12}{'缩放比':>8}  {'策略':<10}{'最快(ms)':>10}{'中位(ms)':>10}"
+        f"{'加速比':>8}{'解码内存(MB)':>14}"
+    )
+    for path in paths:
+        image_data = path.read_bytes()
+        with Image.open(io.BytesIO(image_data)) as img:
+            size = f"{img.width}x{img.height}"
+            ratio = max(img.width / args.max_width, 1.0)
+        baseline_median = None
+        for mode in RESIZE_MODES:
+            # 每种策略一个新进程，峰值 RSS 互不影响
+            with ctx.Pool(1) as pool:
+                best, median, decode_mb = pool.apply(_run_mode, ((image_data, args.max_width, mode, args.repeat),))
+            # 加速比：quality 的中位耗时 / 本策略的中位耗时
+            baseline_median = baseline_median or median
+            print(
+                f"{path.name:<28}{size:>12}{ratio:>8.2f}  {mode:<10}"
+                f"{best * 1000:>10.1f}{median * 1000:>10.1f}{baseline_median / median:>7.2f}x{decode_mb:>14.1f}"
+            )
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
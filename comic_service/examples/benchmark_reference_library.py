@@ -0,0 +1,95 @@
+"""
+参考图库启动基准
+生成一个旧格式（JSON 内嵌 base64）的人物库，对比迁移前后管理器启动的耗时和内存
+
+用法:
+    python examples/benchmark_reference_library.py [--count 300]
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from PIL import Image
+
+from src.image_gen.character_manager import CharacterManager
+from src.models.character import Character
+
+
+def _make_legacy_library(directory: Path, count: int):
+    """生成旧格式的人物文件（参考图 base64 内嵌在 JSON 中，旁边另有一份 .jpg）"""
+    for i in range(count):
+        img = Image.frombytes("RGB", (1024, 1024), os.urandom(1024 * 1024 * 3)).resize((1024, 1024))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=75)
+        data = buffer.getvalue()
+
+        image_path = directory / f"char_{i:04d}.jpg"
+        image_path.write_bytes(data)
+        record = {
+            "character_id": f"char_{i:04d}",
+            "name": f"角色{i}",
+            "description": "测试角色",
+            "reference_image": {
+                "base64": f"data:image/jpeg;base64,{base64.b64encode(data).decode()}",
+                "path": str(image_path),
+                "model_used": "benchmark",
+            },
+            "visual_features": {"hair_color": "黑色", "clothing": "校服"},
+        }
+        with open(directory / f"char_{i:04d}.json", "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+
+
+def _measure(label: str, load):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24}{elapsed * 1000:>10.0f}{current / 1024 / 1024:>14.1f}{peak / 1024 / 1024:>12.1f}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="参考图库启动基准")
+    parser.add_argument("--count", type=int, default=300)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        print(f"生成 {args.count} 个旧格式人物文件...")
+        _make_legacy_library(directory, args.count)
+        json_mb = sum(p.stat().st_size for p in directory.glob("*.json")) / 1024 / 1024
+        print(f"JSON 总大小: {json_mb:.1f}MB\n")
+
+        print(f"{'阶段':<24}{'耗时(ms)':>10}{'常驻内存(MB)':>14}{'峰值(MB)':>12}")
+        _measure("迁移前：加载旧格式", lambda: [Character.load_from_file(p) for p in directory.glob("*.json")])
+        _measure("首次启动（含迁移）", lambda: CharacterManager(gemini_client=None, storage_dir=directory))
+        manager = _measure("迁移后启动", lambda: CharacterManager(gemini_client=None, storage_dir=directory))
+
+        json_mb = sum(p.stat().st_size for p in directory.glob("*.json")) / 1024 / 1024
+        print(f"\n迁移后 JSON 总大小: {json_mb:.2f}MB")
+
+        # 使用时才读取图片
+        started = time.perf_counter()
+        manager.get_character("char_0000").reference_image.load_base64()
+        print(f"首次读取一张参考图: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+HTTP 传输（Streamable HTTP / SSE）
+一个长期运行的服务进程同时服务多个 MCP 客户端（多个编辑器窗口、代理），共用参考图库、HTTP 连接池、
+生成缓存和全局并发限制，不需要每个客户端各自启动一个进程重新加载参考图库。
+- Streamable HTTP：POST/GET/DELETE {path}（默认 /mcp），会话 ID 通过 Mcp-Session-Id 头传递
+- SSE（旧版客户端）：GET /sse 建立事件流，POST /messages/?session_id=... 发送消息
+"""
+
+import contextlib
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+from mcp.server.sse import SseServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from mcp.server.transport_security import TransportSecuritySettings
+
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+class _AsgiEndpoint:
+    """把 ASGI 处理函数包装为路由端点（Starlette 对非函数端点直接按 ASGI 应用调用）"""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def __call__(self, scope, receive, send):
+        await self.handler(scope, receive, send)
+
+
+def security_settings(host: str, allowed_hosts: Optional[List[str]] = None) -> TransportSecuritySettings:
+    """
+    DNS 重绑定保护：只接受本机地址和配置的 Host 头
+
+    Args:
+        host: 监听地址
+        allowed_hosts: 额外允许的 Host 头（如 "comic.lan:8765"，"comic.lan:*" 表示任意端口）
+    """
+    hosts = ["127.0.0.1:*", "localhost:*", "[::1]:*"] + list(allowed_hosts or [])
+    if host not in LOOPBACK_HOSTS and host not in ("0.0.0.0", "::"):
+        hosts.append(f"{host}:*")
+    if host in ("0.0.0.0", "::") and not allowed_hosts:
+        logger.warning("⚠️  监听所有地址但未配置 transport.allowed_hosts，只接受 Host 为本机地址的请求")
+    origins = [f"http://{allowed}" for allowed in hosts]
+    return TransportSecuritySettings(allowed_hosts=hosts, allowed_origins=origins)
+
+
+def create_http_app(
+    server_instance,
+    path: str = "/mcp",
+    sse: bool = True,
+    stateless: bool = False,
+    json_response: bool = False,
+    session_idle_timeout: Optional[float] = 1800,
+    security: Optional[TransportSecuritySettings] = None
+) -> Starlette:
+    """
+    创建 ASGI 应用，所有会话共用同一个 ComicMCPServer
+
+    Args:
+        server_instance: ComicMCPServer（应用启动/关闭时调用其 startup / shutdown）
+        path: Streamable HTTP 端点路径
+        sse: 是否同时提供 SSE 端点（/sse、/messages/）
+        stateless: 无状态模式（每个请求独立，不保留会话）
+        json_response: 用 JSON 而不是 SSE 流返回响应
+        session_idle_timeout: 空闲会话的回收时间（秒），None 表示不回收
+        security: DNS 重绑定保护设置
+    """
+    mcp_server = server_instance.server
+    session_manager = StreamableHTTPSessionManager(
+        app=mcp_server,
+        json_response=json_response,
+        stateless=stateless,
+        security_settings=security,
+        session_idle_timeout=None if stateless else session_idle_timeout
+    )
+    routes = [Route(path, endpoint=_AsgiEndpoint(session_manager.handle_request))]
+
+    if sse:
+        sse_transport = SseServerTransport("/messages/", security_settings=security)
+
+        async def handle_sse(scope, receive, send):
+            async with sse_transport.connect_sse(scope, receive, send) as (read_stream, write_stream):
+                await mcp_server.run(read_stream, write_stream, server_instance.initialization_options())
+
+        routes.append(Route("/sse", endpoint=_AsgiEndpoint(handle_sse), methods=["GET"]))
+        routes.append(Mount("/messages/", app=sse_transport.handle_post_message))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await server_instance.startup()
+        try:
+            async with session_manager.run():
+                yield
+        finally:
+            await server_instance.shutdown()
+
+    app = Starlette(routes=routes, lifespan=lifespan)
+    app.state.session_manager = session_manager
+    return app
+
+
+async def serve_http(server_instance, transport_config: Dict[str, Any]):
+    """
+    在 HTTP 上运行 MCP 服务器，直到进程收到退出信号
+
+    Args:
+        server_instance: ComicMCPServer
+        transport_config: 配置中的 transport 部分（host、port、path、sse、stateless、json_response、
+            session_idle_timeout、allowed_hosts）
+    """
+    import uvicorn
+
+    host = transport_config.get("host", "127.0.0.1")
+    port = transport_config.get("port", 8765)
+    path = transport_config.get("path", "/mcp")
+    app = create_http_app(
+        server_instance,
+        path=path,
+        sse=transport_config.get("sse", True),
+        stateless=transport_config.get("stateless", False),
+        json_response=transport_config.get("json_response", False),
+        session_idle_timeout=transport_config.get("session_idle_timeout", 1800),
+        security=security_settings(host, transport_config.get("allowed_hosts"))
+    )
+    logger.info(f"🌐 MCP HTTP 服务: http://{host}:{port}{path}" + ("（SSE: /sse）" if transport_config.get("sse", True) else ""))
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    await server.serve()
@@ -3,13 +3,14 @@
 管理人物参考图的生成、存储、加载
 """
 
-import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from loguru import logger
 
 from ..models.character import Character, VisualFeatures, ReferenceImage, CharacterMetadata
 from .gemini_client import GeminiImageGenerator
+from .reference_store import JsonReferenceStore, ReferenceConflictError, iter_json_records
+from .usage_tracker import UsageTracker
 
 
 class CharacterManager:
@@ -18,33 +19,121 @@ class CharacterManager:
     def __init__(
         self,
         gemini_client: GeminiImageGenerator,
-        storage_dir: Path = Path("./config/references/characters")
+        storage_dir: Path = Path("./config/references/characters"),
+        min_match_score: float = 0.75,
+        store=None,
+        usage_flush_interval: float = 30.0
     ):
         """
         初始化人物管理器
 
         Args:
             gemini_client: Gemini API 客户端
-            storage_dir: 存储目录
+            storage_dir: 存储目录（参考图文件；JSON 后端时也存放人物 JSON）
+            min_match_score: 名称模糊匹配的最低置信度
+            store: 存储后端（默认 JsonReferenceStore）
+            usage_flush_interval: 使用统计的定期写入间隔（秒）
         """
         self.gemini_client = gemini_client
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        # 已实例化的人物对象（按需从存储加载）及其版本
         self.characters: Dict[str, Character] = {}
+        self._versions: Dict[str, int] = {}
+        self.store = store if store is not None else JsonReferenceStore(
+            self.storage_dir, id_field="character_id", min_match_score=min_match_score
+        )
+        # 使用次数和最后使用时间（内存累加，批量写入）
+        self.usage = UsageTracker(self.store, flush_interval=usage_flush_interval)
         self._load_all_characters()
 
     def _load_all_characters(self):
-        """加载所有已保存的人物"""
-        if not self.storage_dir.exists():
-            return
+        """同步人物索引（只读取新增或修改过的记录），旧版内嵌 base64 的文件在此迁移"""
+        changes = self.store.sync()
 
-        for json_file in self.storage_dir.glob("*.json"):
-            try:
-                character = Character.load_from_file(json_file)
-                self.characters[character.character_id] = character
-                logger.info(f"加载人物: {character.name} ({character.character_id})")
-            except Exception as e:
-                logger.warning(f"加载人物文件失败 {json_file}: {e}")
+        migrated = 0
+        for character_id in self.store.ids():
+            if self.store.entry(character_id)["legacy"] and self.get_character(character_id) is not None:
+                migrated += 1
+
+        logger.info(
+            f"人物索引: {changes['total']} 个（新增 {changes['added']}，更新 {changes['updated']}，"
+            f"删除 {changes['removed']}）"
+        )
+        if migrated:
+            logger.info(f"已迁移 {migrated} 个人物文件（参考图改为外部文件）")
+
+    @staticmethod
+    def make_character_id(name: str) -> str:
+        """由名称生成角色 ID"""
+        return f"char_{name.lower().replace(' ', '_')}"
+
+    def _check_external_changes(self):
+        """其他进程修改过库时，丢弃已过期的缓存对象"""
+        if self.store.check_changes():
+            self._drop_stale()
+
+    def _drop_stale(self):
+        """丢弃存储中已被修改或删除的缓存对象"""
+        for character_id in list(self.characters):
+            entry = self.store.entry(character_id)
+            if entry is None or entry["version"] != self._versions.get(character_id):
+                self.characters.pop(character_id, None)
+                self._versions.pop(character_id, None)
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        重新同步存储（热加载：只读取新增或修改过的记录），并丢弃已过期的缓存对象
+
+        Returns:
+            {"added", "updated", "removed", "total"}
+        """
+        changes = self.store.sync()
+        self._drop_stale()
+        return changes
+
+    def reload_image(self, character_id: str):
+        """参考图文件被替换后，丢弃内存中缓存的旧图片"""
+        character = self.characters.get(character_id)
+        if character is not None:
+            character.reference_image.unload()
+
+    def _materialize(self, character_id: str) -> Optional[Character]:
+        """从存储创建完整的人物对象"""
+        try:
+            version = self.store.entry(character_id)["version"]
+            character = Character(**self.store.load(character_id))
+            self.characters[character_id] = character
+            self._versions[character_id] = version
+            if character.reference_image.needs_migration:
+                # 旧版 JSON 内嵌 base64：改为只保存路径和哈希
+                character.reference_image.externalize()
+                self._save(character)
+        except Exception as e:
+            self.characters.pop(character_id, None)
+            logger.warning(f"加载人物失败 {character_id}: {e}")
+            return None
+
+        logger.debug(f"加载人物: {character.name} ({character_id})")
+        return character
+
+    def _save(self, character: Character, check_version: bool = False):
+        """
+        写入存储并更新索引
+
+        Args:
+            character: 角色对象
+            check_version: 是否检查记录在读取后未被其他进程修改（不一致时抛出 ReferenceConflictError）
+        """
+        character_id = character.character_id
+        expected = self._versions.get(character_id) if check_version else None
+        try:
+            self._versions[character_id] = self.store.save(character.model_dump(mode='json'), expected)
+        except ReferenceConflictError:
+            # 丢弃本地副本，下次读取时重新加载
+            self.characters.pop(character_id, None)
+            self._versions.pop(character_id, None)
+            raise
 
     async def create_character(
         self,
@@ -52,7 +141,9 @@ class CharacterManager:
         description: str,
         visual_features: Optional[Dict] = None,
         style: str = "日漫风格",
-        reference_image: Optional[str] = None
+        reference_image: Optional[str] = None,
+        use_cache: bool = True,
+        aliases: Optional[List[str]] = None
     ) -> Character:
         """
         创建新人物并生成参考图
@@ -63,28 +154,28 @@ class CharacterManager:
             visual_features: 视觉特征（可选）
             style: 漫画风格
             reference_image: 参考图片的本地路径（可选）
+            use_cache: 是否读取生成缓存（False 时强制重新生成）
+            aliases: 别名列表（可选）
 
         Returns:
             创建的角色对象
         """
         # 生成角色 ID
-        character_id = f"char_{name.lower().replace(' ', '_')}"
+        character_id = self.make_character_id(name)
 
         # 生成参考图
         logger.info(f"正在生成人物参考图: {name}")
-        image_base64 = await self.gemini_client.generate_character_reference(
+        image = await self.gemini_client.generate_character_reference_image(
             character_name=name,
             description=description,
             style=style,
-            reference_image=reference_image
+            reference_image=reference_image,
+            use_cache=use_cache
         )
 
-        # 压缩图片 base64（用于 API 调用）
-        compressed_base64 = self.gemini_client.compress_base64_image(image_base64)
-
-        # 保存图片（会自动压缩）
+        # 压缩一次，同一份结果写入文件并用于 API 调用
         image_path = self.storage_dir / f"{character_id}.jpg"
-        self.gemini_client.save_base64_image(image_base64, image_path, compress=True)
+        ingested = await self.gemini_client.ingest_reference_async(image.to_data_url(), image_path)
 
         # 创建视觉特征
         if visual_features is None:
@@ -98,11 +189,14 @@ class CharacterManager:
         character = Character(
             character_id=character_id,
             name=name,
+            aliases=aliases or [],
             description=description,
             reference_image=ReferenceImage(
-                base64=compressed_base64,
                 path=str(image_path),
-                model_used=self.gemini_client.model
+                sha256=ingested["sha256"],
+                base64=ingested["data_url"],
+                model_used=self.gemini_client.model,
+                generation=image
             ),
             visual_features=VisualFeatures(**visual_features),
             metadata=CharacterMetadata()
@@ -110,25 +204,56 @@ class CharacterManager:
 
         # 保存到内存和文件
         self.characters[character_id] = character
-        character.save_to_file(self.storage_dir)
+        self._save(character)
 
         logger.success(f"人物创建成功: {name} ({character_id})")
         return character
 
     def get_character(self, character_id: str) -> Optional[Character]:
         """获取角色"""
-        return self.characters.get(character_id)
+        self._check_external_changes()
+        character = self.characters.get(character_id)
+        if character is None and character_id in self.store:
+            character = self._materialize(character_id)
+        return character
 
     def get_character_by_name(self, name: str) -> Optional[Character]:
-        """通过名称获取角色"""
-        for character in self.characters.values():
-            if character.name == name:
-                return character
-        return None
+        """通过名称或别名获取角色（支持规范化、子串和模糊匹配）"""
+        matched = self.match_character(name)
+        return matched[0] if matched else None
+
+    def match_character(self, name: str) -> Optional[Tuple[Character, Dict[str, Any]]]:
+        """
+        按名称或别名查找角色，并返回匹配方式
+
+        Args:
+            name: 页面中写的角色名称
+
+        Returns:
+            (角色对象, {"id", "matched", "method", "score"})，未匹配时返回 None
+        """
+        self._check_external_changes()
+        match = self.store.match_name(name)
+        if match is None:
+            return None
+        character = self.get_character(match["id"])
+        return (character, match) if character else None
+
+    def closest_character(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        未匹配时最接近的角色名称（低置信度，只用于提示，不使用其参考图）
+
+        Returns:
+            {"id", "matched", "method", "score", "low_confidence": True}，没有相近名称时返回 None
+        """
+        self._check_external_changes()
+        return self.store.closest_name(name)
 
     def list_characters(self) -> List[Character]:
         """列出所有角色"""
-        return list(self.characters.values())
+        self._check_external_changes()
+        characters = [self.get_character(character_id) for character_id in self.store.ids()]
+        return [character for character in characters if character is not None]
 
     def get_character_refs_base64(self, character_ids: List[str]) -> List[str]:
         """
@@ -144,14 +269,15 @@ class CharacterManager:
         for char_id in character_ids:
             character = self.get_character(char_id)
             if character:
-                refs.append(character.reference_image.base64)
-                character.update_usage()
+                refs.append(character.reference_image.load_base64())
+                self.usage.record([char_id])
         return refs
 
     async def update_character_reference(
         self,
         character_id: str,
-        new_description: Optional[str] = None
+        new_description: Optional[str] = None,
+        aliases: Optional[List[str]] = None
     ) -> Optional[Character]:
         """
         更新人物参考图
@@ -159,6 +285,7 @@ class CharacterManager:
         Args:
             character_id: 角色 ID
             new_description: 新描述（可选）
+            aliases: 新的别名列表（可选，替换原有别名）
 
         Returns:
             更新后的角色对象
@@ -173,52 +300,86 @@ class CharacterManager:
 
         # 重新生成参考图
         logger.info(f"正在更新人物参考图: {character.name}")
-        image_base64 = await self.gemini_client.generate_character_reference(
+        image = await self.gemini_client.generate_character_reference_image(
             character_name=character.name,
-            description=description
+            description=description,
+            use_cache=False
         )
 
-        # 压缩图片 base64
-        compressed_base64 = self.gemini_client.compress_base64_image(image_base64)
-
-        # 更新图片（会自动压缩）
+        # 压缩一次，同一份结果写入文件并用于 API 调用
         image_path = self.storage_dir / f"{character_id}.jpg"
-        self.gemini_client.save_base64_image(image_base64, image_path, compress=True)
+        ingested = await self.gemini_client.ingest_reference_async(image.to_data_url(), image_path)
 
         # 更新角色对象
         character.reference_image = ReferenceImage(
-            base64=compressed_base64,
             path=str(image_path),
-            model_used=self.gemini_client.model
+            sha256=ingested["sha256"],
+            base64=ingested["data_url"],
+            model_used=self.gemini_client.model,
+            generation=image
         )
 
         if new_description:
             character.description = new_description
+        if aliases is not None:
+            character.aliases = aliases
 
         character.metadata.updated_at = character.metadata.updated_at
 
-        # 保存更新
-        character.save_to_file(self.storage_dir)
+        # 保存更新（生成期间其他进程改过该角色时放弃写入）
+        self._save(character, check_version=True)
 
         logger.success(f"人物参考图更新成功: {character.name}")
         return character
 
     def delete_character(self, character_id: str) -> bool:
         """删除角色"""
-        if character_id not in self.characters:
+        self._check_external_changes()
+        if character_id not in self.store:
             logger.warning(f"角色不存在: {character_id}")
             return False
 
-        del self.characters[character_id]
+        self.characters.pop(character_id, None)
+        self._versions.pop(character_id, None)
+        self.store.delete(character_id)
+        self.usage.forget(character_id)
 
-        # 删除文件
-        json_file = self.storage_dir / f"{character_id}.json"
+        # 删除参考图文件
         image_file = self.storage_dir / f"{character_id}.jpg"
-
-        if json_file.exists():
-            json_file.unlink()
         if image_file.exists():
             image_file.unlink()
 
         logger.info(f"角色已删除: {character_id}")
         return True
+
+    def import_json_library(self, source_dir: Path, overwrite: bool = False) -> Dict[str, int]:
+        """
+        从 JSON 人物库导入（旧版内嵌 base64 的文件同时迁移为外部图片文件）
+
+        Args:
+            source_dir: JSON 人物库目录
+            overwrite: 已存在的角色是否覆盖
+
+        Returns:
+            {"imported", "skipped", "failed"}
+        """
+        imported = skipped = failed = 0
+        for json_file in iter_json_records(source_dir):
+            try:
+                character = Character.load_from_file(json_file)
+                if character.reference_image.needs_migration:
+                    character.reference_image.externalize()
+            except Exception as e:
+                logger.warning(f"导入人物文件失败 {json_file}: {e}")
+                failed += 1
+                continue
+
+            if character.character_id in self.store and not overwrite:
+                skipped += 1
+                continue
+            self.characters.pop(character.character_id, None)
+            self._save(character)
+            imported += 1
+
+        logger.info(f"人物库导入完成 {source_dir}: 导入 {imported}，跳过 {skipped}，失败 {failed}")
+        return {"imported": imported, "skipped": skipped, "failed": failed}
@@ -0,0 +1,149 @@
+"""
+多端点路由
+支持多个可互换的 API 地址（官方、uniapi、yunwu 等代理），按滚动延迟和错误率
+选择最健康、最快的端点，端点故障时自动切换
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+
+from .rate_limit import RequestLimiter
+from .resilience import CircuitBreaker, CircuitOpenError, SERVER_ERROR, TIMEOUT, NETWORK, RATE_LIMIT
+
+
+class ApiEndpoint:
+    """单个 API 端点及其健康状态"""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        name: Optional[str] = None,
+        weight: float = 1.0,
+        max_concurrent: int = 4,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        window_size: int = 20
+    ):
+        """
+        Args:
+            base_url: API 基础地址
+            api_key: 该端点使用的 API 密钥
+            name: 端点名称（默认取 base_url）
+            weight: 权重，越大越优先
+            max_concurrent: 该端点的并发上限
+            circuit_breaker: 该端点的熔断器
+            window_size: 统计错误率的滚动窗口大小（请求数）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.name = name or self.base_url
+        self.weight = max(weight, 0.01)
+        self.limiter = RequestLimiter(max_concurrent=max_concurrent)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        # 滚动统计：最近 window_size 次请求的成败，成功请求延迟的指数移动平均
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self.latency_ewma: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+
+    def url(self, model: str) -> str:
+        """生成接口地址"""
+        return f"{self.base_url}/v1beta/models/{model}:generateContent"
+
+    @property
+    def error_rate(self) -> float:
+        """滚动窗口内的错误率"""
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    @property
+    def saturated(self) -> bool:
+        """并发名额是否已用满"""
+        return self.limiter.active >= self.limiter.max_concurrent
+
+    def record_success(self, latency: float):
+        """记录一次成功请求及其耗时（秒）"""
+        self.requests += 1
+        self._outcomes.append(True)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma = 0.7 * self.latency_ewma + 0.3 * latency
+        self.circuit_breaker.record_success()
+
+    def record_failure(self, category: Optional[str]):
+        """记录一次失败（只有上游故障计入熔断，限流只影响路由评分）"""
+        if category in (SERVER_ERROR, TIMEOUT, NETWORK, RATE_LIMIT):
+            self.requests += 1
+            self.failures += 1
+            self._outcomes.append(False)
+        if category in (SERVER_ERROR, TIMEOUT, NETWORK):
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.release()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """端点状态"""
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "weight": self.weight,
+            "active": self.limiter.active,
+            "max_concurrent": self.limiter.max_concurrent,
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 3),
+            "latency_ewma_s": round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+            "circuit_breaker": self.circuit_breaker.to_dict(),
+        }
+
+
+class EndpointPool:
+    """端点池：选择评分最好的可用端点"""
+
+    def __init__(self, endpoints: Iterable[ApiEndpoint]):
+        self.endpoints: List[ApiEndpoint] = list(endpoints)
+        if not self.endpoints:
+            raise ValueError("至少需要配置一个 API 端点")
+
+    @property
+    def primary(self) -> ApiEndpoint:
+        """第一个端点（单端点配置时即唯一端点）"""
+        return self.endpoints[0]
+
+    def _score(self, endpoint: ApiEndpoint, fallback_latency: float) -> float:
+        """评分越低越好：延迟 / 权重，并按错误率惩罚；还没有延迟数据的端点按已知最快延迟估计，便于探索"""
+        latency = endpoint.latency_ewma if endpoint.latency_ewma is not None else fallback_latency
+        return latency / endpoint.weight * (1 + 4 * endpoint.error_rate)
+
+    def select(self, exclude: Optional[Set[str]] = None) -> ApiEndpoint:
+        """
+        选择端点
+
+        Args:
+            exclude: 本次请求中已失败、优先避开的端点名称
+
+        Returns:
+            选中的端点；所有端点都在熔断中时抛出 CircuitOpenError
+        """
+        exclude = exclude or set()
+        available = [e for e in self.endpoints if e.circuit_breaker.available()]
+        if not available:
+            raise CircuitOpenError(min(e.circuit_breaker.retry_after() for e in self.endpoints))
+
+        candidates = [e for e in available if e.name not in exclude] or available
+        candidates = [e for e in candidates if not e.saturated] or candidates
+
+        known = [e.latency_ewma for e in self.endpoints if e.latency_ewma is not None]
+        fallback = min(known) if known else 0.0
+        return min(candidates, key=lambda e: self._score(e, fallback))
+
+    def has_alternative(self, exclude: Set[str]) -> bool:
+        """除已失败端点外是否还有可用端点"""
+        return any(e.name not in exclude and e.circuit_breaker.available() for e in self.endpoints)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """所有端点状态"""
+        return [e.to_dict() for e in self.endpoints]
@@ -3,15 +3,29 @@ Gemini API 客户端
 参考 app.js:1329-1340 和 app.js:1943 的实现
 """
 
+import asyncio
 import base64
 import httpx
+import io
 import json
 import re
-import io
+import shutil
+import time
+import uuid
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 from loguru import logger
-from PIL import Image
+
+from ..models.generation import GeneratedImage
+from .endpoints import ApiEndpoint, EndpointPool
+from .generation_cache import GenerationCache
+from . import image_processing
+from .http_metrics import RequestTimings, HttpStats
+from .latency import LatencyHistory, AdaptiveTimeouts, latency_key, CONNECT_KEY
+from .rate_limit import RequestLimiter
+from .resilience import RetryPolicy, CircuitBreaker, CircuitOpenError, classify_error, CLIENT_ERROR, TIMEOUT
+from .streaming import InlineImageStreamDecoder, find_inline_mime_type
+from .workers import ImageWorkerPool
 
 
 class GeminiImageGenerator:
@@ -21,7 +35,27 @@ class GeminiImageGenerator:
         self,
         api_key: str,
         base_url: str = "https://generativelanguage.googleapis.com",
-        model: str = "gemini-3-pro-image-preview"
+        model: str = "gemini-3-pro-image-preview",
+        http2: bool = True,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 10.0,
+        stream_responses: bool = True,
+        stream_chunk_size: int = 64 * 1024,
+        cache: Optional[GenerationCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[RequestLimiter] = None,
+        endpoints: Optional[List[ApiEndpoint]] = None,
+        hedging_enabled: bool = False,
+        hedging_percentile: float = 0.9,
+        hedging_max_extra_ratio: float = 0.1,
+        hedging_min_samples: int = 10,
+        adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+        latency_history_path: Optional[Path] = None,
+        image_workers: Optional[ImageWorkerPool] = None,
+        resize_mode: str = "balanced"
     ):
         """
         初始化 Gemini 客户端
@@ -30,11 +64,193 @@ class GeminiImageGenerator:
             api_key: API 密钥
             base_url: API 基础地址
             model: 模型名称（默认 gemini-3-pro-image-preview）
+            http2: 是否启用 HTTP/2 多路复用（需要安装 h2）
+            max_connections: 连接池最大连接数
+            max_keepalive_connections: 最大保持空闲的连接数
+            keepalive_expiry: 空闲连接保持时间（秒）
+            connect_timeout: 建立连接的超时时间（秒）
+            stream_responses: 是否流式解码响应（图片数据边接收边解码，不构建完整 JSON 树）
+            stream_chunk_size: 流式读取的块大小（字节）
+            cache: 生成结果缓存（可选，不传则不缓存）
+            retry_policy: 重试策略（默认限流/5xx 最多尝试 4 次，超时重试 1 次）
+            circuit_breaker: 熔断器（默认连续 5 次故障后熔断 60 秒）
+            limiter: 并发与速率限制器（默认最多 4 个并发请求，不限速）
+            endpoints: 多个可互换的 API 端点（可选，传入后忽略 api_key/base_url/circuit_breaker，
+                按延迟和错误率路由并自动故障切换）
+            hedging_enabled: 是否启用对冲请求（慢请求超过延迟分位时再发一个，取先完成的）
+            hedging_percentile: 触发对冲的延迟分位（按图像大小分别统计）
+            hedging_max_extra_ratio: 对冲请求占总请求数的上限，用于控制额外花费
+            hedging_min_samples: 延迟样本数达到该值后才启用对冲
+            adaptive_timeouts: 自适应超时（默认按延迟历史 p99 × 2 推导读取超时）
+            latency_history_path: 延迟历史持久化文件（可选）
+            image_workers: 图片处理工作池（默认 2 个线程）
+            resize_mode: 参考图缩放策略，quality（全尺寸解码 + LANCZOS）/ balanced / fast（JPEG 按 DCT 缩放解码，见 image_processing.RESIZE_MODES）
         """
-        self.api_key = api_key
-        self.base_url = base_url.rstrip("/")
         self.model = model
-        self.endpoint = f"{self.base_url}/v1beta/models/{self.model}:generateContent"
+        if endpoints:
+            self.endpoint_pool = EndpointPool(endpoints)
+        else:
+            self.endpoint_pool = EndpointPool([ApiEndpoint(
+                base_url=base_url or "https://generativelanguage.googleapis.com",
+                api_key=api_key,
+                name="default",
+                max_concurrent=(limiter.max_concurrent if limiter else 4),
+                circuit_breaker=circuit_breaker
+            )])
+        primary = self.endpoint_pool.primary
+        self.api_key = primary.api_key
+        self.base_url = primary.base_url
+        self.endpoint = primary.url(self.model)
+
+        # 连接池配置（整个服务生命周期共用一个客户端）
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.connect_timeout = connect_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stream_responses = stream_responses
+        self.stream_chunk_size = stream_chunk_size
+        self.cache = cache
+
+        # 重试与熔断（熔断器按端点独立，circuit_breaker 指向首个端点的熔断器）
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = primary.circuit_breaker
+        self.retry_stats: Dict[str, Any] = {"requests": 0, "attempts": 0, "retries": {}}
+
+        # 并发与速率限制（所有生成请求共用）
+        self.limiter = limiter or RequestLimiter()
+
+        # 延迟历史（按模型、图像大小、参考图数量分组），用于自适应超时和对冲
+        self.adaptive_timeouts = adaptive_timeouts or AdaptiveTimeouts(
+            LatencyHistory(), connect_timeout=connect_timeout
+        )
+        self.latency_history = self.adaptive_timeouts.history
+        self.latency_history_path = Path(latency_history_path) if latency_history_path else None
+        self._unsaved_latency_samples = 0
+        if self.latency_history_path:
+            self.latency_history.load(self.latency_history_path)
+
+        # 对冲请求
+        self.hedging_enabled = hedging_enabled
+        self.hedging_percentile = hedging_percentile
+        self.hedging_max_extra_ratio = hedging_max_extra_ratio
+        self.hedging_min_samples = hedging_min_samples
+        self.hedge_stats: Dict[str, int] = {"requests_slow": 0, "hedged": 0, "hedge_wins": 0}
+
+        # 图片解码/压缩/写文件在工作池中执行
+        self.image_workers = image_workers or ImageWorkerPool()
+        if resize_mode not in image_processing.RESIZE_MODES:
+            raise ValueError(f"不支持的缩放策略: {resize_mode}")
+        self.resize_mode = resize_mode
+        self.ingest_stats = {"references": 0, "total_s": 0.0, "saved_s": 0.0}
+
+        # 请求耗时统计
+        self.last_timings: Optional[RequestTimings] = None
+        self.http_stats = HttpStats()
+
+    async def start(self):
+        """创建长连接客户端（服务启动时调用，可重复调用）"""
+        if self._client is not None and not self._client.is_closed:
+            return
+
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("未安装 h2，HTTP/2 已禁用，回退到 HTTP/1.1（pip install httpx[http2]）")
+                http2 = False
+
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            limits=self.limits,
+            timeout=httpx.Timeout(120, connect=self.connect_timeout)
+        )
+        logger.info(
+            f"HTTP 连接池已启动: http2={http2}, "
+            f"max_connections={self.limits.max_connections}, "
+            f"keepalive={self.limits.max_keepalive_connections}/{self.limits.keepalive_expiry}s"
+        )
+
+    async def aclose(self):
+        """关闭连接池和图片处理工作池（服务关闭时调用），并保存延迟历史"""
+        self._save_latency_history()
+        self.image_workers.shutdown()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info(f"HTTP 连接池已关闭: {self.http_stats.to_dict()}")
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        """获取共享客户端，未启动时自动创建（兼容直接使用生成器的脚本）"""
+        if self._client is None or self._client.is_closed:
+            await self.start()
+        return self._client
+
+    def get_http_stats(self) -> Dict[str, Any]:
+        """获取连接池统计和最近一次请求（任意调用方）的耗时"""
+        return {
+            **self.http_stats.to_dict(),
+            "last_request": self.last_timings.to_dict() if self.last_timings else None,
+        }
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """获取重试次数和熔断器状态"""
+        return {
+            **self.retry_stats,
+            "circuit_breakers": {
+                e.name: e.circuit_breaker.to_dict() for e in self.endpoint_pool.endpoints
+            },
+        }
+
+    def _record_latency(self, key: str, seconds: float):
+        """记录延迟样本，每积累 20 个样本落盘一次"""
+        self.latency_history.record(key, seconds)
+        self._unsaved_latency_samples += 1
+        if self._unsaved_latency_samples >= 20:
+            self._save_latency_history()
+
+    def _save_latency_history(self):
+        if self.latency_history_path is None or self._unsaved_latency_samples == 0:
+            return
+        try:
+            self.latency_history.save(self.latency_history_path)
+            self._unsaved_latency_samples = 0
+        except OSError as e:
+            logger.warning(f"延迟历史保存失败: {e}")
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """获取各分组的延迟分位和对冲统计"""
+        return {
+            "latency": self.latency_history.stats(),
+            "hedging": {
+                "enabled": self.hedging_enabled,
+                "percentile": self.hedging_percentile,
+                "max_extra_ratio": self.hedging_max_extra_ratio,
+                **self.hedge_stats,
+            },
+        }
+
+    def get_worker_stats(self) -> Dict[str, Any]:
+        """获取图片处理工作池和参考图入库统计"""
+        ingest = {key: round(value, 3) if isinstance(value, float) else value
+                  for key, value in self.ingest_stats.items()}
+        return {**self.image_workers.stats(), "reference_ingest": ingest}
+
+    def get_endpoint_stats(self) -> List[Dict[str, Any]]:
+        """获取各端点的延迟、错误率和并发状态"""
+        return self.endpoint_pool.stats()
+
+    def get_limiter_stats(self) -> Dict[str, Any]:
+        """获取并发/速率限制统计（排队深度、等待时间）"""
+        return self.limiter.stats()
+
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """获取生成缓存统计（未启用缓存时返回 None）"""
+        return self.cache.stats() if self.cache else None
 
     async def generate_with_references(
         self,
@@ -42,7 +258,8 @@ class GeminiImageGenerator:
         image_refs: Optional[List[str]] = None,
         image_size: str = "2K",
         aspect_ratio: str = "3:4",
-        timeout: int = 120
+        timeout: Optional[float] = None,
+        use_cache: bool = True
     ) -> str:
         """
         生成漫画图片，携带参考图
@@ -54,11 +271,272 @@ class GeminiImageGenerator:
             image_refs: base64 编码的参考图列表（人物、场景等）
             image_size: 图像大小（1K/2K/4K）
             aspect_ratio: 长宽比
-            timeout: 超时时间（秒）
+            timeout: 读取超时（秒），不传则根据延迟历史自动推导
+            use_cache: 是否读取生成缓存（False 时强制重新生成并刷新缓存）
 
         Returns:
             base64 编码的生成图片
         """
+        image = await self.generate_image(
+            prompt=prompt,
+            image_refs=image_refs,
+            image_size=image_size,
+            aspect_ratio=aspect_ratio,
+            timeout=timeout,
+            use_cache=use_cache
+        )
+        return image.to_data_url()
+
+    async def generate_image(
+        self,
+        prompt: str,
+        image_refs: Optional[List[str]] = None,
+        image_size: str = "2K",
+        aspect_ratio: str = "3:4",
+        timeout: Optional[float] = None,
+        output_path: Optional[Path] = None,
+        use_cache: bool = True
+    ) -> GeneratedImage:
+        """
+        生成图片，结果写入内存或直接写入文件
+
+        流式模式下边接收边解码，单页峰值内存与分辨率无关
+
+        Args:
+            prompt: 文本提示词
+            image_refs: base64 编码的参考图列表（人物、场景等）
+            image_size: 图像大小（1K/2K/4K）
+            aspect_ratio: 长宽比
+            timeout: 读取超时（秒），不传则根据延迟历史自动推导
+            output_path: 输出文件路径（可选，不传则返回内存中的图片字节）
+            use_cache: 是否读取生成缓存（False 时强制重新生成并刷新缓存）
+
+        Returns:
+            生成结果
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = GenerationCache.make_key(self.model, prompt, image_refs, image_size, aspect_ratio)
+            if use_cache:
+                cached = self._load_cached(cache_key, output_path)
+                if cached is not None:
+                    return cached
+
+        payload = self._build_payload(prompt, image_refs, image_size, aspect_ratio)
+        logger.debug(f"Payload: {self._describe_payload(payload)}")
+
+        # 按（模型、图像大小、参考图数量）的延迟历史推导超时
+        key = latency_key(self.model, image_size, len(image_refs or []))
+        timeouts = self.adaptive_timeouts.derive(key, image_size, explicit=timeout)
+        logger.info(
+            f"超时设置: connect={timeouts['connect_s']}s read={timeouts['read_s']}s（{timeouts['source']}）"
+        )
+        request_timeout = httpx.Timeout(timeouts["read_s"], connect=timeouts["connect_s"])
+
+        image = await self._request_with_retry(payload, request_timeout, output_path, latency_key=key)
+        image.timeouts = timeouts
+
+        if cache_key is not None:
+            if image.path:
+                self.cache.put_file(cache_key, Path(image.path), image.mime_type)
+            else:
+                self.cache.put_bytes(cache_key, image.data, image.mime_type)
+        return image
+
+    async def _request_with_retry(
+        self,
+        payload: Dict[str, Any],
+        timeout: httpx.Timeout,
+        output_path: Optional[Path],
+        latency_key: str
+    ) -> GeneratedImage:
+        """
+        发送请求，按失败类型重试
+
+        限流和 5xx 指数退避（遵守 Retry-After），超时有限次重试，其余 4xx 直接抛出；
+        熔断器打开时不发请求，直接抛出 CircuitOpenError
+        """
+        self.retry_stats["requests"] += 1
+        attempt = 0
+        timeouts = 0
+        failed_endpoints = set()
+
+        while True:
+            endpoint = self.endpoint_pool.select(exclude=failed_endpoints)
+            attempt += 1
+            try:
+                image = await self._hedged_attempt(endpoint, payload, timeout, output_path, latency_key)
+            except CircuitOpenError:
+                # 该端点刚进入熔断（或半开探测已被占用），有其他端点时切换过去
+                failed_endpoints.add(endpoint.name)
+                if self.endpoint_pool.has_alternative(failed_endpoints):
+                    attempt -= 1
+                    continue
+                raise
+            except Exception as e:
+                category = classify_error(e)
+                if category is None or category == CLIENT_ERROR:
+                    raise
+                if category == TIMEOUT:
+                    timeouts += 1
+
+                if not self.retry_policy.should_retry(category, attempt, timeouts):
+                    raise
+
+                retries = self.retry_stats["retries"]
+                retries[category] = retries.get(category, 0) + 1
+
+                # 还有其他健康端点时立即切换，否则退避后重试
+                failed_endpoints.add(endpoint.name)
+                if self.endpoint_pool.has_alternative(failed_endpoints):
+                    logger.warning(f"端点 {endpoint.name} 请求失败（{category}），切换端点重试: {e}")
+                    continue
+
+                delay = self.retry_policy.backoff(attempt, e)
+                logger.warning(f"请求失败（{category}），{delay:.1f} 秒后第 {attempt} 次重试: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            image.attempts = attempt
+            return image
+
+    async def _hedged_attempt(
+        self,
+        endpoint: ApiEndpoint,
+        payload: Dict[str, Any],
+        timeout: httpx.Timeout,
+        output_path: Optional[Path],
+        latency_key: str
+    ) -> GeneratedImage:
+        """
+        一次（可能对冲的）尝试
+
+        请求超过近期延迟的指定分位仍未完成时，向其他端点（没有则同一端点）再发一个相同请求，
+        取先成功的结果并取消另一个；对冲次数受 hedging_max_extra_ratio 限制
+        """
+        primary = asyncio.create_task(self._attempt(endpoint, payload, timeout, output_path, latency_key))
+        delay = self._hedge_delay(latency_key)
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        self.hedge_stats["requests_slow"] += 1
+        hedge_budget = self.hedging_max_extra_ratio * self.retry_stats["requests"]
+        if self.hedge_stats["hedged"] + 1 > hedge_budget:
+            return await primary
+
+        try:
+            hedge_endpoint = self.endpoint_pool.select(exclude={endpoint.name})
+        except CircuitOpenError:
+            return await primary
+
+        self.hedge_stats["hedged"] += 1
+        logger.info(
+            f"请求已超过 p{int(self.hedging_percentile * 100)}（{delay:.1f} 秒），"
+            f"向端点 {hedge_endpoint.name} 发送对冲请求"
+        )
+        hedge = asyncio.create_task(self._attempt(hedge_endpoint, payload, timeout, output_path, latency_key))
+        pending = {primary, hedge}
+        errors: Dict[asyncio.Task, BaseException] = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_stats["hedge_wins"] += 1
+                        return task.result()
+                    errors[task] = task.exception()
+            # 两个请求都失败，优先抛出原请求的错误
+            raise errors.get(primary) or errors[hedge]
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def _hedge_delay(self, latency_key: str) -> Optional[float]:
+        """对冲触发时间：近期延迟的指定分位，样本不足或未启用时返回 None"""
+        if not self.hedging_enabled:
+            return None
+        if self.latency_history.count(latency_key) < self.hedging_min_samples:
+            return None
+        return self.latency_history.percentile(latency_key, self.hedging_percentile)
+
+    async def _attempt(
+        self,
+        endpoint: ApiEndpoint,
+        payload: Dict[str, Any],
+        timeout: httpx.Timeout,
+        output_path: Optional[Path],
+        latency_key: str
+    ) -> GeneratedImage:
+        """单次请求：占用限流名额，检查熔断，记录端点健康和延迟"""
+        # 每次尝试都占用全局名额、令牌和端点名额，重试的退避等待不占名额
+        async with self.limiter.slot() as waited, endpoint.limiter.slot() as endpoint_waited:
+            waited += endpoint_waited
+            if waited > 0.1:
+                logger.info(f"限流排队 {waited:.1f} 秒（队列深度 {self.limiter.queue_depth}）")
+            endpoint.circuit_breaker.before_request()
+            self.retry_stats["attempts"] += 1
+            started = time.monotonic()
+            try:
+                if self.stream_responses:
+                    image = await self._request_streaming(endpoint, payload, timeout, output_path)
+                else:
+                    image = await self._request_buffered(endpoint, payload, timeout, output_path)
+            except asyncio.CancelledError:
+                # 对冲落败被取消，不计入端点健康
+                endpoint.circuit_breaker.release()
+                raise
+            except Exception as e:
+                endpoint.record_failure(classify_error(e))
+                raise
+
+        elapsed = time.monotonic() - started
+        endpoint.record_success(elapsed)
+        self._record_latency(latency_key, elapsed)
+        image.queue_wait_s = round(waited, 3)
+        image.endpoint = endpoint.name
+        image.latency_s = round(elapsed, 2)
+        return image
+
+    def _load_cached(self, cache_key: str, output_path: Optional[Path]) -> Optional[GeneratedImage]:
+        """命中缓存时返回缓存的图片（写文件模式下复制到输出路径）"""
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+
+        cache_path, mime_type = cached
+        logger.success(f"命中生成缓存: {cache_key[:12]}")
+        if output_path is None:
+            data = cache_path.read_bytes()
+            return GeneratedImage(mime_type=mime_type, size_bytes=len(data), data=data, cache_hit=True)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cache_path, output_path)
+        return GeneratedImage(
+            mime_type=mime_type,
+            size_bytes=output_path.stat().st_size,
+            path=str(output_path),
+            cache_hit=True
+        )
+
+    def _build_payload(
+        self,
+        prompt: str,
+        image_refs: Optional[List[str]],
+        image_size: str,
+        aspect_ratio: str
+    ) -> Dict[str, Any]:
+        """构建请求 payload（对应 app.js:1318-1326）"""
         # 构建 parts 数组
         parts: List[Dict[str, Any]] = [{"text": prompt}]
 
@@ -76,8 +554,7 @@ class GeminiImageGenerator:
                     }
                 })
 
-        # 构建请求 payload（对应 app.js:1318-1326）
-        payload = {
+        return {
             "contents": [{"role": "user", "parts": parts}],
             "generationConfig": {
                 "responseModalities": ["TEXT", "IMAGE"],  # 支持文本和图片混合响应
@@ -88,71 +565,230 @@ class GeminiImageGenerator:
             }
         }
 
-        logger.info(f"发送 Gemini API 请求: {self.endpoint}")
-        logger.debug(f"Payload: {payload}")
+    @staticmethod
+    def _describe_payload(payload: Dict[str, Any]) -> str:
+        """调试日志用的 payload 摘要（参考图只输出长度）"""
+        parts = payload["contents"][0]["parts"]
+        summary = [
+            {"inline_data": f"<{len(p['inline_data']['data'])} chars>"} if "inline_data" in p else p
+            for p in parts
+        ]
+        return json.dumps({**payload, "contents": [{"role": "user", "parts": summary}]}, ensure_ascii=False)
 
+    async def _request_buffered(
+        self,
+        endpoint: ApiEndpoint,
+        payload: Dict[str, Any],
+        timeout: httpx.Timeout,
+        output_path: Optional[Path]
+    ) -> GeneratedImage:
+        """非流式请求：读取完整响应后解析"""
+        result: Dict[str, Any] = {}
         try:
-            # 发送请求（对应 app.js:1329-1340）
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                response = await client.post(
-                    f"{self.endpoint}?key={self.api_key}",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                response.raise_for_status()
-                result = response.json()
+            # 发送请求（对应 app.js:1329-1340），复用连接池
+            client = await self._get_client()
+            timings = RequestTimings()
+            url = endpoint.url(self.model)
+            logger.info(f"发送 Gemini API 请求: {url}")
+            response = await client.post(
+                f"{url}?key={endpoint.api_key}",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout,
+                extensions={"trace": timings.trace}
+            )
+            timings.finish(bytes_received=len(response.content))
+            self._record_timings(timings)
+            response.raise_for_status()
+            result = response.json()
 
             # 解析返回的图片数据
-            # （参考 app.js: 遍历 parts 数组查找图片）
             if "candidates" not in result or len(result["candidates"]) == 0:
                 raise ValueError("API 返回结果为空")
 
-            # 遍历所有 parts，查找图片数据
-            parts = result["candidates"][0]["content"]["parts"]
-            image_base64 = None
-            mime_type = "image/jpeg"
-
-            for part in parts:
-                # 检查是否有 inlineData（直接图片数据）
-                if "inlineData" in part:
-                    inline_data = part["inlineData"]
-                    if inline_data.get("mimeType", "").startswith("image/"):
-                        image_base64 = inline_data["data"]
-                        mime_type = inline_data["mimeType"]
-                        break
-                # 检查 text 中是否包含 Markdown 格式的图片
-                # 例如: ![image](data:image/png;base64,...)
-                elif "text" in part:
-                    text = part["text"]
-                    # 匹配 data:image 格式的图片
-                    match = re.search(r'!\[.*?\]\((data:image/[^)]+)\)', text)
-                    if match:
-                        data_url = match.group(1)
-                        # 提取 mime_type 和 base64 数据
-                        if "," in data_url:
-                            mime_prefix, image_base64 = data_url.split(",", 1)
-                            mime_type = mime_prefix.split(":")[1].split(";")[0]
-                        break
+            mime_type, image_base64 = self._extract_image(result)
 
             if image_base64 is None:
                 # 没有找到图片，返回完整响应用于调试
                 logger.error(f"API 响应中未找到图片数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
                 raise ValueError("API 响应中未找到图片数据")
 
+            image_data = base64.b64decode(image_base64)
             logger.success("图片生成成功")
-            return f"data:{mime_type};base64,{image_base64}"
+
+            if output_path is None:
+                return GeneratedImage(
+                    mime_type=mime_type, size_bytes=len(image_data), data=image_data,
+                    http_timings=timings.to_dict()
+                )
+
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(output_path, 'wb') as f:
+                f.write(image_data)
+            return GeneratedImage(
+                mime_type=mime_type, size_bytes=len(image_data), path=str(output_path),
+                http_timings=timings.to_dict()
+            )
 
         except httpx.HTTPError as e:
             logger.error(f"HTTP 请求失败: {e}")
             raise
         except KeyError as e:
-            logger.error(f"解析 API 响应失败，缺少键: {e}")
-            logger.error(f"API 响应内容: {json.dumps(result, ensure_ascii=False, indent=2)}")
-            # 提供更详细的错误信息
-            if "error" in result:
-                error_msg = result.get("error", {}).get("message", str(result))
-                raise ValueError(f"API 返回错误: {error_msg}")
-            raise ValueError(f"API 响应格式错误，缺少键: {e}")
+            raise self._format_key_error(e, result)
+
+    async def _request_streaming(
+        self,
+        endpoint: ApiEndpoint,
+        payload: Dict[str, Any],
+        timeout: httpx.Timeout,
+        output_path: Optional[Path]
+    ) -> GeneratedImage:
+        """流式请求：增量扫描响应并把图片数据按块解码到文件或内存"""
+        client = await self._get_client()
+        timings = RequestTimings()
+
+        # 写文件时先写临时文件，成功后再替换，避免留下半张图
+        tmp_path = None
+        if output_path is not None:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            # 对冲请求可能同时写同一页面，临时文件名需唯一
+            tmp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex[:8]}.part")
+            sink = open(tmp_path, 'wb')
+        else:
+            sink = io.BytesIO()
+
+        result: Dict[str, Any] = {}
+        try:
+            url = endpoint.url(self.model)
+            logger.info(f"发送 Gemini API 请求: {url}")
+            async with client.stream(
+                "POST",
+                f"{url}?key={endpoint.api_key}",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout,
+                extensions={"trace": timings.trace}
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    timings.finish(bytes_received=response.num_bytes_downloaded)
+                    self._record_timings(timings)
+                    response.raise_for_status()
+
+                decoder = InlineImageStreamDecoder(sink)
+                async for chunk in response.aiter_bytes(self.stream_chunk_size):
+                    decoder.feed(chunk)
+                decoder.close()
+                timings.finish(bytes_received=response.num_bytes_downloaded)
+                self._record_timings(timings)
+
+            result = decoder.skeleton_json()
+            if "candidates" not in result or len(result["candidates"]) == 0:
+                if "error" in result:
+                    raise ValueError(f"API 返回错误: {result['error'].get('message', result['error'])}")
+                raise ValueError("API 返回结果为空")
+
+            if decoder.found:
+                mime_type = find_inline_mime_type(result) or "image/jpeg"
+                if not mime_type.startswith("image/"):
+                    raise ValueError(f"API 返回的 inlineData 不是图片: {mime_type}")
+                size_bytes = decoder.bytes_written
+            else:
+                # 图片以 Markdown data URL 形式出现在 text 中，骨架里就是完整内容
+                mime_type, image_base64 = self._extract_image(result)
+                if image_base64 is None:
+                    logger.error(f"API 响应中未找到图片数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
+                    raise ValueError("API 响应中未找到图片数据")
+                image_data = base64.b64decode(image_base64)
+                sink.write(image_data)
+                size_bytes = len(image_data)
+
+            logger.success(f"图片生成成功（流式解码 {size_bytes // 1024}KB）")
+
+            if output_path is None:
+                return GeneratedImage(
+                    mime_type=mime_type, size_bytes=size_bytes, data=sink.getvalue(),
+                    http_timings=timings.to_dict()
+                )
+
+            sink.close()
+            tmp_path.replace(output_path)
+            return GeneratedImage(
+                mime_type=mime_type, size_bytes=size_bytes, path=str(output_path),
+                http_timings=timings.to_dict()
+            )
+
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP 请求失败: {e}")
+            raise
+        except KeyError as e:
+            raise self._format_key_error(e, result)
+        finally:
+            if not sink.closed and tmp_path is not None:
+                sink.close()
+            if tmp_path is not None and tmp_path.exists():
+                tmp_path.unlink()
+
+    @staticmethod
+    def _extract_image(result: Dict[str, Any]):
+        """
+        从响应中查找图片（参考 app.js: 遍历 parts 数组查找图片）
+
+        Returns:
+            (mime_type, base64 数据)，未找到时 base64 数据为 None
+        """
+        # 遍历所有 parts，查找图片数据
+        parts = result["candidates"][0]["content"]["parts"]
+        image_base64 = None
+        mime_type = "image/jpeg"
+
+        for part in parts:
+            # 检查是否有 inlineData（直接图片数据）
+            if "inlineData" in part:
+                inline_data = part["inlineData"]
+                if inline_data.get("mimeType", "").startswith("image/"):
+                    image_base64 = inline_data["data"]
+                    mime_type = inline_data["mimeType"]
+                    break
+            # 检查 text 中是否包含 Markdown 格式的图片
+            # 例如: ![image](data:image/png;base64,...)
+            elif "text" in part:
+                text = part["text"]
+                # 匹配 data:image 格式的图片
+                match = re.search(r'!\[.*?\]\((data:image/[^)]+)\)', text)
+                if match:
+                    data_url = match.group(1)
+                    # 提取 mime_type 和 base64 数据
+                    if "," in data_url:
+                        mime_prefix, image_base64 = data_url.split(",", 1)
+                        mime_type = mime_prefix.split(":")[1].split(";")[0]
+                    break
+
+        return mime_type, image_base64
+
+    @staticmethod
+    def _format_key_error(e: KeyError, result: Dict[str, Any]) -> ValueError:
+        """把响应结构缺键转换为更详细的错误"""
+        logger.error(f"解析 API 响应失败，缺少键: {e}")
+        logger.error(f"API 响应内容: {json.dumps(result, ensure_ascii=False, indent=2)}")
+        # 提供更详细的错误信息
+        if "error" in result:
+            error_msg = result.get("error", {}).get("message", str(result))
+            return ValueError(f"API 返回错误: {error_msg}")
+        return ValueError(f"API 响应格式错误，缺少键: {e}")
+
+    def _record_timings(self, timings: RequestTimings):
+        """记录并输出单次请求耗时（last_timings 只用于统计，单次请求的耗时见 GeneratedImage.http_timings）"""
+        self.last_timings = timings
+        self.http_stats.record(timings)
+        if not timings.reused_connection:
+            self._record_latency(CONNECT_KEY, ((timings.connect_ms or 0) + (timings.tls_ms or 0)) / 1000)
+        t = timings.to_dict()
+        logger.info(
+            f"请求耗时: total={t['total_ms']}ms connect={t['connect_ms']}ms tls={t['tls_ms']}ms "
+            f"ttfb={t['ttfb_ms']}ms transfer={t['transfer_ms']}ms "
+            f"({t['http_version']}, 复用连接={t['reused_connection']})"
+        )
 
     def _load_image_as_base64(self, image_path: str) -> str:
         """
@@ -183,17 +819,18 @@ class GeminiImageGenerator:
         base64_data = base64.b64encode(image_data).decode('utf-8')
         return f"data:{mime_type};base64,{base64_data}"
 
-    async def generate_character_reference(
+    async def generate_character_reference_image(
         self,
         character_name: str,
         description: str,
         style: str = "日漫风格",
         image_size: str = "2K",
         aspect_ratio: str = "3:4",
-        reference_image: Optional[str] = None
-    ) -> str:
+        reference_image: Optional[str] = None,
+        use_cache: bool = True
+    ) -> GeneratedImage:
         """
-        生成人物参考图
+        生成人物参考图，返回完整的生成结果（含尝试次数、超时和分阶段耗时）
 
         Args:
             character_name: 角色名称
@@ -202,9 +839,10 @@ class GeminiImageGenerator:
             image_size: 图像大小
             aspect_ratio: 长宽比
             reference_image: 参考图片的本地路径（可选）
+            use_cache: 是否读取生成缓存
 
         Returns:
-            base64 编码的图片
+            生成结果
         """
         prompt = f"""生成一个{style}的漫画人物角色参考图。
 
@@ -224,24 +862,53 @@ class GeminiImageGenerator:
             logger.info(f"使用参考图: {reference_image}")
             image_refs = [self._load_image_as_base64(reference_image)]
 
-        return await self.generate_with_references(
+        return await self.generate_image(
             prompt=prompt,
             image_refs=image_refs,
             image_size=image_size,
-            aspect_ratio=aspect_ratio
+            aspect_ratio=aspect_ratio,
+            use_cache=use_cache
         )
 
-    async def generate_scene_reference(
+    async def generate_character_reference(
+        self,
+        character_name: str,
+        description: str,
+        style: str = "日漫风格",
+        image_size: str = "2K",
+        aspect_ratio: str = "3:4",
+        reference_image: Optional[str] = None,
+        use_cache: bool = True
+    ) -> str:
+        """
+        生成人物参考图（参数同 generate_character_reference_image）
+
+        Returns:
+            base64 编码的图片
+        """
+        image = await self.generate_character_reference_image(
+            character_name=character_name,
+            description=description,
+            style=style,
+            image_size=image_size,
+            aspect_ratio=aspect_ratio,
+            reference_image=reference_image,
+            use_cache=use_cache
+        )
+        return image.to_data_url()
+
+    async def generate_scene_reference_image(
         self,
         scene_name: str,
         description: str,
         style: str = "日漫风格",
         image_size: str = "2K",
         aspect_ratio: str = "16:9",
-        reference_image: Optional[str] = None
-    ) -> str:
+        reference_image: Optional[str] = None,
+        use_cache: bool = True
+    ) -> GeneratedImage:
         """
-        生成场景参考图
+        生成场景参考图，返回完整的生成结果（含尝试次数、超时和分阶段耗时）
 
         Args:
             scene_name: 场景名称
@@ -250,9 +917,10 @@ class GeminiImageGenerator:
             image_size: 图像大小
             aspect_ratio: 长宽比
             reference_image: 参考图片的本地路径（可选）
+            use_cache: 是否读取生成缓存
 
         Returns:
-            base64 编码的图片
+            生成结果
         """
         prompt = f"""生成一个{style}的漫画场景参考图。
 
@@ -272,12 +940,40 @@ class GeminiImageGenerator:
             logger.info(f"使用参考图: {reference_image}")
             image_refs = [self._load_image_as_base64(reference_image)]
 
-        return await self.generate_with_references(
+        return await self.generate_image(
             prompt=prompt,
             image_refs=image_refs,
             image_size=image_size,
-            aspect_ratio=aspect_ratio
+            aspect_ratio=aspect_ratio,
+            use_cache=use_cache
+        )
+
+    async def generate_scene_reference(
+        self,
+        scene_name: str,
+        description: str,
+        style: str = "日漫风格",
+        image_size: str = "2K",
+        aspect_ratio: str = "16:9",
+        reference_image: Optional[str] = None,
+        use_cache: bool = True
+    ) -> str:
+        """
+        生成场景参考图（参数同 generate_scene_reference_image）
+
+        Returns:
+            base64 编码的图片
+        """
+        image = await self.generate_scene_reference_image(
+            scene_name=scene_name,
+            description=description,
+            style=style,
+            image_size=image_size,
+            aspect_ratio=aspect_ratio,
+            reference_image=reference_image,
+            use_cache=use_cache
         )
+        return image.to_data_url()
 
     async def generate_comic_panel(
         self,
@@ -321,7 +1017,7 @@ class GeminiImageGenerator:
         quality: int = 75
     ) -> str:
         """
-        压缩 base64 图片
+        压缩 base64 图片（同步，会阻塞调用线程；异步代码中请使用 compress_base64_image_async）
 
         Args:
             base64_data: base64 编码的图片（可能包含 data URL 前缀）
@@ -331,45 +1027,9 @@ class GeminiImageGenerator:
         Returns:
             压缩后的 base64 编码图片（带 data URL 前缀）
         """
-        # 如果包含 data URL 前缀，去除它
-        if base64_data.startswith("data:"):
-            base64_data = base64_data.split(",", 1)[1]
-
-        # 解码图片
-        image_data = base64.b64decode(base64_data)
-        img = Image.open(io.BytesIO(image_data))
-
-        # 转换模式（RGBA -> RGB 如果需要）
-        if img.mode in ('RGBA', 'LA', 'P'):
-            # 创建白色背景
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # 按宽度缩放
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            logger.info(f"图片已缩放: {img.width}x{img.height}")
-
-        # 压缩为 JPEG
-        output = io.BytesIO()
-        img.save(output, format='JPEG', quality=quality, optimize=True)
-        compressed_data = output.getvalue()
-
-        # 计算压缩率
-        original_size = len(image_data)
-        compressed_size = len(compressed_data)
-        ratio = (1 - compressed_size / original_size) * 100
-        logger.info(f"图片压缩: {original_size // 1024}KB -> {compressed_size // 1024}KB (压缩率 {ratio:.1f}%)")
-
-        # 返回带前缀的 base64
-        return f"data:image/jpeg;base64,{base64.b64encode(compressed_data).decode('utf-8')}"
+        return image_processing.compress_base64_image(
+            base64_data, max_width=max_width, quality=quality, resize_mode=self.resize_mode
+        )
 
     def save_base64_image(
         self,
@@ -380,7 +1040,7 @@ class GeminiImageGenerator:
         quality: int = 75
     ) -> Path:
         """
-        保存 base64 图片到文件
+        保存 base64 图片到文件（同步，异步代码中请使用 save_base64_image_async）
 
         Args:
             base64_data: base64 编码的图片（可能包含 data URL 前缀）
@@ -392,20 +1052,66 @@ class GeminiImageGenerator:
         Returns:
             保存的文件路径
         """
-        # 压缩图片
-        if compress:
-            base64_data = self.compress_base64_image(base64_data, max_width=max_width, quality=quality)
+        return image_processing.save_base64_image(
+            base64_data, output_path, compress=compress, max_width=max_width, quality=quality, resize_mode=self.resize_mode
+        )
 
-        # 如果包含 data URL 前缀，去除它
-        if base64_data.startswith("data:"):
-            base64_data = base64_data.split(",")[1]
+    async def compress_base64_image_async(
+        self,
+        base64_data: str,
+        max_width: int = 1024,
+        quality: int = 75
+    ) -> str:
+        """在图片工作池中压缩 base64 图片，参数同 compress_base64_image"""
+        return await self.image_workers.run(
+            image_processing.compress_base64_image,
+            base64_data, max_width=max_width, quality=quality, resize_mode=self.resize_mode
+        )
 
-        # 解码并保存
-        image_data = base64.b64decode(base64_data)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+    async def ingest_reference_async(
+        self,
+        base64_data: str,
+        output_path: Path,
+        max_width: int = 1024,
+        quality: int = 75
+    ) -> Dict[str, Any]:
+        """
+        在图片工作池中完成参考图入库（一次解码、一次压缩，写文件并返回同一份压缩结果）
 
-        with open(output_path, 'wb') as f:
-            f.write(image_data)
+        Args:
+            base64_data: 生成的 base64 图片（可能包含 data URL 前缀）
+            output_path: 参考图文件路径
+            max_width: 最大宽度，超过则按比例缩小
+            quality: JPEG 质量 1-100
 
-        logger.info(f"图片已保存: {output_path}")
-        return output_path
+        Returns:
+            {"data_url"（压缩后的 base64，带 data URL 前缀）, "path", "size_bytes", "sha256"}
+        """
+        result = await self.image_workers.run(
+            image_processing.ingest_reference,
+            base64_data, output_path, max_width=max_width, quality=quality, resize_mode=self.resize_mode
+        )
+        total = result["process_s"] + result["write_s"]
+        self.ingest_stats["references"] += 1
+        self.ingest_stats["total_s"] += total
+        # 原先先压缩一次得到 base64，写文件时再解码压缩一次，省下的就是第二次处理的耗时
+        self.ingest_stats["saved_s"] += result["process_s"]
+        logger.info(
+            f"参考图入库: {result['size_bytes'] // 1024}KB，耗时 {total:.2f}s"
+            f"（省去重复压缩 {result['process_s']:.2f}s）"
+        )
+        return {key: result[key] for key in ("data_url", "path", "size_bytes", "sha256")}
+
+    async def save_base64_image_async(
+        self,
+        base64_data: str,
+        output_path: Path,
+        compress: bool = True,
+        max_width: int = 1024,
+        quality: int = 75
+    ) -> Path:
+        """在图片工作池中保存 base64 图片，参数同 save_base64_image"""
+        return await self.image_workers.run(
+            image_processing.save_base64_image,
+            base64_data, output_path, compress=compress, max_width=max_width, quality=quality, resize_mode=self.resize_mode
+        )
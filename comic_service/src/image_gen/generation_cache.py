@@ -0,0 +1,207 @@
+"""
+生成结果缓存
+按 (模型, 提示词, 参考图摘要, 图像大小, 长宽比) 的哈希对生成图片做内容寻址缓存，
+相同请求重试时直接返回已生成的图片，不再调用付费 API
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+from .image_processing import EXTENSION_BY_MIME
+
+# 缓存文件扩展名与 MIME 类型的映射（扩展名始终与文件内容一致）
+_EXT_BY_MIME = EXTENSION_BY_MIME
+_MIME_BY_EXT = {ext: mime for mime, ext in _EXT_BY_MIME.items()}
+
+
+def _sniff_mime(head: bytes) -> Optional[str]:
+    """按文件头识别图片格式，无法识别时返回 None"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "image/avif"
+    return None
+
+
+class GenerationCache:
+    """磁盘上的 LRU 生成缓存（文件名即缓存键，访问时间记录在文件 mtime 中）"""
+
+    def __init__(
+        self,
+        cache_dir: Path = Path("./config/cache/generations"),
+        max_size_mb: float = 2048
+    ):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存总大小上限（MB），超过后按最近最少使用淘汰
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> (文件路径, 大小)，按访问时间从旧到新排列
+        self._entries: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_entries()
+
+    def _load_entries(self):
+        """启动时扫描缓存目录，按 mtime 恢复 LRU 顺序"""
+        files = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix in _MIME_BY_EXT and path.is_file():
+                stat = path.stat()
+                files.append((stat.st_mtime, path, stat.st_size))
+
+        for _, path, size in sorted(files):
+            self._entries[path.stem] = (path, size)
+            self._total_bytes += size
+
+        if self._entries:
+            logger.info(f"生成缓存: {len(self._entries)} 项，{self._total_bytes // 1024 // 1024}MB")
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: str,
+        image_refs: Optional[List[str]],
+        image_size: str,
+        aspect_ratio: str
+    ) -> str:
+        """
+        计算缓存键
+
+        参考图只参与摘要（sha256），不把整张图放进键里
+        """
+        ref_digests = []
+        for ref in image_refs or []:
+            if ref.startswith("data:"):
+                ref = ref.split(",", 1)[1]
+            ref_digests.append(hashlib.sha256(ref.encode("utf-8")).hexdigest())
+
+        material = json.dumps(
+            {
+                "model": model,
+                "prompt": prompt,
+                "refs": ref_digests,
+                "image_size": image_size,
+                "aspect_ratio": aspect_ratio,
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Path, str]]:
+        """
+        查找缓存
+
+        Returns:
+            (缓存文件路径, MIME 类型)，未命中时返回 None
+        """
+        entry = self._entries.get(key)
+        if entry is None or not entry[0].exists():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+        path, _ = entry
+        self._entries.move_to_end(key)
+        os.utime(path)
+        self.hits += 1
+        return path, _MIME_BY_EXT[path.suffix]
+
+    def put_bytes(self, key: str, data: bytes, mime_type: str) -> Optional[Path]:
+        """写入图片字节（格式无法识别时不缓存，返回 None）"""
+        path = self._path_for(key, _sniff_mime(data[:16]) or mime_type)
+        if path is None:
+            return None
+        tmp_path = path.with_name(path.name + ".part")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        tmp_path.replace(path)
+        self._add(key, path)
+        return path
+
+    def put_file(self, key: str, source: Path, mime_type: str) -> Optional[Path]:
+        """复制已生成的图片文件（格式无法识别时不缓存，返回 None）"""
+        with open(source, 'rb') as f:
+            head = f.read(16)
+        path = self._path_for(key, _sniff_mime(head) or mime_type)
+        if path is None:
+            return None
+        tmp_path = path.with_name(path.name + ".part")
+        shutil.copyfile(source, tmp_path)
+        tmp_path.replace(path)
+        self._add(key, path)
+        return path
+
+    def _path_for(self, key: str, mime_type: str) -> Optional[Path]:
+        """
+        缓存文件路径，扩展名按实际格式确定（命中时据此返回 MIME 类型）
+
+        Args:
+            mime_type: 按文件头识别的格式，识别不了时为 API 声明的类型
+        """
+        ext = _EXT_BY_MIME.get(mime_type)
+        if ext is None:
+            logger.warning(f"不支持缓存的图片格式: {mime_type}")
+            return None
+        return self.cache_dir / f"{key}{ext}"
+
+    def _add(self, key: str, path: Path):
+        """登记新条目并按上限淘汰"""
+        if key in self._entries:
+            old_path, _ = self._entries[key]
+            self._drop(key)
+            if old_path != path and old_path.exists():
+                old_path.unlink()
+
+        size = path.stat().st_size
+        self._entries[key] = (path, size)
+        self._total_bytes += size
+        self._evict()
+
+    def _drop(self, key: str):
+        _, size = self._entries.pop(key)
+        self._total_bytes -= size
+
+    def _evict(self):
+        """淘汰最久未使用的条目，直到总大小不超过上限（至少保留最新一项）"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, (path, _) = next(iter(self._entries.items()))
+            self._drop(key)
+            if path.exists():
+                path.unlink()
+            self.evictions += 1
+            logger.debug(f"生成缓存淘汰: {key}")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_mb": round(self._total_bytes / 1024 / 1024, 2),
+            "max_size_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
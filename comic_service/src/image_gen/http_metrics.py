@@ -0,0 +1,109 @@
+"""
+HTTP 请求耗时统计
+基于 httpx/httpcore 的 trace 扩展，记录单次请求的连接、TLS、等待和传输耗时
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+
+class RequestTimings:
+    """单次 HTTP 请求的分阶段耗时（通过 httpx 的 trace 扩展采集）"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.connect_ms: Optional[float] = None
+        self.tls_ms: Optional[float] = None
+        self.ttfb_ms: Optional[float] = None
+        self.transfer_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self.http_version: Optional[str] = None
+        self.bytes_received: int = 0
+        self._marks: Dict[str, float] = {}
+
+    @property
+    def reused_connection(self) -> bool:
+        """本次请求是否复用了已有连接（没有发生 TCP 建连即为复用）"""
+        return self.connect_ms is None
+
+    async def trace(self, event_name: str, info: Dict[str, Any]):
+        """
+        httpcore trace 回调
+
+        事件名形如 "connection.connect_tcp.started"、"http2.receive_response_body.complete"
+        """
+        now = time.perf_counter()
+        prefix, _, rest = event_name.partition(".")
+        step, _, phase = rest.rpartition(".")
+
+        if phase == "started":
+            self._marks[step] = now
+            if step == "send_request_headers" and prefix in ("http11", "http2"):
+                self.http_version = "HTTP/2" if prefix == "http2" else "HTTP/1.1"
+            return
+
+        if phase != "complete" or step not in self._marks:
+            return
+
+        elapsed_ms = (now - self._marks[step]) * 1000
+        if step == "connect_tcp":
+            self.connect_ms = elapsed_ms
+        elif step == "start_tls":
+            self.tls_ms = elapsed_ms
+        elif step == "receive_response_headers":
+            # 从请求发出到收到响应头，近似为服务端处理时间（TTFB）
+            sent_at = self._marks.get("send_request_headers", self._marks[step])
+            self.ttfb_ms = (now - sent_at) * 1000
+        elif step == "receive_response_body":
+            self.transfer_ms = elapsed_ms
+
+    def finish(self, bytes_received: int = 0):
+        """请求结束时调用，记录总耗时"""
+        self.total_ms = (time.perf_counter() - self.started_at) * 1000
+        self.bytes_received = bytes_received
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典（毫秒，保留一位小数）"""
+        def _round(value: Optional[float]) -> Optional[float]:
+            return round(value, 1) if value is not None else None
+
+        return {
+            "http_version": self.http_version,
+            "reused_connection": self.reused_connection,
+            "connect_ms": _round(self.connect_ms),
+            "tls_ms": _round(self.tls_ms),
+            "ttfb_ms": _round(self.ttfb_ms),
+            "transfer_ms": _round(self.transfer_ms),
+            "total_ms": _round(self.total_ms),
+            "bytes_received": self.bytes_received,
+        }
+
+
+class HttpStats:
+    """连接池累计统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.connect_ms_total = 0.0
+        self.tls_ms_total = 0.0
+
+    def record(self, timings: RequestTimings):
+        """记录一次请求"""
+        self.requests += 1
+        if timings.reused_connection:
+            self.reused_connections += 1
+        else:
+            self.new_connections += 1
+            self.connect_ms_total += timings.connect_ms or 0.0
+            self.tls_ms_total += timings.tls_ms or 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "handshake_ms_total": round(self.connect_ms_total + self.tls_ms_total, 1),
+        }
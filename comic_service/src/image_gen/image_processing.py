@@ -0,0 +1,359 @@
+"""
+图片处理
+解码、缩放、JPEG 压缩和写文件等 CPU/磁盘密集操作。
+均为模块级纯函数，可以在线程池或进程池中执行，不阻塞事件循环
+"""
+
+import base64
+import hashlib
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+from PIL import Image
+
+
+def strip_data_url(base64_data: str) -> str:
+    """去除 data URL 前缀"""
+    if base64_data.startswith("data:"):
+        return base64_data.split(",", 1)[1]
+    return base64_data
+
+
+# MIME 类型与文件扩展名
+EXTENSION_BY_MIME = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+}
+
+# 交付版本的格式：PIL 格式名、扩展名
+RENDITION_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "avif": ("AVIF", ".avif"),
+}
+
+
+# 缩放策略（质量 vs 速度）
+# draft_gap: JPEG 解码时按 1/2、1/4、1/8 直接在 DCT 域缩小，保证解码结果不小于目标尺寸的 draft_gap 倍
+# reducing_gap: 先用整数倍 reduce() 快速缩小，保证不小于目标尺寸的 reducing_gap 倍，再做精确重采样
+# 两者都只在缩放比（原宽 / 目标宽）≥ 2 × gap 时生效
+# half_draft: 余量不足 draft_gap 时，缩放比 ≥2 的 JPEG 仍按 1/2 解码（1/2 的 DCT 缩小几乎不损失细节）
+# - balanced：JPEG 缩放比 ≥2 时按 1/2 起解码（2048/3584/4096 -> 1024），再 LANCZOS；
+#   其他格式缩放比 ≥4 时才先 reduce()；1792 -> 1024（1.75 倍）与 quality 相同
+# - fast：缩放比 ≥2 时 JPEG 按 1/2 起解码、其他格式先 reduce()；不到 2 倍时只省在双线性插值上
+# PNG/WebP 总是全尺寸解码，reduce() 只省缩放时间，不省解码内存；JPEG 的 draft() 两者都省
+RESIZE_MODES: Dict[str, Dict[str, Any]] = {
+    "quality": {"draft_gap": None, "half_draft": False, "reducing_gap": None, "resample": Image.Resampling.LANCZOS},
+    "balanced": {"draft_gap": 2.0, "half_draft": True, "reducing_gap": 2.0, "resample": Image.Resampling.LANCZOS},
+    "fast": {"draft_gap": 1.0, "half_draft": False, "reducing_gap": 1.0, "resample": Image.Resampling.BILINEAR},
+}
+
+
+def _target_size(size: Tuple[int, int], max_width: int) -> Tuple[int, int]:
+    width, height = size
+    if width <= max_width:
+        return size
+    return max_width, int(height * max_width / width)
+
+
+def _flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """转换为 RGB（透明部分填充白色背景）"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def load_resized(image_data: bytes, max_width: int = 1024, resize_mode: str = "balanced") -> Image.Image:
+    """
+    解码并按宽度缩放图片，按输入格式和缩放比例选择最快的正确策略
+
+    - JPEG：draft() 让解码器直接输出 1/2、1/4 或 1/8 尺寸，省去全尺寸解码的 CPU 和内存
+    - 其他格式（PNG/WebP 等）：resize(reducing_gap=...) 先整数倍 reduce()，再对小图做重采样
+    - quality 模式保持全尺寸解码 + LANCZOS
+
+    Args:
+        image_data: 原始图片字节
+        max_width: 最大宽度，超过则按比例缩小
+        resize_mode: 缩放策略，quality / balanced / fast
+
+    Returns:
+        RGB 模式的 PIL 图片
+    """
+    if resize_mode not in RESIZE_MODES:
+        raise ValueError(f"不支持的缩放策略: {resize_mode}（可选 {', '.join(RESIZE_MODES)}）")
+    settings = RESIZE_MODES[resize_mode]
+
+    img = Image.open(io.BytesIO(image_data))
+    source_size = img.size
+    target = _target_size(img.size, max_width)
+
+    if target != img.size and img.format == "JPEG" and settings["draft_gap"]:
+        gap = settings["draft_gap"]
+        requested = (int(target[0] * gap), int(target[1] * gap))
+        if settings["half_draft"]:
+            # 不超过原图的一半，但不小于目标尺寸：缩放比 ≥2 时至少按 1/2 解码
+            requested = tuple(
+                max(want, min(size, half))
+                for want, size, half in zip(target, requested, (source_size[0] // 2, source_size[1] // 2))
+            )
+        img.draft("RGB", requested)
+
+    img = _flatten_to_rgb(img)
+
+    if target != source_size:
+        img = img.resize(target, settings["resample"], reducing_gap=settings["reducing_gap"])
+        logger.info(f"图片已缩放: {source_size[0]}x{source_size[1]} -> {img.width}x{img.height} ({resize_mode})")
+
+    return img
+
+
+def compress_image_bytes(
+    image_data: bytes,
+    max_width: int = 1024,
+    quality: int = 75,
+    resize_mode: str = "balanced"
+) -> bytes:
+    """
+    压缩图片字节为 JPEG
+
+    Args:
+        image_data: 原始图片字节
+        max_width: 最大宽度，超过则按比例缩小（默认 1024）
+        quality: JPEG 质量 1-100，默认 75
+        resize_mode: 缩放策略，quality / balanced / fast（见 RESIZE_MODES）
+
+    Returns:
+        压缩后的 JPEG 字节
+    """
+    img = load_resized(image_data, max_width=max_width, resize_mode=resize_mode)
+
+    # 压缩为 JPEG
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=True)
+    compressed_data = output.getvalue()
+
+    # 计算压缩率
+    original_size = len(image_data)
+    compressed_size = len(compressed_data)
+    ratio = (1 - compressed_size / original_size) * 100
+    logger.info(f"图片压缩: {original_size // 1024}KB -> {compressed_size // 1024}KB (压缩率 {ratio:.1f}%)")
+
+    return compressed_data
+
+
+def compress_base64_image(
+    base64_data: str,
+    max_width: int = 1024,
+    quality: int = 75,
+    resize_mode: str = "balanced"
+) -> str:
+    """
+    压缩 base64 图片
+
+    Args:
+        base64_data: base64 编码的图片（可能包含 data URL 前缀）
+        max_width: 最大宽度，超过则按比例缩小（默认 1024）
+        quality: JPEG 质量 1-100，默认 75
+        resize_mode: 缩放策略，quality / balanced / fast
+
+    Returns:
+        压缩后的 base64 编码图片（带 data URL 前缀）
+    """
+    image_data = base64.b64decode(strip_data_url(base64_data))
+    compressed_data = compress_image_bytes(image_data, max_width=max_width, quality=quality, resize_mode=resize_mode)
+
+    # 返回带前缀的 base64
+    return f"data:image/jpeg;base64,{base64.b64encode(compressed_data).decode('utf-8')}"
+
+
+def save_base64_image(
+    base64_data: str,
+    output_path: Path,
+    compress: bool = True,
+    max_width: int = 1024,
+    quality: int = 75,
+    resize_mode: str = "balanced"
+) -> Path:
+    """
+    保存 base64 图片到文件
+
+    Args:
+        base64_data: base64 编码的图片（可能包含 data URL 前缀）
+        output_path: 输出文件路径
+        compress: 是否压缩图片
+        max_width: 最大宽度，超过则按比例缩小
+        quality: JPEG 质量 1-100
+        resize_mode: 缩放策略，quality / balanced / fast
+
+    Returns:
+        保存的文件路径
+    """
+    # 解码
+    image_data = base64.b64decode(strip_data_url(base64_data))
+
+    # 压缩图片
+    if compress:
+        image_data = compress_image_bytes(image_data, max_width=max_width, quality=quality, resize_mode=resize_mode)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(output_path, 'wb') as f:
+        f.write(image_data)
+
+    logger.info(f"图片已保存: {output_path}")
+    return output_path
+
+
+def ingest_reference(
+    base64_data: str,
+    output_path: Path,
+    max_width: int = 1024,
+    quality: int = 75,
+    resize_mode: str = "balanced"
+) -> Dict[str, Any]:
+    """
+    参考图入库：解码和压缩各只做一次，同一份压缩结果既写入文件，也作为内存中的 base64
+
+    Args:
+        base64_data: 生成的 base64 图片（可能包含 data URL 前缀）
+        output_path: 参考图文件路径
+        max_width: 最大宽度，超过则按比例缩小
+        quality: JPEG 质量 1-100
+        resize_mode: 缩放策略，quality / balanced / fast
+
+    Returns:
+        {"data_url", "path", "size_bytes", "sha256", "process_s", "write_s"}，
+        process_s 为解码+缩放+编码耗时（即原先第二次压缩所重复的开销）
+    """
+    started = time.perf_counter()
+    image_data = base64.b64decode(strip_data_url(base64_data))
+    compressed_data = compress_image_bytes(image_data, max_width=max_width, quality=quality, resize_mode=resize_mode)
+    data_url = f"data:image/jpeg;base64,{base64.b64encode(compressed_data).decode('utf-8')}"
+    processed = time.perf_counter()
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(compressed_data)
+    written = time.perf_counter()
+
+    logger.info(f"图片已保存: {output_path}")
+    return {
+        "data_url": data_url,
+        "path": str(output_path),
+        "size_bytes": len(compressed_data),
+        "sha256": hashlib.sha256(compressed_data).hexdigest(),
+        "process_s": processed - started,
+        "write_s": written - processed,
+    }
+
+
+def _save_encoded(img: Image.Image, output_path: Path, fmt: str, quality: int) -> Dict[str, Any]:
+    """按交付格式编码并原子写入文件"""
+    pil_format, _ = RENDITION_FORMATS[fmt]
+    options: Dict[str, Any] = {"quality": quality}
+    if fmt == "jpeg":
+        options.update(optimize=True, progressive=True)
+    elif fmt == "webp":
+        options.update(method=4)
+    elif fmt == "avif":
+        options.update(speed=6)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".part")
+    img.save(tmp_path, format=pil_format, **options)
+    tmp_path.replace(output_path)
+
+    return {
+        "format": fmt,
+        "path": str(output_path),
+        "size_bytes": output_path.stat().st_size,
+        "width": img.width,
+        "height": img.height,
+    }
+
+
+def encode_rendition(
+    source_path: Path,
+    output_path: Path,
+    fmt: str,
+    quality: int,
+    max_width: Optional[int] = None,
+    resize_mode: str = "balanced"
+) -> Dict[str, Any]:
+    """
+    从母版编码一个交付版本（渐进式 JPEG / WebP / AVIF）
+
+    Args:
+        source_path: 母版文件路径
+        output_path: 输出文件路径
+        fmt: 格式，jpeg / webp / avif
+        quality: 质量 1-100
+        max_width: 最大宽度（None 表示保持原尺寸）
+        resize_mode: 缩放策略，quality / balanced / fast
+
+    Returns:
+        {"format", "path", "size_bytes", "width", "height", "encode_s"}
+    """
+    started = time.perf_counter()
+    img = load_resized(Path(source_path).read_bytes(), max_width=max_width or sys.maxsize, resize_mode=resize_mode)
+    result = _save_encoded(img, output_path, fmt, quality)
+    result["encode_s"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def build_previews(
+    source_path: Path,
+    preview_path: Path,
+    thumbnail_path: Path,
+    preview_width: int = 1024,
+    thumbnail_width: int = 256,
+    fmt: str = "jpeg",
+    quality: int = 80,
+    resize_mode: str = "balanced"
+) -> Dict[str, Any]:
+    """
+    生成预览金字塔：母版只解码一次得到预览图，缩略图再从预览图缩小
+
+    Args:
+        source_path: 母版文件路径
+        preview_path: 预览图路径
+        thumbnail_path: 缩略图路径
+        preview_width: 预览图最大宽度
+        thumbnail_width: 缩略图最大宽度
+        fmt: 格式，jpeg / webp / avif
+        quality: 质量 1-100
+        resize_mode: 缩放策略，quality / balanced / fast
+
+    Returns:
+        {"source_width", "source_height", "preview", "thumbnail", "encode_s"}
+    """
+    started = time.perf_counter()
+    with Image.open(source_path) as source:
+        source_size = source.size
+    preview = load_resized(Path(source_path).read_bytes(), max_width=preview_width, resize_mode=resize_mode)
+    thumbnail = preview.resize(
+        _target_size(preview.size, thumbnail_width),
+        RESIZE_MODES[resize_mode]["resample"],
+        reducing_gap=RESIZE_MODES[resize_mode]["reducing_gap"]
+    )
+    return {
+        "source_width": source_size[0],
+        "source_height": source_size[1],
+        "preview": _save_encoded(preview, preview_path, fmt, quality),
+        "thumbnail": _save_encoded(thumbnail, thumbnail_path, fmt, quality),
+        "encode_s": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,225 @@
+"""
+页面生成日志（追加写入的 JSONL）
+记录每一页的输入（依赖项）及其哈希、状态和输出路径，以及后台任务的状态。服务崩溃或会话中断后：
+- 输入未变化且输出文件仍在的页面直接跳过
+- 未结束的后台任务在重启时重新排队
+- 参考图、页面内容或参数变化后，可以按依赖关系找出需要重新生成的页面
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from ..models.job import Job
+
+# 页面状态
+PAGE_RUNNING = "running"
+PAGE_DONE = "done"
+PAGE_FAILED = "failed"
+
+# 被覆盖的旧记录超过该行数且占多数时，启动时压缩日志
+COMPACT_MIN_LINES = 1000
+
+# 参考图类型的显示名
+REFERENCE_LABELS = {"characters": "角色", "scenes": "场景"}
+
+# 记录在输入中但不参与哈希的字段
+UNHASHED_INPUTS = {"style_reference_path"}
+
+
+def input_hash(inputs: Dict[str, Any]) -> str:
+    """页面输入的哈希，任一依赖项变化都会改变"""
+    hashed = {key: value for key, value in inputs.items() if key not in UNHASHED_INPUTS}
+    return hashlib.sha256(json.dumps(hashed, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def diff_inputs(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> List[str]:
+    """
+    比较两次的页面输入，返回变化原因
+
+    Args:
+        old: 上次生成时记录的输入（旧日志没有时为 None）
+        new: 当前输入，{"page", "image_size", "aspect_ratio", "style", "style_reference", "style_reference_path",
+             "characters": {ID: sha256}, "scenes": {...}, "missing_references": [名称]}
+    """
+    if not old:
+        return ["没有记录上次生成的输入"]
+    reasons = []
+    if old.get("page") != new["page"]:
+        reasons.append("页面内容已修改")
+    for key in ("image_size", "aspect_ratio", "style"):
+        if old.get(key) != new[key]:
+            reasons.append(f"{key}: {old.get(key)} → {new[key]}")
+    if old.get("style_reference") != new["style_reference"]:
+        reasons.append("风格参考图已修改")
+    for kind, label in REFERENCE_LABELS.items():
+        old_refs, new_refs = old.get(kind, {}), new[kind]
+        for obj_id in sorted(new_refs.keys() - old_refs.keys()):
+            reasons.append(f"新用到{label}参考图: {obj_id}")
+        for obj_id in sorted(old_refs.keys() - new_refs.keys()):
+            reasons.append(f"不再用到{label}参考图: {obj_id}")
+        for obj_id in sorted(new_refs.keys() & old_refs.keys()):
+            if new_refs[obj_id] != old_refs[obj_id]:
+                reasons.append(f"{label}参考图已更新: {obj_id}")
+    old_missing, new_missing = set(old.get("missing_references", [])), set(new["missing_references"])
+    if old_missing - new_missing:
+        reasons.append(f"已有参考图: {', '.join(sorted(old_missing - new_missing))}")
+    if new_missing - old_missing:
+        reasons.append(f"没有参考图: {', '.join(sorted(new_missing - old_missing))}")
+    return reasons
+
+
+class JobJournal:
+    """页面和后台任务的持久化日志"""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: 日志文件路径（JSONL，每行一条记录，只追加）
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 每页 / 每个任务的最新记录
+        self.pages: Dict[int, Dict[str, Any]] = {}
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        lines = self._load()
+        if lines > COMPACT_MIN_LINES and lines > 2 * (len(self.pages) + len(self.jobs)):
+            self._compact()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        # 已写入但还没有 fsync 的记录数；sync() 在线程中落盘，并发调用合并为一次
+        self._unsynced = 0
+        self._sync_lock = asyncio.Lock()
+
+    def _load(self) -> int:
+        """重放日志，返回行数（崩溃时写了一半的最后一行被忽略）"""
+        if not self.path.exists():
+            return 0
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"忽略损坏的日志行 {self.path}:{lines}")
+                    continue
+                self._apply(record)
+        logger.info(f"生成日志: {len(self.pages)} 页，{len(self.jobs)} 个任务（{lines} 行）")
+        return lines
+
+    def _apply(self, record: Dict[str, Any]):
+        if record.get("type") == "page":
+            self.pages[record["page_number"]] = record
+        elif record.get("type") == "job":
+            self.jobs[record["job"]["job_id"]] = record
+
+    def _compact(self):
+        """只保留每页、每个任务的最新记录"""
+        tmp_path = self.path.with_name(self.path.name + ".part")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in list(self.pages.values()) + list(self.jobs.values()):
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        tmp_path.replace(self.path)
+        logger.info(f"生成日志已压缩: {self.path}")
+
+    def _append(self, record: Dict[str, Any]):
+        """追加一条记录（写入系统缓冲区，进程崩溃不会丢失；落盘由 sync() 批量完成）"""
+        record["time"] = datetime.now().isoformat(timespec="seconds")
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        self._apply(record)
+
+    async def sync(self):
+        """把已追加的记录落盘（页面或任务结束时调用；fsync 在线程中执行，不阻塞事件循环）"""
+        async with self._sync_lock:
+            if not self._unsynced:
+                # 等锁期间其他调用已经落盘
+                return
+            self._unsynced = 0
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+
+    def close(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._file.close()
+
+    # ========== 页面 ==========
+
+    def page_started(self, page_number: int, input_hash: str, inputs: Optional[Dict[str, Any]] = None):
+        self._append({
+            "type": "page", "page_number": page_number, "state": PAGE_RUNNING,
+            "input_hash": input_hash, "inputs": inputs,
+        })
+
+    def page_done(
+        self,
+        page_number: int,
+        input_hash: str,
+        result: Dict[str, Any],
+        inputs: Optional[Dict[str, Any]] = None
+    ):
+        self._append({
+            "type": "page", "page_number": page_number, "state": PAGE_DONE,
+            "input_hash": input_hash, "inputs": inputs,
+            "image_path": result["image_path"], "result": result,
+        })
+
+    def page_failed(self, page_number: int, input_hash: str, error: str, inputs: Optional[Dict[str, Any]] = None):
+        self._append({
+            "type": "page", "page_number": page_number, "state": PAGE_FAILED,
+            "input_hash": input_hash, "inputs": inputs, "error": error,
+        })
+
+    def completed_page(self, page_number: int, input_hash: str) -> Optional[Dict[str, Any]]:
+        """输入哈希相同且输出文件仍在时，返回该页的完成记录"""
+        record = self.pages.get(page_number)
+        if (
+            record is not None
+            and record["state"] == PAGE_DONE
+            and record["input_hash"] == input_hash
+            and Path(record["image_path"]).exists()
+        ):
+            return record
+        return None
+
+    def pages_using(self, kind: str, obj_id: str) -> Dict[int, Optional[str]]:
+        """
+        上次生成时用到某个参考图的页面（依赖关系的反向索引）
+
+        Args:
+            kind: "characters" 或 "scenes"
+
+        Returns:
+            {页码: 生成时参考图的 sha256}
+        """
+        pages = {}
+        for page_number, record in self.pages.items():
+            refs = (record.get("inputs") or {}).get(kind, {})
+            if obj_id in refs:
+                pages[page_number] = refs[obj_id]
+        return dict(sorted(pages.items()))
+
+    # ========== 后台任务 ==========
+
+    def job_changed(self, job: Job):
+        """记录任务状态变化"""
+        self._append({"type": "job", "job": job.model_dump(mode="json")})
+
+    def restore_jobs(self) -> List[Job]:
+        """日志中的所有任务（按创建时间排序）"""
+        jobs = [Job(**record["job"]) for record in self.jobs.values()]
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        states: Dict[str, int] = {}
+        for record in self.pages.values():
+            states[record["state"]] = states.get(record["state"], 0) + 1
+        return {"path": str(self.path), "pages": states, "jobs": len(self.jobs)}
@@ -0,0 +1,204 @@
+"""
+后台任务队列
+提交的生成任务立即返回任务 ID，由进程内的若干工作协程依次执行，调用方随后查询、等待或取消。
+生成请求本身的并发仍由 RequestLimiter 控制。配置了 JobJournal 时任务状态写入日志，
+服务关闭或崩溃时未结束的任务在下次启动时以原任务 ID 重新排队
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+
+from ..models.job import Job, QUEUED, RUNNING, DONE, FAILED, CANCELLED
+
+
+class JobQueue:
+    """进程内后台任务队列"""
+
+    def __init__(
+        self,
+        runner: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        max_workers: int = 2,
+        max_finished: int = 200,
+        journal=None,
+        resume: bool = True
+    ):
+        """
+        Args:
+            runner: 执行任务的协程函数 runner(tool, arguments) -> 结果字典
+            max_workers: 同时执行的任务数
+            max_finished: 保留的已结束任务数，超出后删除最早结束的
+            journal: 任务日志（JobJournal），为 None 时任务只保存在内存中
+            resume: 启动时是否重新执行日志中未结束的任务
+        """
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.journal = journal
+        self.resume = resume
+
+        self.jobs: Dict[str, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._done_events: Dict[str, asyncio.Event] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._workers: List[asyncio.Task] = []
+        # 通过 cancel() 取消的执行中任务（与服务关闭时的取消区分）
+        self._cancel_requested = set()
+        self.resumed = 0
+
+    def _record(self, job: Job):
+        if self.journal is not None:
+            self.journal.job_changed(job)
+
+    async def _sync(self):
+        """任务结束后把日志落盘"""
+        if self.journal is not None:
+            await self.journal.sync()
+
+    def _enqueue(self, job: Job):
+        self.jobs[job.job_id] = job
+        self._done_events[job.job_id] = asyncio.Event()
+        self._record(job)
+        self._queue.put_nowait(job.job_id)
+
+    def submit(self, tool: str, arguments: Dict[str, Any]) -> Job:
+        """提交任务，立即返回"""
+        job = Job(job_id=f"job_{uuid.uuid4().hex[:12]}", tool=tool, arguments=arguments)
+        self._enqueue(job)
+        logger.info(f"📥 任务已提交: {job.job_id}（{tool}），排队 {self._queue.qsize()}")
+        return job
+
+    def _restore(self):
+        """从日志恢复任务：已结束的任务可以继续查询，未结束的任务重新排队"""
+        for job in self.journal.restore_jobs():
+            if job.finished:
+                self.jobs[job.job_id] = job
+                self._done_events[job.job_id] = asyncio.Event()
+                self._done_events[job.job_id].set()
+            elif self.resume:
+                job.status = QUEUED
+                job.started_at = None
+                self._enqueue(job)
+                self.resumed += 1
+                logger.info(f"🔁 恢复未完成的任务: {job.job_id}（{job.tool}）")
+        self._prune()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _finish(
+        self,
+        job: Job,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        persist: bool = True
+    ):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = datetime.now()
+        if persist:
+            self._record(job)
+        self._done_events[job.job_id].set()
+        self._prune()
+
+    def _prune(self):
+        finished = sorted((j for j in self.jobs.values() if j.finished), key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job.job_id]
+            self._done_events.pop(job.job_id, None)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                # 排队期间已取消
+                continue
+
+            job.status = RUNNING
+            job.started_at = datetime.now()
+            self._record(job)
+            logger.info(f"▶️  任务开始: {job_id}（{job.tool}）")
+            task = asyncio.create_task(self.runner(job.tool, job.arguments))
+            self._running[job_id] = task
+            try:
+                result = await task
+                self._finish(job, DONE, result=result)
+                logger.info(f"✅ 任务完成: {job_id}")
+            except asyncio.CancelledError:
+                if job_id in self._cancel_requested:
+                    self._finish(job, CANCELLED, error="任务已取消")
+                    logger.info(f"任务已取消: {job_id}")
+                else:
+                    # 工作协程本身被取消（服务关闭）：日志中保持执行中，下次启动时继续
+                    self._finish(job, CANCELLED, error="服务关闭，任务中断", persist=False)
+                    logger.info(f"服务关闭，任务中断: {job_id}")
+                    raise
+            except Exception as e:
+                self._finish(job, FAILED, error=str(e))
+                logger.error(f"任务失败: {job_id}: {e}")
+            finally:
+                self._running.pop(job_id, None)
+                self._cancel_requested.discard(job_id)
+            # 在 try 之外落盘：此时被取消（服务关闭）不会改写已结束任务的状态
+            await self._sync()
+
+    async def wait(self, job_ids: List[str], timeout: float) -> bool:
+        """
+        等待任务结束
+
+        Returns:
+            是否全部结束（超时返回 False）
+        """
+        events = [self._done_events[job_id].wait() for job_id in job_ids if job_id in self._done_events]
+        if not events:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.gather(*events), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中或执行中的任务"""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.status == QUEUED:
+            self._finish(job, CANCELLED, error="任务已取消")
+            logger.info(f"任务已取消（排队中）: {job_id}")
+        else:
+            self._cancel_requested.add(job_id)
+            self._running[job_id].cancel()
+        return True
+
+    async def start(self):
+        """启动工作协程（首次启动时从日志恢复任务）"""
+        if self.journal is not None and not self.jobs:
+            self._restore()
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def stop(self):
+        """停止工作协程，取消执行中的任务"""
+        for task in list(self._running.values()):
+            task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    def stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {"max_workers": self.max_workers, "resumed": self.resumed, **counts}
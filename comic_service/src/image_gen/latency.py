@@ -0,0 +1,171 @@
+"""
+请求延迟历史与自适应超时
+按请求类别（模型、图像大小、参考图数量）记录最近的成功请求耗时，提供分位数查询，
+并据此推导连接/读取超时；历史可持久化，重启后继续使用
+"""
+
+import json
+import math
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+from loguru import logger
+
+# 建连耗时（TCP + TLS）样本使用的键
+CONNECT_KEY = "connect"
+
+
+def latency_key(model: str, image_size: str, ref_count: int) -> str:
+    """延迟分组键：模型 + 图像大小 + 参考图数量（6 张及以上合并）"""
+    refs = str(ref_count) if ref_count < 6 else "6+"
+    return f"{model}|{image_size}|{refs}"
+
+
+class LatencyHistory:
+    """按键分组的滚动延迟样本"""
+
+    def __init__(self, max_samples: int = 200):
+        """
+        Args:
+            max_samples: 每个键保留的最近样本数
+        """
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float):
+        """记录一次成功请求的耗时（秒）"""
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.max_samples)
+        samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        """样本数"""
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """
+        计算分位数（最近秩法）
+
+        Args:
+            key: 分组键
+            q: 分位（0-1，如 0.9 表示 p90）
+
+        Returns:
+            分位数耗时（秒），没有样本时返回 None
+        """
+        samples = self._samples.get(key)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(1, math.ceil(q * len(ordered)))
+        return ordered[rank - 1]
+
+    def save(self, path: Path):
+        """保存到 JSON 文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".part")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({key: list(samples) for key, samples in self._samples.items()}, f)
+        tmp_path.replace(path)
+
+    def load(self, path: Path):
+        """从 JSON 文件加载（文件不存在或损坏时忽略）"""
+        if not path.exists():
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"延迟历史加载失败 {path}: {e}")
+            return
+        for key, samples in data.items():
+            self._samples[key] = deque((float(v) for v in samples), maxlen=self.max_samples)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各分组的样本数和 p50/p90/p99"""
+        def _round(value: Optional[float]) -> Optional[float]:
+            return round(value, 2) if value is not None else None
+
+        return {
+            key: {
+                "samples": len(samples),
+                "p50_s": _round(self.percentile(key, 0.5)),
+                "p90_s": _round(self.percentile(key, 0.9)),
+                "p99_s": _round(self.percentile(key, 0.99)),
+            }
+            for key, samples in self._samples.items()
+        }
+
+
+class AdaptiveTimeouts:
+    """根据延迟历史推导超时：读取超时 = p99 × 安全系数，限制在 [min_read, max_read] 内"""
+
+    def __init__(
+        self,
+        history: LatencyHistory,
+        connect_timeout: float = 10.0,
+        safety_factor: float = 2.0,
+        min_read: float = 30.0,
+        max_read: float = 600.0,
+        min_samples: int = 5,
+        default_read: Optional[Dict[str, float]] = None,
+        overrides: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            history: 延迟历史
+            connect_timeout: 连接超时上限（秒），建连样本足够时按 p99 × 安全系数收紧
+            safety_factor: 安全系数
+            min_read: 读取超时下限（秒）
+            max_read: 读取超时上限（秒）
+            min_samples: 样本数达到该值后才使用历史推导
+            default_read: 样本不足时各图像大小的默认读取超时（秒）
+            overrides: 各图像大小的固定读取超时（秒），优先于历史推导
+        """
+        self.history = history
+        self.connect_timeout = connect_timeout
+        self.safety_factor = safety_factor
+        self.min_read = min_read
+        self.max_read = max_read
+        self.min_samples = min_samples
+        self.default_read = default_read or {"1K": 120.0, "2K": 120.0, "4K": 240.0}
+        self.overrides = overrides or {}
+
+    def derive(self, key: str, image_size: str, explicit: Optional[float] = None) -> Dict[str, Any]:
+        """
+        推导一次请求的超时
+
+        Args:
+            key: 延迟分组键
+            image_size: 图像大小
+            explicit: 调用方显式指定的读取超时（秒），优先级最高
+
+        Returns:
+            {"connect_s", "read_s", "source", "p99_s", "samples"}
+        """
+        connect = self.connect_timeout
+        if self.history.count(CONNECT_KEY) >= self.min_samples:
+            connect_p99 = self.history.percentile(CONNECT_KEY, 0.99)
+            connect = min(self.connect_timeout, max(2.0, connect_p99 * self.safety_factor))
+
+        samples = self.history.count(key)
+        p99 = self.history.percentile(key, 0.99)
+
+        if explicit is not None:
+            read, source = float(explicit), "explicit"
+        elif image_size in self.overrides:
+            read, source = float(self.overrides[image_size]), "override"
+        elif samples >= self.min_samples:
+            read = min(self.max_read, max(self.min_read, p99 * self.safety_factor))
+            source = "history"
+        else:
+            read, source = float(self.default_read.get(image_size, 120.0)), "default"
+
+        return {
+            "connect_s": round(connect, 1),
+            "read_s": round(read, 1),
+            "source": source,
+            "p99_s": round(p99, 2) if p99 is not None else None,
+            "samples": samples,
+        }
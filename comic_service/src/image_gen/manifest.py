@@ -0,0 +1,165 @@
+"""
+参考图库索引
+把目录中每个人物/场景 JSON 的关键字段（ID、名称、别名、哈希、mtime、文件名）汇总到一个紧凑的
+.manifest.json 中。启动时只对比文件的 mtime 和大小，新增或修改的文件才重新读取，
+完整的 Character/Scene 对象在用到时才创建；名称和别名同时维护在 NameIndex 中
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from .name_index import NameIndex
+
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ReferenceManifest:
+    """参考图库目录索引"""
+
+    def __init__(self, storage_dir: Path, id_field: str, min_match_score: float = 0.75):
+        """
+        Args:
+            storage_dir: 参考图库目录
+            id_field: JSON 中的 ID 字段名（character_id / scene_id）
+            min_match_score: 名称模糊匹配的最低置信度
+        """
+        self.storage_dir = Path(storage_dir)
+        self.id_field = id_field
+        self.path = self.storage_dir / MANIFEST_NAME
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.names = NameIndex(min_score=min_match_score)
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"参考图索引损坏，将重新生成 {self.path}: {e}")
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            return
+        self._entries = {entry["id"]: entry for entry in data.get("entries", [])}
+        self._reindex()
+
+    def _save(self):
+        tmp_path = self.path.with_name(self.path.name + ".part")
+        content = json.dumps(
+            {"version": MANIFEST_VERSION, "entries": list(self._entries.values())},
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        tmp_path.replace(self.path)
+
+    def _reindex(self):
+        self.names.clear()
+        for obj_id, entry in self._entries.items():
+            self.names.add(obj_id, entry["name"], entry["aliases"])
+
+    def _read_entry(self, json_file: Path, stat: os.stat_result) -> Dict[str, Any]:
+        """读取一个 JSON 文件的索引字段（不做 pydantic 校验）"""
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        reference = data.get("reference_image") or {}
+        return {
+            "id": data[self.id_field],
+            "name": data["name"],
+            "aliases": data.get("aliases", []),
+            "sha256": reference.get("sha256"),
+            # 内嵌 base64 的旧版文件，需要迁移
+            "legacy": reference.get("sha256") is None,
+            "file": json_file.name,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+        }
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        与目录内容同步：只重新读取新增或 mtime/大小变化的文件，删除已不存在的条目
+
+        Returns:
+            {"added", "updated", "removed", "total"}
+        """
+        files: Dict[str, os.stat_result] = {}
+        if self.storage_dir.exists():
+            with os.scandir(self.storage_dir) as it:
+                for dir_entry in it:
+                    # 跳过 .manifest.json、.usage.json 等隐藏文件
+                    if dir_entry.name.endswith(".json") and not dir_entry.name.startswith(".") and dir_entry.is_file():
+                        files[dir_entry.name] = dir_entry.stat()
+
+        by_file = {entry["file"]: obj_id for obj_id, entry in self._entries.items()}
+        added = updated = removed = 0
+
+        for name, stat in files.items():
+            old_id = by_file.get(name)
+            old = self._entries.get(old_id) if old_id else None
+            if old and old["mtime_ns"] == stat.st_mtime_ns and old["size"] == stat.st_size:
+                continue
+            try:
+                entry = self._read_entry(self.storage_dir / name, stat)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"读取参考图文件失败 {name}: {e}")
+                continue
+            if old:
+                del self._entries[old_id]
+                updated += 1
+            else:
+                added += 1
+            self._entries[entry["id"]] = entry
+
+        for obj_id, entry in list(self._entries.items()):
+            if entry["file"] not in files:
+                del self._entries[obj_id]
+                removed += 1
+
+        if added or updated or removed or not self.path.exists():
+            self._reindex()
+            self._save()
+
+        return {"added": added, "updated": updated, "removed": removed, "total": len(self._entries)}
+
+    def record(self, json_file: Path):
+        """管理器写入 JSON 文件后更新对应条目"""
+        json_file = Path(json_file)
+        entry = self._read_entry(json_file, json_file.stat())
+        self._entries[entry["id"]] = entry
+        self.names.add(entry["id"], entry["name"], entry["aliases"])
+        self._save()
+
+    def remove(self, obj_id: str):
+        """删除条目"""
+        if self._entries.pop(obj_id, None) is not None:
+            self.names.remove(obj_id)
+            self._save()
+
+    def get(self, obj_id: str) -> Optional[Dict[str, Any]]:
+        """获取条目"""
+        return self._entries.get(obj_id)
+
+    def match_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        按名称或别名查找（精确、规范化、子串、模糊）
+
+        Returns:
+            {"id", "matched", "method", "score"}，未匹配时返回 None
+        """
+        return self.names.match(name)
+
+    def ids(self) -> List[str]:
+        """所有 ID"""
+        return list(self._entries)
+
+    def __contains__(self, obj_id: str) -> bool:
+        return obj_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
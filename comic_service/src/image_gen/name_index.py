@@ -0,0 +1,229 @@
+"""
+名称索引
+人物/场景的名称和别名索引，支持规范化匹配（全角/半角、空白、标点、大小写、繁简）、
+子串匹配和模糊匹配，并给出匹配方式和置信度
+"""
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    from opencc import OpenCC
+    _t2s = OpenCC("t2s").convert
+except ImportError:  # 未安装 opencc 时使用内置的常用字对照表
+    _t2s = None
+
+# 常用繁体字 -> 简体字（opencc 不可用时的兜底，覆盖人名、地名和场景描述中的常用字）
+_TRADITIONAL = (
+    "學國東車長門開關時間會說話個們來對見現貓馬鳥龍風雲電燈書畫聽邊點發頭髮臉體樂醫藥廳館園場廣"
+    "樓層橋鐵輛區縣鄉鎮條街廟寺宮殿劍刀戰軍將師後萬與並從為麼們這裡還過進遠運達選連處辦務動勢"
+    "漢華夢靈陽陰暗紅綠藍黃紫銀錢買賣貝貴負責貨費資質賽讀寫詩詞語論請讓認識變觀覺親記許設證課"
+    "張陳劉楊趙黃吳鄭謝韓馮鄧蕭葉蘇盧蔣蔡賈魏薛閻譚鍾顧孫錢網線練結給經維綫紙納級細終組絲縣兒"
+)
+_SIMPLIFIED = (
+    "学国东车长门开关时间会说话个们来对见现猫马鸟龙风云电灯书画听边点发头发脸体乐医药厅馆园场广"
+    "楼层桥铁辆区县乡镇条街庙寺宫殿剑刀战军将师后万与并从为么们这里还过进远运达选连处办务动势"
+    "汉华梦灵阳阴暗红绿蓝黄紫银钱买卖贝贵负责货费资质赛读写诗词语论请让认识变观觉亲记许设证课"
+    "张陈刘杨赵黄吴郑谢韩冯邓萧叶苏卢蒋蔡贾魏薛阎谭钟顾孙钱网线练结给经维线纸纳级细终组丝县儿"
+)
+_T2S_TABLE = str.maketrans(_TRADITIONAL, _SIMPLIFIED)
+
+# 规范化时去除的字符：空白、标点和符号
+_STRIP_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+# 匹配方式
+EXACT = "exact"
+ALIAS = "alias"
+NORMALIZED = "normalized"
+SUBSTRING = "substring"
+FUZZY = "fuzzy"
+
+# 子串匹配时可以忽略的称呼和通用后缀（"小明同学" -> 小明，"街道背景" -> 街道）
+GENERIC_SUFFIXES = ("同学", "老师", "先生", "女士", "小姐", "大人", "前辈", "背景", "场景", "全景", "画面")
+
+
+def normalize_name(name: str) -> str:
+    """
+    名称规范化：NFKC（全角转半角）、繁体转简体、小写、去除空白和标点
+
+    Returns:
+        规范化后的名称（可能为空字符串）
+    """
+    text = unicodedata.normalize("NFKC", name)
+    text = _t2s(text) if _t2s else text.translate(_T2S_TABLE)
+    return _STRIP_RE.sub("", text.lower())
+
+
+def _common_chars(a: str, b: str) -> tuple:
+    """
+    两个名称按顺序对齐后的相同字符
+
+    Returns:
+        (相同字符总数, 最长连续相同片段长度)
+    """
+    blocks = SequenceMatcher(None, a, b, autojunk=False).get_matching_blocks()
+    return sum(block.size for block in blocks), max(block.size for block in blocks)
+
+
+def _strip_generic_suffix(normalized: str) -> str:
+    """去掉一个通用后缀（剩余部分至少两个字），没有时原样返回"""
+    for suffix in GENERIC_SUFFIXES:
+        if normalized.endswith(suffix) and len(normalized) - len(suffix) >= 2:
+            return normalized[:-len(suffix)]
+    return normalized
+
+
+def _latest(owners: Dict[str, Any]) -> tuple:
+    """同一名称的多个对象中最后添加的 (ID, 值)"""
+    return next(reversed(owners.items()))
+
+
+class NameIndex:
+    """名称和别名索引（精确、规范化、子串、模糊四级匹配）"""
+
+    def __init__(self, min_score: float = 0.75):
+        """
+        Args:
+            min_score: 子串和模糊匹配的最低置信度（0-1），低于该值视为未匹配
+        """
+        self.min_score = min_score
+        # 原始名称/别名 -> {ID: 是否为别名}；多个对象同名时都记录，匹配时取最后添加的
+        self._exact: Dict[str, Dict[str, bool]] = {}
+        # 规范化名称 -> {ID: 原始名称}
+        self._normalized: Dict[str, Dict[str, str]] = {}
+        # 字符 -> 包含该字符的规范化名称（子串和模糊匹配的候选集）
+        self._by_char: Dict[str, Set[str]] = {}
+        self._keys_by_id: Dict[str, List[str]] = {}
+
+    def add(self, obj_id: str, name: str, aliases: Optional[List[str]] = None):
+        """添加（或替换）一个对象的名称和别名"""
+        self.remove(obj_id)
+        keys = []
+        for label, is_alias in [(name, False)] + [(alias, True) for alias in aliases or []]:
+            if not label:
+                continue
+            self._exact.setdefault(label, {})[obj_id] = is_alias
+            keys.append(label)
+            normalized = normalize_name(label)
+            if normalized:
+                self._normalized.setdefault(normalized, {})[obj_id] = label
+                for ch in set(normalized):
+                    self._by_char.setdefault(ch, set()).add(normalized)
+        self._keys_by_id[obj_id] = keys
+
+    def remove(self, obj_id: str):
+        """删除一个对象的所有名称（其他对象仍在使用的名称保留）"""
+        for label in self._keys_by_id.pop(obj_id, []):
+            owners = self._exact.get(label)
+            if owners is not None:
+                owners.pop(obj_id, None)
+                if not owners:
+                    del self._exact[label]
+            normalized = normalize_name(label)
+            owners = self._normalized.get(normalized)
+            if owners is None:
+                continue
+            owners.pop(obj_id, None)
+            if not owners:
+                del self._normalized[normalized]
+                for ch in set(normalized):
+                    keys = self._by_char.get(ch)
+                    if keys is not None:
+                        keys.discard(normalized)
+                        if not keys:
+                            del self._by_char[ch]
+
+    def clear(self):
+        """清空索引"""
+        self._exact.clear()
+        self._normalized.clear()
+        self._by_char.clear()
+        self._keys_by_id.clear()
+
+    def match(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        查找名称
+
+        Args:
+            query: 页面 JSON 中写的名称
+
+        Returns:
+            {"id", "matched", "method", "score"}，未匹配时返回 None
+        """
+        hit = self._exact.get(query)
+        if hit:
+            obj_id, is_alias = _latest(hit)
+            return {"id": obj_id, "matched": query, "method": ALIAS if is_alias else EXACT, "score": 1.0}
+
+        normalized = normalize_name(query)
+        if not normalized:
+            return None
+        hit = self._normalized.get(normalized)
+        if hit:
+            obj_id, label = _latest(hit)
+            return {"id": obj_id, "matched": label, "method": NORMALIZED, "score": 0.95}
+
+        accepted, _ = self._search(normalized)
+        return self._result(accepted) if accepted else None
+
+    def closest(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        未匹配时最接近的名称（低置信度，只用于提示，不应使用其参考图）
+
+        Returns:
+            {"id", "matched", "method", "score", "low_confidence": True}，能匹配或没有相近名称时返回 None
+        """
+        if self.match(query) is not None:
+            return None
+        _, rejected = self._search(normalize_name(query))
+        return {**self._result(rejected), "low_confidence": True} if rejected else None
+
+    def _search(self, normalized: str) -> tuple:
+        """
+        子串和模糊匹配
+
+        子串只接受两种写法：名称加通用后缀（"小明同学"、"街道背景"），或名称末尾的中心词
+        （"街道"之于"现代城市街道"）；"小明的妈妈"、"教室外走廊"这类包含名称的其他实体不算
+
+        Returns:
+            (可接受的最佳候选, 不可接受的最佳候选)，候选为 (排序键, 规范化名称, 匹配方式, 分数) 或 None
+        """
+        # 候选：与查询至少有一个相同字符的名称
+        candidates: Set[str] = set()
+        for ch in set(normalized):
+            candidates |= self._by_char.get(ch, set())
+        core = _strip_generic_suffix(normalized)
+
+        accepted = rejected = None
+        for key in candidates:
+            shorter, longer = sorted((normalized, key), key=len)
+            if key == core:
+                score, method, ok = 0.9, SUBSTRING, True
+            elif len(core) >= 2 and key.endswith(core):
+                # 0.75 ~ 0.9，越接近完整名称分数越高
+                score, method, ok = 0.75 + 0.15 * len(core) / len(key), SUBSTRING, True
+            elif shorter in longer:
+                if len(shorter) < 2:
+                    continue
+                score, method, ok = 0.5 * len(shorter) / len(longer), SUBSTRING, False
+            else:
+                # 模糊：相同字符须占两个名称的大部分（只共用"王小""城市"这类片段的不同名称不算）
+                common, run = _common_chars(normalized, key)
+                if run < 2:
+                    continue
+                score, method, ok = 0.9 * common / len(longer), FUZZY, True
+            ok = ok and score >= self.min_score
+            # 分数相同时优先长度更接近的名称
+            candidate = ((score, -abs(len(key) - len(normalized))), key, method, score)
+            if ok and (accepted is None or candidate[0] > accepted[0]):
+                accepted = candidate
+            elif not ok and (rejected is None or candidate[0] > rejected[0]):
+                rejected = candidate
+        return accepted, rejected
+
+    def _result(self, candidate: tuple) -> Dict[str, Any]:
+        _, key, method, score = candidate
+        obj_id, label = _latest(self._normalized[key])
+        return {"id": obj_id, "matched": label, "method": method, "score": round(score, 2)}
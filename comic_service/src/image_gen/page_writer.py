@@ -0,0 +1,211 @@
+"""
+漫画页面输出
+按 API 实际返回的 MIME 类型保存无损母版（原始字节，不重新编码），
+并在图片处理工作池中生成可选的交付版本（渐进式 JPEG / WebP / AVIF）和预览金字塔（1K 预览 + 缩略图），
+所有输出记录在页面索引中，审阅时无需读取母版
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from PIL import features
+
+from ..models.generation import GeneratedImage
+from . import image_processing
+from .workers import ImageWorkerPool
+
+
+class PageIndex:
+    """页面索引（页码 -> 母版、交付版本、预览图的路径和尺寸），保存在输出目录的 page_index.json"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._pages: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._pages = json.load(f).get("pages", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"页面索引加载失败 {self.path}: {e}")
+
+    def update(self, page_number: int, entry: Dict[str, Any]):
+        """更新一页的记录并保存"""
+        self._pages[str(page_number)] = entry
+        self._save()
+
+    def get(self, page_number: int) -> Optional[Dict[str, Any]]:
+        """获取一页的记录"""
+        return self._pages.get(str(page_number))
+
+    def get_range(self, start_page: int, end_page: int) -> List[Dict[str, Any]]:
+        """按页码顺序返回 [start_page, end_page] 范围内已记录的页面"""
+        return [
+            self._pages[key]
+            for key in sorted(self._pages, key=int)
+            if start_page <= int(key) <= end_page
+        ]
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".part")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"pages": self._pages}, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(self.path)
+
+
+class PageWriter:
+    """漫画页面写入器"""
+
+    def __init__(
+        self,
+        output_dir: Path,
+        workers: ImageWorkerPool,
+        keep_master: bool = True,
+        renditions: Optional[List[Dict[str, Any]]] = None,
+        previews: Optional[Dict[str, Any]] = None,
+        resize_mode: str = "balanced"
+    ):
+        """
+        Args:
+            output_dir: 页面输出目录（母版和预览图直接放在该目录，交付版本放在 renditions 子目录）
+            workers: 图片处理工作池
+            keep_master: 是否保留母版（没有任何交付版本时始终保留）
+            renditions: 交付版本列表，如 [{"format": "webp", "quality": 80, "max_width": 2048}]
+            previews: 预览金字塔配置 {"enabled", "preview_width", "thumbnail_width", "format", "quality"}
+            resize_mode: 交付版本和预览图缩小时的缩放策略
+        """
+        self.output_dir = Path(output_dir)
+        self.rendition_dir = self.output_dir / "renditions"
+        self.workers = workers
+        self.resize_mode = resize_mode
+        self.renditions: List[Dict[str, Any]] = []
+
+        for rendition in renditions or []:
+            fmt = rendition.get("format", "").lower()
+            if fmt not in image_processing.RENDITION_FORMATS:
+                raise ValueError(f"不支持的页面输出格式: {fmt}（可选 {', '.join(image_processing.RENDITION_FORMATS)}）")
+            if fmt in ("webp", "avif") and not features.check(fmt):
+                logger.warning(f"当前 Pillow 不支持 {fmt.upper()} 编码，跳过该交付版本")
+                continue
+            self.renditions.append({
+                "format": fmt,
+                "quality": rendition.get("quality", 85),
+                "max_width": rendition.get("max_width"),
+            })
+
+        self.keep_master = keep_master or not self.renditions
+
+        previews = previews or {}
+        self.previews_enabled = previews.get("enabled", True)
+        self.preview_width = previews.get("preview_width", 1024)
+        self.thumbnail_width = previews.get("thumbnail_width", 256)
+        self.preview_format = previews.get("format", "jpeg").lower()
+        self.preview_quality = previews.get("quality", 80)
+        if self.preview_format not in image_processing.RENDITION_FORMATS:
+            raise ValueError(f"不支持的预览图格式: {self.preview_format}")
+
+        self.index = PageIndex(self.output_dir / "page_index.json")
+
+    def download_path(self, page_number: int) -> Path:
+        """生成过程中的临时文件路径（扩展名在拿到 MIME 类型后确定；每次调用不同，同一页的并发生成互不覆盖）"""
+        return self.output_dir / f".page_{page_number:03d}.{uuid.uuid4().hex[:8]}.download"
+
+    def master_path(self, page_number: int, mime_type: str) -> Path:
+        """母版路径，扩展名与实际图片格式一致"""
+        ext = image_processing.EXTENSION_BY_MIME.get(mime_type, ".png")
+        return self.output_dir / f"page_{page_number:03d}{ext}"
+
+    def preview_paths(self, page_number: int) -> Dict[str, Path]:
+        """预览图和缩略图路径（与母版放在同一目录）"""
+        _, ext = image_processing.RENDITION_FORMATS[self.preview_format]
+        return {
+            "preview": self.output_dir / f"page_{page_number:03d}.preview{ext}",
+            "thumbnail": self.output_dir / f"page_{page_number:03d}.thumb{ext}",
+        }
+
+    def _remove_stale(self, page_number: int, keep: Path):
+        """删除同一页以前以其他格式保存的母版"""
+        for ext in image_processing.EXTENSION_BY_MIME.values():
+            stale = self.output_dir / f"page_{page_number:03d}{ext}"
+            if stale != keep and stale.exists():
+                stale.unlink()
+
+    async def write(self, page_number: int, image: GeneratedImage) -> Dict[str, Any]:
+        """
+        保存母版，生成交付版本和预览图，并更新页面索引
+
+        Args:
+            page_number: 页码
+            image: 生成结果（已写入 download_path，或在内存中）
+
+        Returns:
+            {"image_path", "master", "renditions", "preview", "thumbnail"}，包含每个文件的大小和编码耗时
+        """
+        master_path = self.master_path(page_number, image.mime_type)
+        master_path.parent.mkdir(parents=True, exist_ok=True)
+        if image.path:
+            Path(image.path).replace(master_path)
+        else:
+            master_path.write_bytes(image.read_bytes())
+        self._remove_stale(page_number, master_path)
+
+        jobs = [
+            self.workers.run(
+                image_processing.encode_rendition,
+                master_path,
+                self.rendition_dir / f"page_{page_number:03d}{image_processing.RENDITION_FORMATS[r['format']][1]}",
+                r["format"],
+                r["quality"],
+                max_width=r["max_width"],
+                resize_mode=self.resize_mode
+            )
+            for r in self.renditions
+        ]
+        if self.previews_enabled:
+            paths = self.preview_paths(page_number)
+            jobs.append(self.workers.run(
+                image_processing.build_previews,
+                master_path,
+                paths["preview"],
+                paths["thumbnail"],
+                preview_width=self.preview_width,
+                thumbnail_width=self.thumbnail_width,
+                fmt=self.preview_format,
+                quality=self.preview_quality,
+                resize_mode=self.resize_mode
+            ))
+
+        results = list(await asyncio.gather(*jobs))
+        previews = results.pop() if self.previews_enabled else None
+        renditions = results
+        for r in renditions:
+            logger.info(f"页面交付版本: {r['path']} {r['size_bytes'] // 1024}KB，编码 {r['encode_s']:.2f}s")
+
+        master = {
+            "mime_type": image.mime_type,
+            "path": str(master_path),
+            "size_bytes": master_path.stat().st_size,
+        }
+        if previews:
+            master.update(width=previews["source_width"], height=previews["source_height"])
+        if not self.keep_master:
+            master_path.unlink()
+            master = None
+
+        output = {
+            "image_path": master["path"] if master else renditions[0]["path"],
+            "master": master,
+            "renditions": renditions,
+            "preview": previews["preview"] if previews else None,
+            "thumbnail": previews["thumbnail"] if previews else None,
+        }
+        self.index.update(page_number, {
+            "page_number": page_number,
+            **output,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        return output
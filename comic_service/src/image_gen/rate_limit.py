@@ -0,0 +1,143 @@
+"""
+客户端限流
+并发上限 + 令牌桶（每分钟请求数），等待者按先来先到（FIFO）排队
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+
+class RequestLimiter:
+    """并发与速率限制器（人物、场景、页面生成共用一个实例）"""
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        requests_per_minute: Optional[float] = None,
+        burst: Optional[int] = None
+    ):
+        """
+        Args:
+            max_concurrent: 同时进行的请求数上限
+            requests_per_minute: 每分钟请求数上限（None 表示不限速）
+            burst: 令牌桶容量，允许的瞬时突发请求数（默认等于 max_concurrent）
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.requests_per_minute = requests_per_minute
+        self.capacity = float(burst or self.max_concurrent)
+        self._rate = requests_per_minute / 60.0 if requests_per_minute else None
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # 统计
+        self.total_acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """排队中的请求数"""
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    @property
+    def active(self) -> int:
+        """正在进行的请求数"""
+        return self._active
+
+    def _refill(self):
+        if self._rate is None:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+
+    def _has_token(self) -> bool:
+        self._refill()
+        return self._rate is None or self._tokens >= 1
+
+    def _take(self):
+        if self._rate is not None:
+            self._tokens -= 1
+        self._active += 1
+        self.total_acquired += 1
+
+    def _dispatch(self):
+        """按 FIFO 顺序唤醒满足条件的等待者"""
+        self._timer = None
+        while self._waiters and self._active < self.max_concurrent:
+            waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if not self._has_token():
+                # 等到下一个令牌生成再调度
+                delay = (1 - self._tokens) / self._rate
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._waiters.popleft()
+            self._take()
+            waiter.set_result(None)
+
+    async def acquire(self) -> float:
+        """
+        获取一个请求名额
+
+        Returns:
+            排队等待时间（秒）
+        """
+        started = time.monotonic()
+        if not self._waiters and self._active < self.max_concurrent and self._has_token():
+            self._take()
+            return 0.0
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # 名额已分配但调用方被取消时归还名额
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def release(self):
+        """归还名额"""
+        self._active -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个名额的上下文，返回排队等待时间"""
+        waited = await self.acquire()
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """限流统计"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "requests_per_minute": self.requests_per_minute,
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "tokens": round(self._tokens, 2) if self._rate is not None else None,
+            "total_acquired": self.total_acquired,
+            "avg_wait_s": round(self.total_wait / self.total_acquired, 3) if self.total_acquired else 0.0,
+            "max_wait_s": round(self.max_wait, 3),
+        }
@@ -0,0 +1,450 @@
+"""
+参考图库存储后端
+- JsonReferenceStore：每个人物/场景一个 JSON 文件 + .manifest.json 索引（默认）
+- SqliteReferenceStore：SQLite（WAL 模式）单文件库，多个服务进程可以同时读、串行写，
+  通过版本计数发现其他进程的修改
+
+两种后端都只保存元数据，参考图片仍以文件形式放在参考图目录中。使用统计（次数、最后使用时间）
+与记录分开保存，由 UsageTracker 批量累加写入
+"""
+
+import json
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from .manifest import ReferenceManifest
+from .name_index import NameIndex
+
+USAGE_NAME = ".usage.json"
+
+
+class ReferenceConflictError(Exception):
+    """写入时发现记录已被其他进程修改"""
+
+    def __init__(self, obj_id: str, expected: int, actual: Optional[int]):
+        self.obj_id = obj_id
+        super().__init__(
+            f"{obj_id} 已被其他进程修改（版本 {expected} -> {actual}），请重新读取后再更新"
+        )
+
+
+class JsonReferenceStore:
+    """JSON 文件存储（单进程使用，其他进程的修改在下次 sync 扫描目录时发现）"""
+
+    backend = "json"
+
+    def __init__(self, storage_dir: Path, id_field: str, min_match_score: float = 0.75):
+        """
+        Args:
+            storage_dir: 参考图目录
+            id_field: ID 字段名（character_id / scene_id）
+            min_match_score: 名称模糊匹配的最低置信度
+        """
+        self.storage_dir = Path(storage_dir)
+        self.id_field = id_field
+        self.manifest = ReferenceManifest(self.storage_dir, id_field=id_field, min_match_score=min_match_score)
+        self.usage_path = self.storage_dir / USAGE_NAME
+
+    @property
+    def names(self) -> NameIndex:
+        return self.manifest.names
+
+    def close(self):
+        """JSON 后端没有需要释放的资源"""
+
+    def sync(self) -> Dict[str, int]:
+        """扫描目录，同步新增/修改/删除的文件"""
+        return self.manifest.refresh()
+
+    def check_changes(self) -> bool:
+        """JSON 后端不做每次访问的变化检查"""
+        return False
+
+    def ids(self) -> List[str]:
+        return self.manifest.ids()
+
+    def __contains__(self, obj_id: str) -> bool:
+        return obj_id in self.manifest
+
+    def __len__(self) -> int:
+        return len(self.manifest)
+
+    def entry(self, obj_id: str) -> Optional[Dict[str, Any]]:
+        """索引条目（version 为文件 mtime）"""
+        entry = self.manifest.get(obj_id)
+        return {**entry, "version": entry["mtime_ns"]} if entry else None
+
+    def match_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.manifest.match_name(name)
+
+    def closest_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.names.closest(name)
+
+    def load(self, obj_id: str) -> Optional[Dict[str, Any]]:
+        """读取完整记录"""
+        entry = self.manifest.get(obj_id)
+        if entry is None:
+            return None
+        with open(self.storage_dir / entry["file"], 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, data: Dict[str, Any], expected_version: Optional[int] = None) -> int:
+        """
+        写入记录
+
+        Args:
+            data: 完整记录（model_dump(mode='json') 的结果）
+            expected_version: 读取时的版本，不一致时抛出 ReferenceConflictError（None 表示不检查）
+
+        Returns:
+            新版本号
+        """
+        obj_id = data[self.id_field]
+        current = self.entry(obj_id)
+        if expected_version is not None and current and current["version"] != expected_version:
+            raise ReferenceConflictError(obj_id, expected_version, current["version"])
+
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        json_file = self.storage_dir / f"{obj_id}.json"
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        self.manifest.record(json_file)
+        return self.manifest.get(obj_id)["mtime_ns"]
+
+    def delete(self, obj_id: str) -> bool:
+        """删除记录"""
+        entry = self.manifest.get(obj_id)
+        if entry is None:
+            return False
+        json_file = self.storage_dir / entry["file"]
+        if json_file.exists():
+            json_file.unlink()
+        self.manifest.remove(obj_id)
+
+        usage = self.load_usage()
+        if usage.pop(obj_id, None) is not None:
+            self._save_usage(usage)
+        return True
+
+    def load_usage(self) -> Dict[str, Dict[str, Any]]:
+        """读取使用统计：ID -> {"usage_count", "last_used"}"""
+        if not self.usage_path.exists():
+            return {}
+        try:
+            with open(self.usage_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"使用统计文件损坏，将重新记录 {self.usage_path}: {e}")
+            return {}
+
+    def _save_usage(self, usage: Dict[str, Dict[str, Any]]):
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.usage_path.with_name(self.usage_path.name + ".part")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(usage, ensure_ascii=False, separators=(",", ":")))
+        tmp_path.replace(self.usage_path)
+
+    def add_usage(self, deltas: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        累加使用统计
+
+        Args:
+            deltas: ID -> {"usage_count": 增量, "last_used": 最后使用时间}
+
+        Returns:
+            这些 ID 累加后的统计
+        """
+        usage = self.load_usage()
+        for obj_id, delta in deltas.items():
+            current = usage.setdefault(obj_id, {"usage_count": 0, "last_used": None})
+            current["usage_count"] += delta["usage_count"]
+            current["last_used"] = max(current["last_used"] or "", delta["last_used"] or "") or None
+        self._save_usage(usage)
+        return {obj_id: usage[obj_id] for obj_id in deltas}
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    aliases TEXT NOT NULL DEFAULT '[]',
+    sha256 TEXT,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS library_version (
+    kind TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    usage_count INTEGER NOT NULL,
+    last_used TEXT,
+    PRIMARY KEY (kind, id)
+);
+"""
+
+
+class SqliteReferenceStore:
+    """
+    SQLite 存储
+
+    每条记录有自己的版本号（每次写入 +1），每类（人物/场景）还有一个库版本号，
+    任何写入和删除都会使其 +1。每次访问前只需查询库版本号，变化时才重新读取索引
+    """
+
+    backend = "sqlite"
+
+    def __init__(
+        self,
+        db_path: Path,
+        kind: str,
+        id_field: str,
+        min_match_score: float = 0.75,
+        busy_timeout: float = 5.0
+    ):
+        """
+        Args:
+            db_path: 数据库文件路径（人物和场景共用一个文件）
+            kind: 记录类别（character / scene）
+            id_field: ID 字段名
+            min_match_score: 名称模糊匹配的最低置信度
+            busy_timeout: 等待其他进程写锁的超时（秒）
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.kind = kind
+        self.id_field = id_field
+        self.names = NameIndex(min_score=min_match_score)
+
+        # 自动提交模式，写入时显式 BEGIN IMMEDIATE 获取写锁
+        self._conn = sqlite3.connect(str(self.db_path), timeout=busy_timeout, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute("INSERT OR IGNORE INTO library_version (kind, version) VALUES (?, 0)", (self.kind,))
+
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._library_version = -1
+
+    def close(self):
+        """关闭数据库连接"""
+        self._conn.close()
+
+    def _read_library_version(self) -> int:
+        row = self._conn.execute("SELECT version FROM library_version WHERE kind = ?", (self.kind,)).fetchone()
+        return row[0] if row else 0
+
+    def sync(self) -> Dict[str, int]:
+        """重新读取索引（不读取 data 列）"""
+        self._conn.execute("BEGIN")
+        try:
+            version = self._read_library_version()
+            rows = self._conn.execute(
+                "SELECT id, name, aliases, sha256, version FROM refs WHERE kind = ?", (self.kind,)
+            ).fetchall()
+        finally:
+            self._conn.execute("COMMIT")
+
+        entries = {
+            obj_id: {
+                "id": obj_id,
+                "name": name,
+                "aliases": json.loads(aliases),
+                "sha256": sha256,
+                "legacy": False,
+                "version": row_version,
+            }
+            for obj_id, name, aliases, sha256, row_version in rows
+        }
+        added = sum(1 for obj_id in entries if obj_id not in self._entries)
+        updated = sum(
+            1 for obj_id, entry in entries.items()
+            if obj_id in self._entries and self._entries[obj_id]["version"] != entry["version"]
+        )
+        removed = sum(1 for obj_id in self._entries if obj_id not in entries)
+
+        self._entries = entries
+        self._library_version = version
+        self.names.clear()
+        for obj_id, entry in entries.items():
+            self.names.add(obj_id, entry["name"], entry["aliases"])
+
+        return {"added": added, "updated": updated, "removed": removed, "total": len(entries)}
+
+    def check_changes(self) -> bool:
+        """库版本号变化（其他进程写入过）时重新读取索引"""
+        if self._read_library_version() == self._library_version:
+            return False
+        changes = self.sync()
+        logger.info(
+            f"参考图库已被其他进程修改（{self.kind}）: 新增 {changes['added']}，"
+            f"更新 {changes['updated']}，删除 {changes['removed']}"
+        )
+        return True
+
+    def ids(self) -> List[str]:
+        return list(self._entries)
+
+    def __contains__(self, obj_id: str) -> bool:
+        return obj_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entry(self, obj_id: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(obj_id)
+
+    def match_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.names.match(name)
+
+    def closest_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.names.closest(name)
+
+    def load(self, obj_id: str) -> Optional[Dict[str, Any]]:
+        """读取完整记录"""
+        row = self._conn.execute(
+            "SELECT data, version FROM refs WHERE kind = ? AND id = ?", (self.kind, obj_id)
+        ).fetchone()
+        if row is None:
+            return None
+        data, version = row
+        entry = self._entries.get(obj_id)
+        if entry is not None and entry["version"] != version:
+            # 读到的比索引新，说明其他进程刚写入过
+            self.check_changes()
+        return json.loads(data)
+
+    def _write(self, obj_id: str, expected_version: Optional[int], write) -> Optional[int]:
+        """在写事务中执行 write(当前版本) -> 新版本，并推进库版本号"""
+        started = time.perf_counter()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT version FROM refs WHERE kind = ? AND id = ?", (self.kind, obj_id)
+            ).fetchone()
+            current = row[0] if row else None
+            if expected_version is not None and current is not None and current != expected_version:
+                raise ReferenceConflictError(obj_id, expected_version, current)
+
+            others_wrote = self._read_library_version() != self._library_version
+            new_version = write(current)
+            self._conn.execute(
+                "UPDATE library_version SET version = version + 1 WHERE kind = ?", (self.kind,)
+            )
+            library_version = self._read_library_version()
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        logger.debug(f"参考图库写入 {obj_id}: {(time.perf_counter() - started) * 1000:.1f}ms")
+        if others_wrote:
+            self.sync()
+        else:
+            self._library_version = library_version
+        return new_version
+
+    def save(self, data: Dict[str, Any], expected_version: Optional[int] = None) -> int:
+        """
+        写入记录（写事务串行化，多个进程同时写入时排队）
+
+        Args:
+            data: 完整记录（model_dump(mode='json') 的结果）
+            expected_version: 读取时的版本，不一致时抛出 ReferenceConflictError（None 表示不检查）
+
+        Returns:
+            新版本号
+        """
+        obj_id = data[self.id_field]
+        aliases = data.get("aliases", [])
+        sha256 = (data.get("reference_image") or {}).get("sha256")
+
+        def write(current: Optional[int]) -> int:
+            version = (current or 0) + 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO refs (kind, id, name, aliases, sha256, data, version, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.kind, obj_id, data["name"], json.dumps(aliases, ensure_ascii=False), sha256,
+                    json.dumps(data, ensure_ascii=False, default=str), version,
+                    datetime.now().isoformat(timespec="seconds"),
+                )
+            )
+            return version
+
+        version = self._write(obj_id, expected_version, write)
+        self._entries[obj_id] = {
+            "id": obj_id, "name": data["name"], "aliases": aliases,
+            "sha256": sha256, "legacy": False, "version": version,
+        }
+        self.names.add(obj_id, data["name"], aliases)
+        return version
+
+    def delete(self, obj_id: str) -> bool:
+        """删除记录"""
+        if obj_id not in self._entries:
+            return False
+
+        def write(current: Optional[int]) -> Optional[int]:
+            self._conn.execute("DELETE FROM refs WHERE kind = ? AND id = ?", (self.kind, obj_id))
+            self._conn.execute("DELETE FROM usage WHERE kind = ? AND id = ?", (self.kind, obj_id))
+            return None
+
+        self._write(obj_id, None, write)
+        self._entries.pop(obj_id, None)
+        self.names.remove(obj_id)
+        return True
+
+    def load_usage(self) -> Dict[str, Dict[str, Any]]:
+        """读取使用统计：ID -> {"usage_count", "last_used"}"""
+        rows = self._conn.execute(
+            "SELECT id, usage_count, last_used FROM usage WHERE kind = ?", (self.kind,)
+        ).fetchall()
+        return {obj_id: {"usage_count": count, "last_used": last_used} for obj_id, count, last_used in rows}
+
+    def add_usage(self, deltas: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        累加使用统计（多个进程的增量相加，不改变库版本号）
+
+        Args:
+            deltas: ID -> {"usage_count": 增量, "last_used": 最后使用时间}
+
+        Returns:
+            这些 ID 累加后的统计
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO usage (kind, id, usage_count, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (kind, id) DO UPDATE SET "
+                "usage_count = usage_count + excluded.usage_count, "
+                "last_used = max(coalesce(last_used, ''), coalesce(excluded.last_used, ''))",
+                [(self.kind, obj_id, d["usage_count"], d["last_used"]) for obj_id, d in deltas.items()]
+            )
+            totals = {}
+            for obj_id in deltas:
+                count, last_used = self._conn.execute(
+                    "SELECT usage_count, last_used FROM usage WHERE kind = ? AND id = ?", (self.kind, obj_id)
+                ).fetchone()
+                totals[obj_id] = {"usage_count": count, "last_used": last_used or None}
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return totals
+
+
+def iter_json_records(source_dir: Path):
+    """遍历 JSON 库中的记录文件（跳过 .manifest.json 等隐藏文件）"""
+    for json_file in sorted(Path(source_dir).glob("*.json")):
+        if not json_file.name.startswith("."):
+            yield json_file
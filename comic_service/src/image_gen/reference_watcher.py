@@ -0,0 +1,173 @@
+"""
+参考图目录热加载
+监视人物/场景目录，新增、修改或删除 JSON/图片文件后增量更新管理器的索引，不需要重启服务。
+优先使用 watchfiles（Linux 上基于 inotify），未安装时退回定期扫描目录；一批连续事件合并为一次更新
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+from loguru import logger
+
+try:
+    from watchfiles import awatch
+except ImportError:  # 未安装 watchfiles 时使用轮询
+    awatch = None
+
+RECORD_SUFFIXES = {".json"}
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def _is_relevant(path: Path) -> bool:
+    """只关心记录和图片文件，跳过 .manifest.json、.usage.json 和写入中的 .part 文件"""
+    return not path.name.startswith(".") and path.suffix.lower() in RECORD_SUFFIXES | IMAGE_SUFFIXES
+
+
+class ReferenceWatcher:
+    """人物/场景目录监视器"""
+
+    def __init__(
+        self,
+        managers: List,
+        debounce: float = 0.5,
+        poll_interval: float = 2.0,
+        use_inotify: bool = True
+    ):
+        """
+        Args:
+            managers: CharacterManager / SceneManager 列表（各自监视 storage_dir）
+            debounce: 最后一个事件之后等待多久再更新（秒），期间的事件合并处理
+            poll_interval: 轮询模式的扫描间隔（秒）
+            use_inotify: 是否使用 watchfiles（未安装时自动退回轮询）
+        """
+        self.managers = managers
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.mode = "inotify" if use_inotify and awatch is not None else "polling"
+
+        self._pending: Set[Path] = set()
+        self._changed = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+        self.events = 0
+        self.reloads = 0
+        self.last_reload_ms = 0.0
+
+    def _manager_for(self, path: Path):
+        for manager in self.managers:
+            if path.parent == manager.storage_dir.resolve():
+                return manager
+        return None
+
+    def _collect(self, paths):
+        """记录一批变化的文件"""
+        relevant = {Path(p).resolve() for p in paths if _is_relevant(Path(p))}
+        if relevant:
+            self.events += len(relevant)
+            self._pending |= relevant
+            self._changed.set()
+
+    async def _watch_inotify(self):
+        directories = [str(manager.storage_dir) for manager in self.managers]
+        # watchfiles 自身只做很短的合并，主要的防抖在 _apply_loop 中
+        async for changes in awatch(*directories, debounce=50, stop_event=self._stop):
+            self._collect(path for _, path in changes)
+
+    def _snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        files = {}
+        for manager in self.managers:
+            if not manager.storage_dir.exists():
+                continue
+            with os.scandir(manager.storage_dir) as it:
+                for entry in it:
+                    path = Path(entry.path)
+                    if _is_relevant(path) and entry.is_file():
+                        stat = entry.stat()
+                        files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    async def _watch_polling(self, previous: Dict[Path, Tuple[int, int]]):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            current = self._snapshot()
+            changed = {path for path in current.keys() | previous.keys() if current.get(path) != previous.get(path)}
+            previous = current
+            self._collect(changed)
+
+    async def _apply_loop(self):
+        while True:
+            await self._changed.wait()
+            # 防抖：直到连续 debounce 秒没有新事件
+            while True:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), self.debounce)
+                except asyncio.TimeoutError:
+                    break
+            paths, self._pending = self._pending, set()
+            try:
+                self._apply(paths)
+            except Exception as e:
+                logger.warning(f"参考图目录热加载失败: {e}")
+
+    def _apply(self, paths: Set[Path]):
+        """按目录分组更新：记录文件有变化时增量同步索引，图片有变化时丢弃内存中的旧图片"""
+        started = time.perf_counter()
+        by_manager: Dict[Any, Set[Path]] = {}
+        for path in paths:
+            manager = self._manager_for(path)
+            if manager is not None:
+                by_manager.setdefault(manager, set()).add(path)
+
+        for manager, changed in by_manager.items():
+            if any(path.suffix.lower() in RECORD_SUFFIXES for path in changed):
+                changes = manager.refresh()
+                if changes["added"] or changes["updated"] or changes["removed"]:
+                    logger.info(
+                        f"热加载 {manager.storage_dir}: 新增 {changes['added']}，"
+                        f"更新 {changes['updated']}，删除 {changes['removed']}"
+                    )
+            for path in changed:
+                if path.suffix.lower() in IMAGE_SUFFIXES:
+                    manager.reload_image(path.stem)
+
+        self.reloads += 1
+        self.last_reload_ms = (time.perf_counter() - started) * 1000
+
+    async def start(self):
+        """开始监视"""
+        if self._tasks:
+            return
+        self._stop.clear()
+        # 轮询的初始快照在启动时同步获取，之后的修改都不会漏掉
+        watch = self._watch_inotify() if self.mode == "inotify" else self._watch_polling(self._snapshot())
+        self._tasks = [asyncio.create_task(watch), asyncio.create_task(self._apply_loop())]
+        logger.info(f"参考图目录热加载已启动（{self.mode}）")
+
+    async def stop(self):
+        """停止监视"""
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        return {
+            "mode": self.mode,
+            "running": bool(self._tasks),
+            "events": self.events,
+            "reloads": self.reloads,
+            "last_reload_ms": round(self.last_reload_ms, 2),
+        }
@@ -0,0 +1,198 @@
+"""
+请求重试与熔断
+对 Gemini 请求失败做分类：限流和 5xx 指数退避重试（遵守 Retry-After），
+超时有限次重试，其余 4xx 不重试；上游持续故障时熔断快速失败
+"""
+
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import httpx
+
+# 失败分类
+RATE_LIMIT = "rate_limit"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+NETWORK = "network"
+CLIENT_ERROR = "client_error"
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Gemini 服务暂时不可用（熔断中），请在 {retry_after:.0f} 秒后重试")
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """
+    对请求异常分类
+
+    Returns:
+        失败类别，无法识别的异常返回 None（不重试）
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        if status == 429:
+            return RATE_LIMIT
+        if status >= 500:
+            return SERVER_ERROR
+        return CLIENT_ERROR
+    if isinstance(error, httpx.TimeoutException):
+        return TIMEOUT
+    if isinstance(error, httpx.TransportError):
+        return NETWORK
+    return None
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期）"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """分类重试策略"""
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        timeout_retries: int = 1,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0
+    ):
+        """
+        Args:
+            max_attempts: 限流、5xx 和网络错误的最大尝试次数（含首次）
+            timeout_retries: 超时后的最大重试次数
+            base_delay: 退避基础延迟（秒）
+            max_delay: 单次退避的最大延迟（秒）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.timeout_retries = max(0, timeout_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, category: Optional[str], attempt: int, timeouts: int) -> bool:
+        """
+        判断是否重试
+
+        Args:
+            category: 失败类别
+            attempt: 已尝试次数
+            timeouts: 已发生的超时次数
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if category == TIMEOUT:
+            return timeouts <= self.timeout_retries
+        return category in (RATE_LIMIT, SERVER_ERROR, NETWORK)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """计算下一次重试前的等待时间（指数退避 + 全抖动，优先使用 Retry-After）"""
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = parse_retry_after(error.response)
+            if retry_after is not None:
+                return min(retry_after, self.max_delay)
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败达到阈值后打开，冷却期内直接拒绝请求；冷却结束后放行一个探测请求（半开），
+    成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 60.0):
+        """
+        Args:
+            failure_threshold: 打开熔断所需的连续失败次数
+            recovery_timeout: 熔断冷却时间（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def before_request(self):
+        """请求前检查，熔断中抛出 CircuitOpenError"""
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.recovery_timeout:
+                raise CircuitOpenError(self.recovery_timeout - elapsed)
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.recovery_timeout)
+            self._probe_in_flight = True
+
+    def available(self) -> bool:
+        """当前是否可以放行请求（不改变状态）"""
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.recovery_timeout
+        if self.state == self.HALF_OPEN:
+            return not self._probe_in_flight
+        return True
+
+    def retry_after(self) -> float:
+        """距离熔断冷却结束的秒数（未熔断时为 0）"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        """记录成功"""
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """记录一次上游故障（5xx、超时、网络错误）"""
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """请求未能判定上游好坏（如 4xx）时释放半开探测名额"""
+        self._probe_in_flight = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """熔断器状态"""
+        retry_after = round(self.retry_after(), 1) if self.state == self.OPEN else None
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "retry_after": retry_after,
+        }
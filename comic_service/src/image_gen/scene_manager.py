@@ -4,11 +4,13 @@
 """
 
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from loguru import logger
 
 from ..models.character import Scene, CharacterMetadata
 from .gemini_client import GeminiImageGenerator
+from .reference_store import JsonReferenceStore, ReferenceConflictError, iter_json_records
+from .usage_tracker import UsageTracker
 
 
 class SceneManager:
@@ -17,33 +19,121 @@ class SceneManager:
     def __init__(
         self,
         gemini_client: GeminiImageGenerator,
-        storage_dir: Path = Path("./config/references/scenes")
+        storage_dir: Path = Path("./config/references/scenes"),
+        min_match_score: float = 0.75,
+        store=None,
+        usage_flush_interval: float = 30.0
     ):
         """
         初始化场景管理器
 
         Args:
             gemini_client: Gemini API 客户端
-            storage_dir: 存储目录
+            storage_dir: 存储目录（参考图文件；JSON 后端时也存放场景 JSON）
+            min_match_score: 名称模糊匹配的最低置信度
+            store: 存储后端（默认 JsonReferenceStore）
+            usage_flush_interval: 使用统计的定期写入间隔（秒）
         """
         self.gemini_client = gemini_client
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        # 已实例化的场景对象（按需从存储加载）及其版本
         self.scenes: Dict[str, Scene] = {}
+        self._versions: Dict[str, int] = {}
+        self.store = store if store is not None else JsonReferenceStore(
+            self.storage_dir, id_field="scene_id", min_match_score=min_match_score
+        )
+        # 使用次数和最后使用时间（内存累加，批量写入）
+        self.usage = UsageTracker(self.store, flush_interval=usage_flush_interval)
         self._load_all_scenes()
 
     def _load_all_scenes(self):
-        """加载所有已保存的场景"""
-        if not self.storage_dir.exists():
-            return
+        """同步场景索引（只读取新增或修改过的记录），旧版内嵌 base64 的文件在此迁移"""
+        changes = self.store.sync()
 
-        for json_file in self.storage_dir.glob("*.json"):
-            try:
-                scene = Scene.load_from_file(json_file)
-                self.scenes[scene.scene_id] = scene
-                logger.info(f"加载场景: {scene.name} ({scene.scene_id})")
-            except Exception as e:
-                logger.warning(f"加载场景文件失败 {json_file}: {e}")
+        migrated = 0
+        for scene_id in self.store.ids():
+            if self.store.entry(scene_id)["legacy"] and self.get_scene(scene_id) is not None:
+                migrated += 1
+
+        logger.info(
+            f"场景索引: {changes['total']} 个（新增 {changes['added']}，更新 {changes['updated']}，"
+            f"删除 {changes['removed']}）"
+        )
+        if migrated:
+            logger.info(f"已迁移 {migrated} 个场景文件（参考图改为外部文件）")
+
+    @staticmethod
+    def make_scene_id(name: str) -> str:
+        """由名称生成场景 ID"""
+        return f"scene_{name.lower().replace(' ', '_')}"
+
+    def _check_external_changes(self):
+        """其他进程修改过库时，丢弃已过期的缓存对象"""
+        if self.store.check_changes():
+            self._drop_stale()
+
+    def _drop_stale(self):
+        """丢弃存储中已被修改或删除的缓存对象"""
+        for scene_id in list(self.scenes):
+            entry = self.store.entry(scene_id)
+            if entry is None or entry["version"] != self._versions.get(scene_id):
+                self.scenes.pop(scene_id, None)
+                self._versions.pop(scene_id, None)
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        重新同步存储（热加载：只读取新增或修改过的记录），并丢弃已过期的缓存对象
+
+        Returns:
+            {"added", "updated", "removed", "total"}
+        """
+        changes = self.store.sync()
+        self._drop_stale()
+        return changes
+
+    def reload_image(self, scene_id: str):
+        """参考图文件被替换后，丢弃内存中缓存的旧图片"""
+        scene = self.scenes.get(scene_id)
+        if scene is not None:
+            scene.reference_image.unload()
+
+    def _materialize(self, scene_id: str) -> Optional[Scene]:
+        """从存储创建完整的场景对象"""
+        try:
+            version = self.store.entry(scene_id)["version"]
+            scene = Scene(**self.store.load(scene_id))
+            self.scenes[scene_id] = scene
+            self._versions[scene_id] = version
+            if scene.reference_image.needs_migration:
+                # 旧版 JSON 内嵌 base64：改为只保存路径和哈希
+                scene.reference_image.externalize()
+                self._save(scene)
+        except Exception as e:
+            self.scenes.pop(scene_id, None)
+            logger.warning(f"加载场景失败 {scene_id}: {e}")
+            return None
+
+        logger.debug(f"加载场景: {scene.name} ({scene_id})")
+        return scene
+
+    def _save(self, scene: Scene, check_version: bool = False):
+        """
+        写入存储并更新索引
+
+        Args:
+            scene: 场景对象
+            check_version: 是否检查记录在读取后未被其他进程修改（不一致时抛出 ReferenceConflictError）
+        """
+        scene_id = scene.scene_id
+        expected = self._versions.get(scene_id) if check_version else None
+        try:
+            self._versions[scene_id] = self.store.save(scene.model_dump(mode='json'), expected)
+        except ReferenceConflictError:
+            # 丢弃本地副本，下次读取时重新加载
+            self.scenes.pop(scene_id, None)
+            self._versions.pop(scene_id, None)
+            raise
 
     async def create_scene(
         self,
@@ -51,7 +141,9 @@ class SceneManager:
         description: str,
         tags: Optional[List[str]] = None,
         style: str = "日漫风格",
-        reference_image: Optional[str] = None
+        reference_image: Optional[str] = None,
+        use_cache: bool = True,
+        aliases: Optional[List[str]] = None
     ) -> Scene:
         """
         创建新场景并生成参考图
@@ -62,38 +154,41 @@ class SceneManager:
             tags: 场景标签
             style: 漫画风格
             reference_image: 参考图片的本地路径（可选）
+            use_cache: 是否读取生成缓存（False 时强制重新生成）
+            aliases: 别名列表（可选）
 
         Returns:
             创建的场景对象
         """
         # 生成场景 ID
-        scene_id = f"scene_{name.lower().replace(' ', '_')}"
+        scene_id = self.make_scene_id(name)
 
         # 生成参考图
         logger.info(f"正在生成场景参考图: {name}")
-        image_base64 = await self.gemini_client.generate_scene_reference(
+        image = await self.gemini_client.generate_scene_reference_image(
             scene_name=name,
             description=description,
             style=style,
-            reference_image=reference_image
+            reference_image=reference_image,
+            use_cache=use_cache
         )
 
-        # 压缩图片 base64
-        compressed_base64 = self.gemini_client.compress_base64_image(image_base64)
-
-        # 保存图片（会自动压缩）
+        # 压缩一次，同一份结果写入文件并用于 API 调用
         image_path = self.storage_dir / f"{scene_id}.jpg"
-        self.gemini_client.save_base64_image(image_base64, image_path, compress=True)
+        ingested = await self.gemini_client.ingest_reference_async(image.to_data_url(), image_path)
 
         # 创建场景对象
         scene = Scene(
             scene_id=scene_id,
             name=name,
+            aliases=aliases or [],
             description=description,
             reference_image={
-                "base64": compressed_base64,
                 "path": str(image_path),
-                "model_used": self.gemini_client.model
+                "sha256": ingested["sha256"],
+                "base64": ingested["data_url"],
+                "model_used": self.gemini_client.model,
+                "generation": image
             },
             tags=tags or [],
             metadata=CharacterMetadata()
@@ -101,25 +196,56 @@ class SceneManager:
 
         # 保存到内存和文件
         self.scenes[scene_id] = scene
-        scene.save_to_file(self.storage_dir)
+        self._save(scene)
 
         logger.success(f"场景创建成功: {name} ({scene_id})")
         return scene
 
     def get_scene(self, scene_id: str) -> Optional[Scene]:
         """获取场景"""
-        return self.scenes.get(scene_id)
+        self._check_external_changes()
+        scene = self.scenes.get(scene_id)
+        if scene is None and scene_id in self.store:
+            scene = self._materialize(scene_id)
+        return scene
 
     def get_scene_by_name(self, name: str) -> Optional[Scene]:
-        """通过名称获取场景"""
-        for scene in self.scenes.values():
-            if scene.name == name:
-                return scene
-        return None
+        """通过名称或别名获取场景（支持规范化、子串和模糊匹配）"""
+        matched = self.match_scene(name)
+        return matched[0] if matched else None
+
+    def match_scene(self, name: str) -> Optional[Tuple[Scene, Dict[str, Any]]]:
+        """
+        按名称或别名查找场景，并返回匹配方式
+
+        Args:
+            name: 页面中写的场景名称
+
+        Returns:
+            (场景对象, {"id", "matched", "method", "score"})，未匹配时返回 None
+        """
+        self._check_external_changes()
+        match = self.store.match_name(name)
+        if match is None:
+            return None
+        scene = self.get_scene(match["id"])
+        return (scene, match) if scene else None
+
+    def closest_scene(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        未匹配时最接近的场景名称（低置信度，只用于提示，不使用其参考图）
+
+        Returns:
+            {"id", "matched", "method", "score", "low_confidence": True}，没有相近名称时返回 None
+        """
+        self._check_external_changes()
+        return self.store.closest_name(name)
 
     def list_scenes(self) -> List[Scene]:
         """列出所有场景"""
-        return list(self.scenes.values())
+        self._check_external_changes()
+        scenes = [self.get_scene(scene_id) for scene_id in self.store.ids()]
+        return [scene for scene in scenes if scene is not None]
 
     def get_scene_refs_base64(self, scene_ids: List[str]) -> List[str]:
         """
@@ -135,14 +261,15 @@ class SceneManager:
         for scene_id in scene_ids:
             scene = self.get_scene(scene_id)
             if scene:
-                refs.append(scene.reference_image.base64)
-                scene.update_usage()
+                refs.append(scene.reference_image.load_base64())
+                self.usage.record([scene_id])
         return refs
 
     async def update_scene_reference(
         self,
         scene_id: str,
-        new_description: Optional[str] = None
+        new_description: Optional[str] = None,
+        aliases: Optional[List[str]] = None
     ) -> Optional[Scene]:
         """
         更新场景参考图
@@ -150,6 +277,7 @@ class SceneManager:
         Args:
             scene_id: 场景 ID
             new_description: 新描述（可选）
+            aliases: 新的别名列表（可选，替换原有别名）
 
         Returns:
             更新后的场景对象
@@ -164,53 +292,87 @@ class SceneManager:
 
         # 重新生成参考图
         logger.info(f"正在更新场景参考图: {scene.name}")
-        image_base64 = await self.gemini_client.generate_scene_reference(
+        image = await self.gemini_client.generate_scene_reference_image(
             scene_name=scene.name,
-            description=description
+            description=description,
+            use_cache=False
         )
 
-        # 压缩图片 base64
-        compressed_base64 = self.gemini_client.compress_base64_image(image_base64)
-
-        # 更新图片（会自动压缩）
+        # 压缩一次，同一份结果写入文件并用于 API 调用
         image_path = self.storage_dir / f"{scene_id}.jpg"
-        self.gemini_client.save_base64_image(image_base64, image_path, compress=True)
+        ingested = await self.gemini_client.ingest_reference_async(image.to_data_url(), image_path)
 
         # 更新场景对象
         from ..models.character import ReferenceImage
         scene.reference_image = ReferenceImage(
-            base64=compressed_base64,
             path=str(image_path),
-            model_used=self.gemini_client.model
+            sha256=ingested["sha256"],
+            base64=ingested["data_url"],
+            model_used=self.gemini_client.model,
+            generation=image
         )
 
         if new_description:
             scene.description = new_description
+        if aliases is not None:
+            scene.aliases = aliases
 
         scene.metadata.updated_at = scene.metadata.updated_at
 
-        # 保存更新
-        scene.save_to_file(self.storage_dir)
+        # 保存更新（生成期间其他进程改过该场景时放弃写入）
+        self._save(scene, check_version=True)
 
         logger.success(f"场景参考图更新成功: {scene.name}")
         return scene
 
     def delete_scene(self, scene_id: str) -> bool:
         """删除场景"""
-        if scene_id not in self.scenes:
+        self._check_external_changes()
+        if scene_id not in self.store:
             logger.warning(f"场景不存在: {scene_id}")
             return False
 
-        del self.scenes[scene_id]
+        self.scenes.pop(scene_id, None)
+        self._versions.pop(scene_id, None)
+        self.store.delete(scene_id)
+        self.usage.forget(scene_id)
 
-        # 删除文件
-        json_file = self.storage_dir / f"{scene_id}.json"
+        # 删除参考图文件
         image_file = self.storage_dir / f"{scene_id}.jpg"
-
-        if json_file.exists():
-            json_file.unlink()
         if image_file.exists():
             image_file.unlink()
 
         logger.info(f"场景已删除: {scene_id}")
         return True
+
+    def import_json_library(self, source_dir: Path, overwrite: bool = False) -> Dict[str, int]:
+        """
+        从 JSON 场景库导入（旧版内嵌 base64 的文件同时迁移为外部图片文件）
+
+        Args:
+            source_dir: JSON 场景库目录
+            overwrite: 已存在的场景是否覆盖
+
+        Returns:
+            {"imported", "skipped", "failed"}
+        """
+        imported = skipped = failed = 0
+        for json_file in iter_json_records(source_dir):
+            try:
+                scene = Scene.load_from_file(json_file)
+                if scene.reference_image.needs_migration:
+                    scene.reference_image.externalize()
+            except Exception as e:
+                logger.warning(f"导入场景文件失败 {json_file}: {e}")
+                failed += 1
+                continue
+
+            if scene.scene_id in self.store and not overwrite:
+                skipped += 1
+                continue
+            self.scenes.pop(scene.scene_id, None)
+            self._save(scene)
+            imported += 1
+
+        logger.info(f"场景库导入完成 {source_dir}: 导入 {imported}，跳过 {skipped}，失败 {failed}")
+        return {"imported": imported, "skipped": skipped, "failed": failed}
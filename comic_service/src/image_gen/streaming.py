@@ -0,0 +1,122 @@
+"""
+流式响应解码
+增量扫描 Gemini 响应体，找到 inlineData.data 字段后按块 base64 解码写入目标，
+避免把数 MB 的响应体整体解析成 JSON 树
+"""
+
+import base64
+import json
+import re
+from typing import Any, BinaryIO, Dict, Optional
+
+# inlineData 对象中 data 字段的起始位置（兼容 inline_data 写法，mimeType 可在 data 之前）
+_DATA_START_RE = re.compile(rb'"(?:inlineData|inline_data)"\s*:\s*\{[^{}]*?"data"\s*:\s*"')
+_INLINE_KEYS = (b'"inlineData"', b'"inline_data"')
+
+
+class InlineImageStreamDecoder:
+    """
+    Gemini 响应流式解码器
+
+    除图片数据外的 JSON 内容（"骨架"）保留在内存中，图片 data 字段替换为空字符串，
+    解码结束后可用 skeleton_json() 读取 mimeType、错误信息等。只解码第一张图片。
+    """
+
+    def __init__(self, sink: BinaryIO):
+        """
+        Args:
+            sink: 解码后的图片字节写入目标（文件或 BytesIO）
+        """
+        self.sink = sink
+        self.found = False
+        self.bytes_written = 0
+        self._skeleton = bytearray()
+        self._scan_from = 0
+        self._in_data = False
+        self._pending = bytearray()
+        self._escape = b""
+
+    def feed(self, chunk: bytes):
+        """输入一块响应数据"""
+        while chunk:
+            if self._in_data:
+                chunk = self._feed_data(chunk)
+            else:
+                chunk = self._feed_scan(chunk)
+
+    def _feed_scan(self, chunk: bytes) -> bytes:
+        """扫描阶段：累积骨架并查找 data 字段起点"""
+        self._skeleton += chunk
+        if self.found:
+            return b""
+
+        # 只从最近一个 inlineData 键开始匹配，避免反复扫描整个骨架
+        key_pos = max(self._skeleton.rfind(key, self._scan_from) for key in _INLINE_KEYS)
+        if key_pos < 0:
+            self._scan_from = max(self._scan_from, len(self._skeleton) - 16)
+            return b""
+
+        match = _DATA_START_RE.search(self._skeleton, key_pos)
+        if not match:
+            self._scan_from = key_pos
+            return b""
+
+        # data 字段之后的内容属于图片数据
+        rest = bytes(self._skeleton[match.end():])
+        del self._skeleton[match.end():]
+        self._in_data = True
+        self.found = True
+        return rest
+
+    def _feed_data(self, chunk: bytes) -> bytes:
+        """数据阶段：按 4 字节对齐分块解码"""
+        end = chunk.find(b'"')
+        piece = self._escape + (chunk if end < 0 else chunk[:end])
+        self._escape = b""
+
+        # JSON 中 "/" 可能被转义为 "\/"，末尾孤立的反斜杠留到下一块处理
+        if b"\\" in piece:
+            if piece.endswith(b"\\") and end < 0:
+                self._escape = b"\\"
+                piece = piece[:-1]
+            piece = piece.replace(b"\\/", b"/").replace(b"\\", b"")
+        self._pending += piece
+
+        if end < 0:
+            usable = len(self._pending) // 4 * 4
+            if usable:
+                self._write(bytes(self._pending[:usable]))
+                del self._pending[:usable]
+            return b""
+
+        # data 字段结束
+        if self._pending:
+            missing = -len(self._pending) % 4
+            self._write(bytes(self._pending) + b"=" * missing)
+            self._pending.clear()
+        self._in_data = False
+        return chunk[end:]
+
+    def _write(self, b64_chunk: bytes):
+        data = base64.b64decode(b64_chunk)
+        self.sink.write(data)
+        self.bytes_written += len(data)
+
+    def close(self):
+        """输入结束，检查响应是否完整"""
+        if self._in_data:
+            raise ValueError("API 响应被截断：图片数据不完整")
+
+    def skeleton_json(self) -> Dict[str, Any]:
+        """解析去掉图片数据后的响应 JSON"""
+        return json.loads(bytes(self._skeleton))
+
+
+def find_inline_mime_type(result: Dict[str, Any]) -> Optional[str]:
+    """从响应骨架中找到第一个 inlineData 的 mimeType"""
+    for candidate in result.get("candidates", []):
+        for part in candidate.get("content", {}).get("parts", []):
+            inline_data = part.get("inlineData") or part.get("inline_data")
+            if inline_data:
+                return inline_data.get("mimeType") or inline_data.get("mime_type")
+    return None
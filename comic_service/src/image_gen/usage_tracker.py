@@ -0,0 +1,128 @@
+"""
+参考图使用统计（写回缓存）
+每次生成页面时只在内存中累加使用次数和最后使用时间，定期和服务关闭时批量写入存储后端，
+不会因为一次使用而重写人物/场景记录
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from loguru import logger
+
+
+class UsageTracker:
+    """一个参考图库（人物或场景）的使用统计"""
+
+    def __init__(self, store, flush_interval: float = 30.0):
+        """
+        Args:
+            store: 存储后端（JsonReferenceStore / SqliteReferenceStore）
+            flush_interval: 定期写入间隔（秒），<= 0 时只在关闭和手动 flush 时写入
+        """
+        self.store = store
+        self.flush_interval = flush_interval
+        # 已写入存储的统计：ID -> {"usage_count", "last_used"}
+        self._persisted: Dict[str, Dict[str, Any]] = store.load_usage()
+        # 尚未写入的增量
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+
+    def record(self, obj_ids: Iterable[str]):
+        """记录一次使用（同一页中的每个参考图记一次）"""
+        now = datetime.now().isoformat(timespec="seconds")
+        for obj_id in obj_ids:
+            delta = self._pending.setdefault(obj_id, {"usage_count": 0, "last_used": None})
+            delta["usage_count"] += 1
+            delta["last_used"] = now
+
+    def get(self, obj_id: str) -> Dict[str, Any]:
+        """
+        当前统计（已写入 + 未写入）
+
+        Returns:
+            {"usage_count", "last_used"}
+        """
+        persisted = self._persisted.get(obj_id, {})
+        delta = self._pending.get(obj_id, {})
+        return {
+            "usage_count": persisted.get("usage_count", 0) + delta.get("usage_count", 0),
+            "last_used": delta.get("last_used") or persisted.get("last_used"),
+        }
+
+    def hottest(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """使用次数最多的参考图（次数相同时最近使用的优先）"""
+        usage = [{"id": obj_id, **self.get(obj_id)} for obj_id in set(self._persisted) | set(self._pending)]
+        usage.sort(key=lambda u: (u["usage_count"], u["last_used"] or ""), reverse=True)
+        return usage[:limit]
+
+    def forget(self, obj_id: str):
+        """删除参考图时丢弃其统计"""
+        self._persisted.pop(obj_id, None)
+        self._pending.pop(obj_id, None)
+
+    def flush(self) -> int:
+        """
+        把未写入的增量批量写入存储
+
+        Returns:
+            写入的记录数
+        """
+        if not self._pending:
+            return 0
+        deltas, self._pending = self._pending, {}
+
+        started = time.perf_counter()
+        try:
+            totals = self.store.add_usage(deltas)
+        except Exception as e:
+            # 写入失败时保留增量，下次再试
+            for obj_id, delta in deltas.items():
+                pending = self._pending.setdefault(obj_id, {"usage_count": 0, "last_used": None})
+                pending["usage_count"] += delta["usage_count"]
+                pending["last_used"] = pending["last_used"] or delta["last_used"]
+            self.flush_failures += 1
+            logger.warning(f"使用统计写入失败，稍后重试: {e}")
+            return 0
+
+        self._persisted.update(totals)
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        logger.debug(f"使用统计已写入: {len(deltas)} 条，{self.last_flush_ms:.1f}ms")
+        return len(deltas)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def start(self):
+        """启动定期写入"""
+        if self.flush_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止定期写入，并写入剩余的增量"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        return {
+            "tracked": len(set(self._persisted) | set(self._pending)),
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "hottest": self.hottest(5),
+        }
@@ -0,0 +1,86 @@
+"""
+图片处理工作池
+把 PIL 解码/缩放/编码和文件写入放到线程池或进程池执行，提供异步接口，
+避免 4K 图片处理期间阻塞 MCP 服务器的事件循环
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+
+class ImageWorkerPool:
+    """线程池/进程池封装（懒创建，服务关闭时 shutdown）"""
+
+    def __init__(self, kind: str = "thread", max_workers: int = 2):
+        """
+        Args:
+            kind: "thread"（线程池，PIL 大部分操作会释放 GIL）或 "process"（进程池，完全隔离 CPU 负载）
+            max_workers: 工作线程/进程数
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"不支持的工作池类型: {kind}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[Executor] = None
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn 避免在已运行事件循环的进程中 fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="image-worker"
+                )
+            logger.info(f"图片处理工作池已启动: {self.kind} x {self.max_workers}")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在工作池中执行函数（进程池模式下 fn 必须是模块级函数）
+
+        Returns:
+            函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(),
+                functools.partial(fn, *args, **kwargs)
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    def shutdown(self, wait: bool = True):
+        """关闭工作池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """工作池统计"""
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
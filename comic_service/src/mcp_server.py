@@ -13,6 +13,12 @@
 import os
 import sys
 import json
+import glob
+import argparse
+import time
+import hashlib
+import asyncio
+from collections import Counter
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from loguru import logger
@@ -25,8 +31,19 @@ from mcp.types import (
 )
 
 from .image_gen.gemini_client import GeminiImageGenerator
+from .image_gen.endpoints import ApiEndpoint
+from .image_gen.latency import LatencyHistory, AdaptiveTimeouts
+from .image_gen.generation_cache import GenerationCache
+from .image_gen.rate_limit import RequestLimiter
+from .image_gen.resilience import RetryPolicy, CircuitBreaker, CircuitOpenError
+from .image_gen.workers import ImageWorkerPool
+from .image_gen.page_writer import PageWriter
 from .image_gen.character_manager import CharacterManager
 from .image_gen.scene_manager import SceneManager
+from .image_gen.reference_store import SqliteReferenceStore
+from .image_gen.reference_watcher import ReferenceWatcher
+from .image_gen.job_queue import JobQueue
+from .image_gen.job_journal import JobJournal, PAGE_DONE, PAGE_RUNNING, input_hash, diff_inputs
 from .models.comic_schema import Page
 from .models.schemas import get_workflow_guide, get_json_schema_guide, COMIC_PAGE_EXAMPLE
 
@@ -35,12 +52,32 @@ logger.remove()
 logger.add(lambda msg: print(msg, file=sys.stderr, end=''), level="INFO")
 
 
+SERVER_NAME = "comic-service"
+SERVER_VERSION = "0.2.0"
+
+# 可以作为后台任务提交的工具
+JOB_TOOLS = [
+    "generate_comic_page",
+    "generate_comic_pages",
+    "rebuild_stale_pages",
+    "generate_character_reference",
+    "generate_scene_reference",
+    "generate_references_batch",
+]
+
+# rebuild_stale_pages 重新生成的页面状态
+REBUILD_STATES = {"stale", "missing_output", "failed", "interrupted", "pending"}
+
+# 人物参考图提示词的固定后缀
+CHARACTER_NAME_HINT = "，注意生成的人物参考图需要在左下角写上当前人物的名字，图片中不需要其他的描述。"
+
+
 class ComicMCPServer:
     """漫画服务 MCP 服务器"""
 
     def __init__(self):
         """初始化服务器"""
-        self.server = Server("comic-service")
+        self.server = Server(SERVER_NAME, version=SERVER_VERSION)
 
         # 加载配置
         self.config = self._load_config()
@@ -53,26 +90,205 @@ class ComicMCPServer:
         if not api_key or api_key == "YOUR_API_KEY_HERE":
             logger.warning("⚠️  GEMINI_API_KEY 未设置！请在 .env 文件中配置")
 
+        # 生成结果缓存（相同请求直接返回已生成的图片）
+        cache_config = self.config.get("cache", {})
+        generation_cache = None
+        if cache_config.get("enabled", True):
+            generation_cache = GenerationCache(
+                cache_dir=Path(cache_config.get("dir", "./config/cache/generations")),
+                max_size_mb=cache_config.get("max_size_mb", 2048)
+            )
+
+        retry_config = self.config.get("retry", {})
+        breaker_config = self.config.get("circuit_breaker", {})
+        rate_limit_config = self.config.get("rate_limit", {})
+        hedging_config = self.config.get("hedging", {})
+        timeout_config = self.config.get("timeouts", {})
+        worker_config = self.config.get("workers", {})
+
+        http_config = self.config.get("http", {})
         self.gemini_client = GeminiImageGenerator(
             api_key=api_key,
             base_url=base_url,
-            model=model
+            model=model,
+            http2=http_config.get("http2", True),
+            max_connections=http_config.get("max_connections", 10),
+            max_keepalive_connections=http_config.get("max_keepalive_connections", 5),
+            keepalive_expiry=http_config.get("keepalive_expiry", 60.0),
+            connect_timeout=http_config.get("connect_timeout", 10.0),
+            stream_responses=http_config.get("stream_responses", True),
+            cache=generation_cache,
+            retry_policy=RetryPolicy(
+                max_attempts=retry_config.get("max_attempts", 4),
+                timeout_retries=retry_config.get("timeout_retries", 1),
+                base_delay=retry_config.get("base_delay", 2.0),
+                max_delay=retry_config.get("max_delay", 60.0)
+            ),
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=breaker_config.get("failure_threshold", 5),
+                recovery_timeout=breaker_config.get("recovery_timeout", 60.0)
+            ),
+            limiter=RequestLimiter(
+                max_concurrent=rate_limit_config.get("max_concurrent", 4),
+                requests_per_minute=rate_limit_config.get("requests_per_minute"),
+                burst=rate_limit_config.get("burst")
+            ),
+            endpoints=self._build_endpoints(breaker_config),
+            hedging_enabled=hedging_config.get("enabled", False),
+            hedging_percentile=hedging_config.get("percentile", 0.9),
+            hedging_max_extra_ratio=hedging_config.get("max_extra_ratio", 0.1),
+            hedging_min_samples=hedging_config.get("min_samples", 10),
+            adaptive_timeouts=AdaptiveTimeouts(
+                LatencyHistory(),
+                connect_timeout=http_config.get("connect_timeout", 10.0),
+                safety_factor=timeout_config.get("safety_factor", 2.0),
+                min_read=timeout_config.get("min_read", 30.0),
+                max_read=timeout_config.get("max_read", 600.0),
+                min_samples=timeout_config.get("min_samples", 5),
+                default_read=timeout_config.get("default_read"),
+                overrides=timeout_config.get("overrides")
+            ),
+            latency_history_path=Path(timeout_config.get("history_path", "./config/cache/latency_history.json")),
+            image_workers=ImageWorkerPool(
+                kind=worker_config.get("kind", "thread"),
+                max_workers=worker_config.get("max_workers", 2)
+            ),
+            resize_mode=worker_config.get("resize_mode", "balanced")
         )
 
         # 初始化管理器
-        ref_path = Path(self.config.get("storage", {}).get("reference_images_path", "./config/references"))
+        storage_config = self.config.get("storage", {})
+        self.ref_path = Path(storage_config.get("reference_images_path", "./config/references"))
+        min_match_score = self.config.get("name_matching", {}).get("min_score", 0.75)
+        usage_flush_interval = self.config.get("usage_stats", {}).get("flush_interval", 30.0)
+        character_store = scene_store = None
+        if storage_config.get("backend", "json") == "sqlite":
+            # 多个服务进程共用一个 SQLite 库
+            db_path = Path(storage_config.get("sqlite_path", self.ref_path / "library.db"))
+            character_store = SqliteReferenceStore(
+                db_path, kind="character", id_field="character_id", min_match_score=min_match_score
+            )
+            scene_store = SqliteReferenceStore(
+                db_path, kind="scene", id_field="scene_id", min_match_score=min_match_score
+            )
+            logger.info(f"参考图库使用 SQLite: {db_path}")
         self.character_manager = CharacterManager(
             gemini_client=self.gemini_client,
-            storage_dir=ref_path / "characters"
+            storage_dir=self.ref_path / "characters",
+            min_match_score=min_match_score,
+            store=character_store,
+            usage_flush_interval=usage_flush_interval
         )
         self.scene_manager = SceneManager(
             gemini_client=self.gemini_client,
-            storage_dir=ref_path / "scenes"
+            storage_dir=self.ref_path / "scenes",
+            min_match_score=min_match_score,
+            store=scene_store,
+            usage_flush_interval=usage_flush_interval
+        )
+
+        # 参考图目录热加载（SQLite 后端通过库版本号发现修改，不需要监视目录）
+        hot_reload_config = self.config.get("hot_reload", {})
+        self.reference_watcher = None
+        if hot_reload_config.get("enabled", True) and self.character_manager.store.backend == "json":
+            self.reference_watcher = ReferenceWatcher(
+                [self.character_manager, self.scene_manager],
+                debounce=hot_reload_config.get("debounce", 0.5),
+                poll_interval=hot_reload_config.get("poll_interval", 2.0),
+                use_inotify=hot_reload_config.get("use_inotify", True)
+            )
+
+        # 页面输出（无损母版 + 交付版本）
+        page_output_config = self.config.get("page_output", {})
+        output_dir = Path(self.config.get("storage", {}).get("output_images_path", "./output/pages"))
+        self.page_writer = PageWriter(
+            output_dir=output_dir,
+            workers=self.gemini_client.image_workers,
+            keep_master=page_output_config.get("keep_master", True),
+            renditions=page_output_config.get("renditions", [{"format": "jpeg", "quality": 85}]),
+            previews=page_output_config.get("previews"),
+            resize_mode=self.gemini_client.resize_mode
+        )
+
+        # 后台任务队列（提交后立即返回任务 ID），页面和任务状态写入生成日志，重启后继续
+        jobs_config = self.config.get("jobs", {})
+        self.job_journal = JobJournal(Path(jobs_config.get("journal_path") or output_dir / "journal.jsonl"))
+        # 页码 -> 正在生成该页的任务数（多个任务可能同时生成同一页）
+        self._pages_in_flight: Counter = Counter()
+        self.job_queue = JobQueue(
+            runner=self._run_job_tool,
+            max_workers=jobs_config.get("max_workers", 2),
+            max_finished=jobs_config.get("max_finished", 200),
+            journal=self.job_journal,
+            resume=jobs_config.get("resume", True)
         )
+        self.max_job_wait = jobs_config.get("max_wait", 120.0)
 
         # 注册工具
         self._register_tools()
 
+    def initialization_options(self) -> InitializationOptions:
+        """MCP 初始化选项（stdio 和 HTTP 传输共用）"""
+        return InitializationOptions(
+            server_name=SERVER_NAME,
+            server_version=SERVER_VERSION,
+            capabilities=self.server.get_capabilities(
+                notification_options=NotificationOptions(),
+                experimental_capabilities={}
+            )
+        )
+
+    async def startup(self):
+        """服务启动：打开长连接池，启动使用统计的定期写入和参考图目录热加载"""
+        await self.gemini_client.start()
+        await self.character_manager.usage.start()
+        await self.scene_manager.usage.start()
+        if self.reference_watcher:
+            await self.reference_watcher.start()
+        await self.job_queue.start()
+
+    async def shutdown(self):
+        """服务关闭：停止后台任务和热加载，写入剩余的使用统计，关闭参考图库和生成日志，释放连接池和图片处理工作池"""
+        await self.job_queue.stop()
+        if self.reference_watcher:
+            await self.reference_watcher.stop()
+        await self.character_manager.usage.stop()
+        await self.scene_manager.usage.stop()
+        # 使用统计写入后再关闭（SQLite 后端的连接）
+        self.character_manager.store.close()
+        self.scene_manager.store.close()
+        await self.job_journal.sync()
+        self.job_journal.close()
+        await self.gemini_client.aclose()
+
+    def _build_endpoints(self, breaker_config: Dict) -> Optional[List[ApiEndpoint]]:
+        """
+        根据配置构建多个 API 端点（未配置 endpoints 时返回 None，使用单一 base_url）
+
+        每个端点可以用 api_key 直接配置密钥，或用 api_key_env 指定环境变量名
+        """
+        endpoints = []
+        for item in self.config.get("endpoints", []):
+            api_key = os.getenv(item["api_key_env"]) if item.get("api_key_env") else item.get("api_key")
+            if not api_key:
+                logger.warning(f"⚠️  端点 {item.get('name', item['base_url'])} 未配置 API Key，已跳过")
+                continue
+            endpoints.append(ApiEndpoint(
+                base_url=item["base_url"],
+                api_key=api_key,
+                name=item.get("name"),
+                weight=item.get("weight", 1.0),
+                max_concurrent=item.get("max_concurrent", 4),
+                circuit_breaker=CircuitBreaker(
+                    failure_threshold=breaker_config.get("failure_threshold", 5),
+                    recovery_timeout=breaker_config.get("recovery_timeout", 60.0)
+                )
+            ))
+
+        if endpoints:
+            logger.info(f"已配置 {len(endpoints)} 个 API 端点: {', '.join(e.name for e in endpoints)}")
+        return endpoints or None
+
     def _load_config(self) -> Dict:
         """加载配置文件"""
         config_path = Path(__file__).parent.parent / "config" / "gemini_config.json"
@@ -85,7 +301,105 @@ class ComicMCPServer:
         return {
             "api_key": "",
             "model": "gemini-3-pro-image-preview",
+            "http": {
+                "http2": True,
+                "max_connections": 10,
+                "max_keepalive_connections": 5,
+                "keepalive_expiry": 60.0,
+                "connect_timeout": 10.0,
+                "stream_responses": True
+            },
+            "cache": {
+                "enabled": True,
+                "dir": "./config/cache/generations",
+                "max_size_mb": 2048
+            },
+            "retry": {
+                "max_attempts": 4,
+                "timeout_retries": 1,
+                "base_delay": 2.0,
+                "max_delay": 60.0
+            },
+            "circuit_breaker": {
+                "failure_threshold": 5,
+                "recovery_timeout": 60.0
+            },
+            "rate_limit": {
+                "max_concurrent": 4,
+                "requests_per_minute": None,
+                "burst": None
+            },
+            "endpoints": [],
+            "hedging": {
+                "enabled": False,
+                "percentile": 0.9,
+                "max_extra_ratio": 0.1,
+                "min_samples": 10
+            },
+            "timeouts": {
+                "safety_factor": 2.0,
+                "min_read": 30.0,
+                "max_read": 600.0,
+                "min_samples": 5,
+                "default_read": {"1K": 120.0, "2K": 120.0, "4K": 240.0},
+                "overrides": {},
+                "history_path": "./config/cache/latency_history.json"
+            },
+            "workers": {
+                "kind": "thread",
+                "max_workers": 2,
+                "resize_mode": "balanced"
+            },
+            "name_matching": {
+                "min_score": 0.75
+            },
+            "usage_stats": {
+                "flush_interval": 30.0
+            },
+            "batch": {
+                "max_parallel": 3,
+                "max_parallel_pages": 2
+            },
+            "hot_reload": {
+                "enabled": True,
+                "debounce": 0.5,
+                "poll_interval": 2.0,
+                "use_inotify": True
+            },
+            "jobs": {
+                "max_workers": 2,
+                "max_finished": 200,
+                "max_wait": 120.0,
+                "journal_path": None,
+                "resume": True
+            },
+            "transport": {
+                "type": "stdio",
+                "host": "127.0.0.1",
+                "port": 8765,
+                "path": "/mcp",
+                "sse": True,
+                "stateless": False,
+                "json_response": False,
+                "session_idle_timeout": 1800,
+                "allowed_hosts": []
+            },
+            "page_output": {
+                "keep_master": True,
+                "renditions": [
+                    {"format": "jpeg", "quality": 85}
+                ],
+                "previews": {
+                    "enabled": True,
+                    "preview_width": 1024,
+                    "thumbnail_width": 256,
+                    "format": "jpeg",
+                    "quality": 80
+                }
+            },
             "storage": {
+                "backend": "json",
+                "sqlite_path": "./config/references/library.db",
                 "reference_images_path": "./config/references",
                 "output_images_path": "./output/pages"
             }
@@ -119,16 +433,20 @@ class ComicMCPServer:
             ]
 
         @self.server.read_resource()
-        async def handle_read_resource(uri: str) -> str:
-            """读取资源"""
+        async def handle_read_resource(uri) -> str:
+            """读取资源（MCP 传入的 uri 是 AnyUrl，按字符串比较）"""
+            uri = str(uri)
             if uri == "file:///workflow":
                 return get_workflow_guide()
             elif uri == "file:///characters":
                 chars = self.character_manager.list_characters()
-                return json.dumps([c.model_dump() for c in chars], ensure_ascii=False, indent=2, default=str)
+                # 使用次数和最后使用时间以 UsageTracker 为准
+                data = [{**c.model_dump(), **self.character_manager.usage.get(c.character_id)} for c in chars]
+                return json.dumps(data, ensure_ascii=False, indent=2, default=str)
             elif uri == "file:///scenes":
                 scenes = self.scene_manager.list_scenes()
-                return json.dumps([s.model_dump() for s in scenes], ensure_ascii=False, indent=2, default=str)
+                data = [{**s.model_dump(), **self.scene_manager.usage.get(s.scene_id)} for s in scenes]
+                return json.dumps(data, ensure_ascii=False, indent=2, default=str)
             return "{}"
 
         @self.server.list_tools()
@@ -164,6 +482,11 @@ class ComicMCPServer:
                                 "type": "string",
                                 "description": "角色名称"
                             },
+                            "aliases": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "角色别名（昵称、称呼等，可选），页面 JSON 中使用别名也能匹配到该角色"
+                            },
                             "description": {
                                 "type": "string",
                                 "description": "角色详细的外貌描述（发色、发型、服装、年龄、体型等），角色尽可能是站立状态，如果有参考图需要加以下描述（参考图片中的人物生成角色 或者 参考图片中的画风风格生成角色）"
@@ -187,6 +510,11 @@ class ComicMCPServer:
                             "reference_image": {
                                 "type": "string",
                                 "description": "参考图片的本地路径（可选）。有两种使用方式：1) 参考图片中的人物时，description的description可以简单描述如'使用图片中的人物'；2) 参考图片的画风风格时，description的description 需要清晰描述人物特征"
+                            },
+                            "force_regenerate": {
+                                "type": "boolean",
+                                "description": "忽略生成缓存强制重新生成（默认 false，相同输入会直接返回已生成的图片）",
+                                "default": False
                             }
                         },
                         "required": ["character_name", "description"]
@@ -211,6 +539,11 @@ class ComicMCPServer:
                                 "items": {"type": "string"},
                                 "description": "场景标签（如：城市、街道、白天等）"
                             },
+                            "aliases": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "场景别名（简称等，可选），页面 JSON 的 background 中使用别名也能匹配到该场景"
+                            },
                             "style": {
                                 "type": "string",
                                 "description": "漫画风格",
@@ -219,11 +552,66 @@ class ComicMCPServer:
                             "reference_image": {
                                 "type": "string",
                                 "description": "参考图片的本地路径（可选）。有两种使用方式：1) 参考图片中的场景时，description的description 可以简单描述如'使用图片中的场景'；2) 参考图片的画风风格时，description的description需要清晰描述场景特征"
+                            },
+                            "force_regenerate": {
+                                "type": "boolean",
+                                "description": "忽略生成缓存强制重新生成（默认 false，相同输入会直接返回已生成的图片）",
+                                "default": False
                             }
                         },
                         "required": ["scene_name", "description"]
                     }
                 ),
+                Tool(
+                    name="generate_references_batch",
+                    description="批量生成人物和场景参考图 - 并发生成（有并发上限），已存在的默认跳过，单项失败不影响其他项，返回汇总结果",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "characters": {
+                                "type": "array",
+                                "description": "人物列表，每项参数与 generate_character_reference 相同",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "character_name": {"type": "string", "description": "角色名称"},
+                                        "description": {"type": "string", "description": "角色详细描述"},
+                                        "aliases": {"type": "array", "items": {"type": "string"}, "description": "角色别名"},
+                                        "visual_features": {"type": "object", "description": "视觉特征"},
+                                        "style": {"type": "string", "description": "漫画风格"},
+                                        "reference_image": {"type": "string", "description": "参考图片的本地路径"}
+                                    },
+                                    "required": ["character_name", "description"]
+                                }
+                            },
+                            "scenes": {
+                                "type": "array",
+                                "description": "场景列表，每项参数与 generate_scene_reference 相同",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "scene_name": {"type": "string", "description": "场景名称"},
+                                        "description": {"type": "string", "description": "场景详细描述"},
+                                        "tags": {"type": "array", "items": {"type": "string"}, "description": "场景标签"},
+                                        "aliases": {"type": "array", "items": {"type": "string"}, "description": "场景别名"},
+                                        "style": {"type": "string", "description": "漫画风格"},
+                                        "reference_image": {"type": "string", "description": "参考图片的本地路径"}
+                                    },
+                                    "required": ["scene_name", "description"]
+                                }
+                            },
+                            "force": {
+                                "type": "boolean",
+                                "description": "已存在的人物/场景也重新生成（同时忽略生成缓存），默认跳过",
+                                "default": False
+                            },
+                            "max_parallel": {
+                                "type": "integer",
+                                "description": "同时生成的数量上限（默认读取配置 batch.max_parallel）"
+                            }
+                        }
+                    }
+                ),
 
                 # 核心工具：生成漫画图片
                 Tool(
@@ -266,11 +654,137 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
                             "style_reference_image": {
                                 "type": "string",
                                 "description": "风格参考图片的本地路径（可选）。如果有漫画参考图，请使用图片中的风格"
+                            },
+                            "timeout": {
+                                "type": "number",
+                                "description": "读取超时秒数（可选，不传则根据历史延迟自动推导）"
+                            },
+                            "force_regenerate": {
+                                "type": "boolean",
+                                "description": "忽略生成缓存和生成日志强制重新生成（默认 false，输入未变化的页面会直接返回已生成的图片）",
+                                "default": False
                             }
                         },
                         "required": ["json_path"]
                     }
                 ),
+                Tool(
+                    name="generate_comic_pages",
+                    description="批量生成漫画页面 - 传入多个 JSON 文件、目录或 glob 模式（如 output/page_*.json），所有页面共用一份参考图，并发生成（有并发上限），逐页发送进度，返回每页的结果和耗时",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "json_paths": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "JSON 文件路径、目录（读取其中所有 .json）或 glob 模式列表"
+                            },
+                            "image_size": {
+                                "type": "string",
+                                "description": "图像大小",
+                                "enum": ["1K", "2K", "4K"],
+                                "default": "4K"
+                            },
+                            "aspect_ratio": {
+                                "type": "string",
+                                "description": "长宽比",
+                                "enum": ["1:1", "16:9", "9:16", "3:4", "4:3", "3:2", "2:3", "21:9"],
+                                "default": "3:4"
+                            },
+                            "style": {
+                                "type": "string",
+                                "description": "漫画风格",
+                                "default": "彩漫风格"
+                            },
+                            "style_reference_image": {
+                                "type": "string",
+                                "description": "风格参考图片的本地路径（可选）"
+                            },
+                            "timeout": {
+                                "type": "number",
+                                "description": "每页的读取超时秒数（可选）"
+                            },
+                            "force_regenerate": {
+                                "type": "boolean",
+                                "description": "忽略生成缓存和生成日志强制重新生成（默认跳过输入未变化的页面）",
+                                "default": False
+                            },
+                            "max_parallel": {
+                                "type": "integer",
+                                "description": "同时生成的页数上限（默认读取配置 batch.max_parallel_pages）"
+                            }
+                        },
+                        "required": ["json_paths"]
+                    }
+                ),
+
+                # 后台任务
+                Tool(
+                    name="submit_job",
+                    description="提交后台生成任务，立即返回任务 ID（不等待生成完成）。生成期间可以继续准备后续页面，之后用 get_job_status / wait_for_jobs 查询结果",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "tool": {
+                                "type": "string",
+                                "enum": JOB_TOOLS,
+                                "description": "要执行的生成工具"
+                            },
+                            "arguments": {
+                                "type": "object",
+                                "description": "该工具的参数（与直接调用时相同）"
+                            }
+                        },
+                        "required": ["tool", "arguments"]
+                    }
+                ),
+                Tool(
+                    name="get_job_status",
+                    description="查询后台任务状态（queued / running / done / failed / cancelled），完成的任务附带结果（图片路径等）",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "job_ids": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "任务 ID 列表（不传则列出所有任务）"
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="wait_for_jobs",
+                    description="等待后台任务结束（最多 timeout 秒），返回各任务的状态和结果",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "job_ids": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "任务 ID 列表"
+                            },
+                            "timeout": {
+                                "type": "number",
+                                "description": "最长等待秒数（默认且最大为配置 jobs.max_wait）"
+                            }
+                        },
+                        "required": ["job_ids"]
+                    }
+                ),
+                Tool(
+                    name="cancel_job",
+                    description="取消排队中或执行中的后台任务",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "job_id": {
+                                "type": "string",
+                                "description": "任务 ID"
+                            }
+                        },
+                        "required": ["job_id"]
+                    }
+                ),
 
                 # 管理工具
                 Tool(
@@ -289,6 +803,129 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
                         "properties": {}
                     }
                 ),
+                Tool(
+                    name="get_page_previews",
+                    description="获取指定页码范围内漫画页面的预览图（1K）和缩略图路径及尺寸，用于快速审阅，不读取原图",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "start_page": {
+                                "type": "integer",
+                                "description": "起始页码（包含）"
+                            },
+                            "end_page": {
+                                "type": "integer",
+                                "description": "结束页码（包含，默认与起始页相同）"
+                            }
+                        },
+                        "required": ["start_page"]
+                    }
+                ),
+                Tool(
+                    name="get_chapter_status",
+                    description="查询一章（多个页面 JSON）的生成进度：根据生成日志和当前输入判断每页已完成、输入已变化需要重新生成（附变化原因）、失败、中断或未生成",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "json_paths": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "JSON 文件路径、目录（读取其中所有 .json）或 glob 模式列表"
+                            },
+                            "image_size": {
+                                "type": "string",
+                                "description": "图像大小（默认沿用每页上次生成时的参数，从未生成的页面为 4K）",
+                                "enum": ["1K", "2K", "4K"]
+                            },
+                            "aspect_ratio": {
+                                "type": "string",
+                                "description": "长宽比（默认沿用每页上次生成时的参数）",
+                                "enum": ["1:1", "16:9", "9:16", "3:4", "4:3", "3:2", "2:3", "21:9"]
+                            },
+                            "style": {
+                                "type": "string",
+                                "description": "漫画风格（默认沿用每页上次生成时的参数）"
+                            },
+                            "style_reference_image": {
+                                "type": "string",
+                                "description": "风格参考图片路径（默认沿用每页上次生成时的参数）"
+                            }
+                        },
+                        "required": ["json_paths"]
+                    }
+                ),
+                Tool(
+                    name="rebuild_stale_pages",
+                    description="增量重新生成：根据每页记录的依赖（页面 JSON、角色/场景参考图、风格参考图、风格、尺寸和长宽比）找出有变化、失败、中断或从未生成的页面，只重新生成这些页面。更新参考图后用 dry_run 查看受影响的页面",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "json_paths": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "JSON 文件路径、目录（读取其中所有 .json）或 glob 模式列表"
+                            },
+                            "image_size": {
+                                "type": "string",
+                                "description": "图像大小（默认沿用每页上次生成时的参数，从未生成的页面为 4K）",
+                                "enum": ["1K", "2K", "4K"]
+                            },
+                            "aspect_ratio": {
+                                "type": "string",
+                                "description": "长宽比（默认沿用每页上次生成时的参数）",
+                                "enum": ["1:1", "16:9", "9:16", "3:4", "4:3", "3:2", "2:3", "21:9"]
+                            },
+                            "style": {
+                                "type": "string",
+                                "description": "漫画风格（默认沿用每页上次生成时的参数）"
+                            },
+                            "style_reference_image": {
+                                "type": "string",
+                                "description": "风格参考图片路径（默认沿用每页上次生成时的参数）"
+                            },
+                            "dry_run": {
+                                "type": "boolean",
+                                "description": "只返回需要重新生成的页面和原因，不执行",
+                                "default": False
+                            },
+                            "timeout": {
+                                "type": "number",
+                                "description": "每页的读取超时秒数（可选）"
+                            },
+                            "max_parallel": {
+                                "type": "integer",
+                                "description": "同时生成的页数上限（默认读取配置 batch.max_parallel_pages）"
+                            }
+                        },
+                        "required": ["json_paths"]
+                    }
+                ),
+                Tool(
+                    name="import_reference_library",
+                    description="把 JSON 格式的人物/场景库导入当前存储后端（如 SQLite），旧版内嵌 base64 的文件同时迁移",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "source_path": {
+                                "type": "string",
+                                "description": "JSON 库根目录（包含 characters/ 和 scenes/，默认为参考图目录）"
+                            },
+                            "overwrite": {
+                                "type": "boolean",
+                                "description": "已存在的人物/场景是否覆盖（默认跳过）",
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="get_service_stats",
+                    description="查看服务运行统计（连接池、生成缓存命中率等）",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {}
+                    }
+                ),
             ]
 
         @self.server.call_tool()
@@ -310,10 +947,29 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
                 elif name == "generate_scene_reference":
                     return await self._generate_scene_reference(**arguments)
 
+                elif name == "generate_references_batch":
+                    return await self._generate_references_batch(**arguments)
+
                 # 核心工具
                 elif name == "generate_comic_page":
                     return await self._generate_comic_page(**arguments)
 
+                elif name == "generate_comic_pages":
+                    return await self._generate_comic_pages(**arguments)
+
+                # 后台任务
+                elif name == "submit_job":
+                    return await self._submit_job(**arguments)
+
+                elif name == "get_job_status":
+                    return await self._get_job_status(**arguments)
+
+                elif name == "wait_for_jobs":
+                    return await self._wait_for_jobs(**arguments)
+
+                elif name == "cancel_job":
+                    return await self._cancel_job(**arguments)
+
                 # 管理工具
                 elif name == "list_characters":
                     return await self._list_characters()
@@ -321,9 +977,28 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
                 elif name == "list_scenes":
                     return await self._list_scenes()
 
+                elif name == "get_page_previews":
+                    return await self._get_page_previews(**arguments)
+
+                elif name == "get_chapter_status":
+                    return await self._get_chapter_status(**arguments)
+
+                elif name == "rebuild_stale_pages":
+                    return await self._rebuild_stale_pages(**arguments)
+
+                elif name == "import_reference_library":
+                    return await self._import_reference_library(**arguments)
+
+                elif name == "get_service_stats":
+                    return await self._get_service_stats()
+
                 else:
                     return [TextContent(type="text", text=f"未知工具: {name}")]
 
+            except CircuitOpenError as e:
+                logger.warning(f"工具调用被熔断拒绝 {name}: {e}")
+                return [TextContent(type="text", text=f"错误: {str(e)}")]
+
             except Exception as e:
                 logger.error(f"工具调用失败 {name}: {e}")
                 return [TextContent(type="text", text=f"错误: {str(e)}")]
@@ -346,25 +1021,32 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
         description: str,
         visual_features: Optional[Dict] = None,
         style: str = "彩漫风格",
-        reference_image: Optional[str] = None
+        reference_image: Optional[str] = None,
+        force_regenerate: bool = False,
+        aliases: Optional[List[str]] = None
     ) -> list[TextContent]:
         """生成人物参考图"""
         logger.info(f"🎨 生成人物参考图: {character_name}")
 
         character = await self.character_manager.create_character(
             name=character_name,
-            description=f"{description}，注意生成的人物参考图需要在左下角写上当前人物的名字，图片中不需要其他的描述。",
+            description=f"{description}{CHARACTER_NAME_HINT}",
             visual_features=visual_features,
             style=style,
-            reference_image=reference_image
+            reference_image=reference_image,
+            use_cache=not force_regenerate,
+            aliases=aliases
         )
 
         result = {
             "success": True,
             "character_id": character.character_id,
             "name": character.name,
+            "aliases": character.aliases,
             "message": f"人物参考图已生成并保存到 {character.reference_image.path}",
             "visual_features": character.visual_features.model_dump(),
+            "stale_pages": self._pages_outdated_by("characters", character.character_id, character.reference_image),
+            **self._generation_fields(character.reference_image),
             "next_step": f"在 JSON 中使用 character_name: '{character_name}' 来引用这个角色"
         }
 
@@ -379,7 +1061,9 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
         description: str,
         tags: Optional[List[str]] = None,
         style: str = "彩漫风格",
-        reference_image: Optional[str] = None
+        reference_image: Optional[str] = None,
+        force_regenerate: bool = False,
+        aliases: Optional[List[str]] = None
     ) -> list[TextContent]:
         """生成场景参考图"""
         logger.info(f"🎨 生成场景参考图: {scene_name}")
@@ -389,15 +1073,20 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
             description=description,
             tags=tags,
             style=style,
-            reference_image=reference_image
+            reference_image=reference_image,
+            use_cache=not force_regenerate,
+            aliases=aliases
         )
 
         result = {
             "success": True,
             "scene_id": scene.scene_id,
             "name": scene.name,
+            "aliases": scene.aliases,
             "message": f"场景参考图已生成并保存到 {scene.reference_image.path}",
             "tags": scene.tags,
+            "stale_pages": self._pages_outdated_by("scenes", scene.scene_id, scene.reference_image),
+            **self._generation_fields(scene.reference_image),
             "next_step": f"在 JSON 的 background 字段中使用 '{scene_name}' 来引用这个场景"
         }
 
@@ -406,34 +1095,159 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
             text=json.dumps(result, ensure_ascii=False, indent=2)
         )]
 
+    @staticmethod
+    def _generation_fields(reference_image) -> Dict[str, Any]:
+        """参考图本次生成的请求信息（字段与页面生成结果相同）"""
+        image = reference_image.generation
+        if image is None:
+            return {}
+        return {
+            "cache_hit": image.cache_hit,
+            "attempts": image.attempts,
+            "queue_wait_s": image.queue_wait_s,
+            "endpoint": image.endpoint,
+            "latency_s": image.latency_s,
+            "timeouts": image.timeouts,
+            "http_timings": image.http_timings,
+        }
+
+    def _pages_outdated_by(self, kind: str, obj_id: str, reference_image) -> List[int]:
+        """上次生成时用的是该参考图旧版本的页面（可用 rebuild_stale_pages 重新生成）"""
+        current = reference_image.sha256 or reference_image.path
+        return [
+            page_number for page_number, used in self.job_journal.pages_using(kind, obj_id).items()
+            if used != current
+        ]
+
+    def _progress_reporter(self):
+        """
+        当前请求带有 progressToken 时返回进度通知函数 report(progress, total, message)，否则返回 None
+        """
+        try:
+            ctx = self.server.request_context
+        except LookupError:
+            return None
+        token = ctx.meta.progressToken if ctx.meta else None
+        if token is None:
+            return None
+
+        async def report(progress: float, total: Optional[float] = None, message: Optional[str] = None):
+            try:
+                await ctx.session.send_progress_notification(
+                    token, progress, total, message=message, related_request_id=str(ctx.request_id)
+                )
+            except Exception as e:
+                # 进度通知失败不影响任务本身
+                logger.debug(f"进度通知发送失败: {e}")
+
+        return report
+
+    async def _generate_references_batch(
+        self,
+        characters: Optional[List[Dict[str, Any]]] = None,
+        scenes: Optional[List[Dict[str, Any]]] = None,
+        force: bool = False,
+        max_parallel: Optional[int] = None
+    ) -> list[TextContent]:
+        """批量生成人物和场景参考图"""
+        characters = characters or []
+        scenes = scenes or []
+        max_parallel = max_parallel or self.config.get("batch", {}).get("max_parallel", 3)
+        semaphore = asyncio.Semaphore(max(1, max_parallel))
+        report = self._progress_reporter()
+        total = len(characters) + len(scenes)
+        done = 0
+        started = time.perf_counter()
+        logger.info(f"📦 批量生成参考图: {len(characters)} 个人物，{len(scenes)} 个场景（并发 {max_parallel}）")
+
+        async def run_item(kind: str, name: str, obj_id: str, exists: bool, create) -> Dict[str, Any]:
+            nonlocal done
+            item = {"kind": kind, "name": name, "id": obj_id}
+            if exists and not force:
+                item.update(status="skipped", elapsed_s=0.0)
+            else:
+                async with semaphore:
+                    item_started = time.perf_counter()
+                    try:
+                        obj = await create()
+                        item["status"] = "created"
+                        item["stale_pages"] = self._pages_outdated_by(f"{kind}s", obj_id, obj.reference_image)
+                        item.update(self._generation_fields(obj.reference_image))
+                    except Exception as e:
+                        # 单项失败只记录，已生成的项已经保存
+                        logger.error(f"批量生成失败 {kind} {name}: {e}")
+                        item.update(status="failed", error=str(e))
+                    item["elapsed_s"] = round(time.perf_counter() - item_started, 2)
+
+            done += 1
+            logger.info(f"[{done}/{total}] {kind} {name}: {item['status']}")
+            if report:
+                await report(done, total, f"{kind} {name}: {item['status']}")
+            return item
+
+        jobs = []
+        for spec in characters:
+            name = spec["character_name"]
+            character_id = self.character_manager.make_character_id(name)
+            jobs.append(run_item(
+                "character", name, character_id,
+                self.character_manager.get_character(character_id) is not None,
+                lambda spec=spec: self.character_manager.create_character(
+                    name=spec["character_name"],
+                    description=f"{spec['description']}{CHARACTER_NAME_HINT}",
+                    visual_features=spec.get("visual_features"),
+                    style=spec.get("style", "彩漫风格"),
+                    reference_image=spec.get("reference_image"),
+                    use_cache=not force,
+                    aliases=spec.get("aliases")
+                )
+            ))
+        for spec in scenes:
+            name = spec["scene_name"]
+            scene_id = self.scene_manager.make_scene_id(name)
+            jobs.append(run_item(
+                "scene", name, scene_id,
+                self.scene_manager.get_scene(scene_id) is not None,
+                lambda spec=spec: self.scene_manager.create_scene(
+                    name=spec["scene_name"],
+                    description=spec["description"],
+                    tags=spec.get("tags"),
+                    style=spec.get("style", "彩漫风格"),
+                    reference_image=spec.get("reference_image"),
+                    use_cache=not force,
+                    aliases=spec.get("aliases")
+                )
+            ))
+
+        items = await asyncio.gather(*jobs)
+        counts = {status: sum(1 for item in items if item["status"] == status) for status in ("created", "skipped", "failed")}
+        result = {
+            "success": counts["failed"] == 0,
+            "total": total,
+            **counts,
+            "elapsed_s": round(time.perf_counter() - started, 2),
+            "items": items,
+            "message": f"{'✅' if counts['failed'] == 0 else '⚠️'} 生成 {counts['created']} 个，跳过 {counts['skipped']} 个，失败 {counts['failed']} 个",
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
     async def _generate_comic_page(
         self,
         json_path: str,
         image_size: str = "4K",
         aspect_ratio: str = "3:4",
         style: str = "彩漫风格",
-        style_reference_image: Optional[str] = None
+        style_reference_image: Optional[str] = None,
+        force_regenerate: bool = False,
+        timeout: Optional[float] = None
     ) -> list[TextContent]:
         """生成漫画图片（核心工具）"""
         try:
-            # 从文件读取 JSON
-            json_file = Path(json_path)
-            if not json_file.exists():
-                # 尝试相对于项目根目录的路径
-                project_root = Path(__file__).parent.parent
-                json_file = project_root / json_path
-
-            if not json_file.exists():
-                raise FileNotFoundError(f"找不到 JSON 文件: {json_path}")
-
-            logger.info(f"📂 从文件读取 JSON: {json_file}")
-
-            with open(json_file, 'r', encoding='utf-8') as f:
-                page_json = f.read()
-
-            # 尝试修复并解析 JSON
-            page_data = self._fix_and_parse_json(page_json)
-            page = Page(**page_data)
+            page = self._load_page_file(self._resolve_json_path(json_path))
 
             logger.info(f"📄 生成第 {page.page_number} 页，共 {len(page.panels)} 个分镜")
 
@@ -443,7 +1257,9 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
                 image_size=image_size,
                 aspect_ratio=aspect_ratio,
                 style=style,
-                style_reference_image=style_reference_image
+                style_reference_image=style_reference_image,
+                use_cache=not force_regenerate,
+                timeout=timeout
             )
 
         except FileNotFoundError as e:
@@ -455,6 +1271,234 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
             logger.error(f"生成失败: {e}")
             raise
 
+    @staticmethod
+    def _resolve_json_path(json_path: str) -> Path:
+        """JSON 文件路径，找不到时尝试相对于项目根目录的路径"""
+        json_file = Path(json_path)
+        if not json_file.exists():
+            json_file = Path(__file__).parent.parent / json_path
+        if not json_file.exists():
+            raise FileNotFoundError(f"找不到 JSON 文件: {json_path}")
+        return json_file
+
+    def _load_page_file(self, json_file: Path) -> Page:
+        """从文件读取页面 JSON（尝试修复格式错误）"""
+        logger.info(f"📂 从文件读取 JSON: {json_file}")
+        with open(json_file, 'r', encoding='utf-8') as f:
+            page_json = f.read()
+        return Page(**self._fix_and_parse_json(page_json))
+
+    def _expand_json_paths(self, json_paths: List[str]) -> List[Path]:
+        """把文件、目录（其中所有 .json）和 glob 模式展开为 JSON 文件列表（去重，保持顺序）"""
+        project_root = Path(__file__).parent.parent
+        files: List[Path] = []
+        for item in json_paths:
+            if any(ch in item for ch in "*?["):
+                # glob.glob 同时支持相对和绝对模式（Path.glob 不接受绝对模式）
+                matched = sorted(glob.glob(item, recursive=True))
+                if not matched and not os.path.isabs(item):
+                    matched = sorted(glob.glob(str(project_root / item), recursive=True))
+                matched = [Path(path) for path in matched]
+                if not matched:
+                    raise FileNotFoundError(f"没有匹配的 JSON 文件: {item}")
+                files.extend(matched)
+                continue
+            path = Path(item) if Path(item).exists() else project_root / item
+            if path.is_dir():
+                files.extend(sorted(path.glob("*.json")))
+            else:
+                files.append(self._resolve_json_path(item))
+
+        unique = []
+        seen = set()
+        for path in files:
+            key = path.resolve()
+            if key not in seen:
+                seen.add(key)
+                unique.append(path)
+        return unique
+
+    async def _generate_comic_pages(
+        self,
+        json_paths,
+        image_size: str = "4K",
+        aspect_ratio: str = "3:4",
+        style: str = "彩漫风格",
+        style_reference_image: Optional[str] = None,
+        force_regenerate: bool = False,
+        timeout: Optional[float] = None,
+        max_parallel: Optional[int] = None
+    ) -> list[TextContent]:
+        """批量生成漫画页面：共用一份参考图，并发生成（有并发上限），逐页发送进度"""
+        if isinstance(json_paths, str):
+            json_paths = [json_paths]
+        started = time.perf_counter()
+        items: List[Dict[str, Any]] = []
+
+        # 先解析所有页面，解析失败的页面单独记录，不影响其他页面
+        pages = []
+        page_numbers = set()
+        for json_file in self._expand_json_paths(json_paths):
+            item = {"json_path": str(json_file)}
+            try:
+                page = self._load_page_file(json_file)
+                if page.page_number in page_numbers:
+                    raise ValueError(f"页码重复: 第 {page.page_number} 页")
+                page_numbers.add(page.page_number)
+                item["page_number"] = page.page_number
+                pages.append((page, item))
+            except Exception as e:
+                item.update(status="failed", error=str(e), elapsed_s=0.0)
+            items.append(item)
+
+        # 所有页面共用一份参考图
+        character_names, scene_names = set(), set()
+        for page, _ in pages:
+            page_characters, page_scenes = self._page_names(page)
+            character_names |= page_characters
+            scene_names |= page_scenes
+        reference_set = self._build_reference_set(character_names, scene_names, style_reference_image)
+
+        max_parallel = max_parallel or self.config.get("batch", {}).get("max_parallel_pages", 2)
+        semaphore = asyncio.Semaphore(max(1, max_parallel))
+        report = self._progress_reporter()
+        total = len(items)
+        done = total - len(pages)
+        logger.info(f"📚 批量生成 {len(pages)} 页（并发 {max_parallel}）")
+
+        async def render(page: Page, item: Dict[str, Any]):
+            nonlocal done
+            async with semaphore:
+                page_started = time.perf_counter()
+                try:
+                    result = await self._render_page(
+                        page, image_size, aspect_ratio, style, reference_set,
+                        use_cache=not force_regenerate, timeout=timeout
+                    )
+                    item.update(
+                        status="skipped" if result.get("skipped") else "succeeded",
+                        image_path=result["image_path"],
+                        cache_hit=result["cache_hit"],
+                        attempts=result["attempts"],
+                        queue_wait_s=result["queue_wait_s"],
+                        latency_s=result["latency_s"],
+                    )
+                except Exception as e:
+                    logger.error(f"第 {page.page_number} 页生成失败: {e}")
+                    item.update(status="failed", error=str(e))
+                item["elapsed_s"] = round(time.perf_counter() - page_started, 2)
+
+            done += 1
+            logger.info(f"[{done}/{total}] 第 {page.page_number} 页: {item['status']}")
+            if report:
+                await report(done, total, f"第 {page.page_number} 页: {item['status']}")
+
+        await asyncio.gather(*(render(page, item) for page, item in sorted(pages, key=lambda p: p[0].page_number)))
+
+        elapsed = time.perf_counter() - started
+        succeeded = sum(1 for item in items if item["status"] == "succeeded")
+        skipped = sum(1 for item in items if item["status"] == "skipped")
+        failed = total - succeeded - skipped
+        result = {
+            "success": failed == 0,
+            "total": total,
+            "succeeded": succeeded,
+            "skipped": skipped,
+            "failed": failed,
+            "elapsed_s": round(elapsed, 2),
+            "pages_per_minute": round(succeeded / elapsed * 60, 2) if elapsed > 0 else None,
+            "pages": sorted(items, key=lambda item: item.get("page_number", 0)),
+            "name_matches": {
+                kind: [resolved["match"] for resolved in reference_set[kind].values()]
+                for kind in ("characters", "scenes")
+            },
+            "message": f"{'✅' if failed == 0 else '⚠️'} 生成 {succeeded}/{total} 页"
+                       + (f"，{skipped} 页输入未变化已跳过" if skipped else ""),
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    async def _run_job_tool(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """在后台任务中执行生成工具，返回结果字典"""
+        handlers = {
+            "generate_comic_page": self._generate_comic_page,
+            "generate_comic_pages": self._generate_comic_pages,
+            "rebuild_stale_pages": self._rebuild_stale_pages,
+            "generate_character_reference": self._generate_character_reference,
+            "generate_scene_reference": self._generate_scene_reference,
+            "generate_references_batch": self._generate_references_batch,
+        }
+        contents = await handlers[tool](**arguments)
+        return json.loads(contents[0].text)
+
+    async def _submit_job(self, tool: str, arguments: Optional[Dict[str, Any]] = None) -> list[TextContent]:
+        """提交后台任务"""
+        if tool not in JOB_TOOLS:
+            raise ValueError(f"不支持作为后台任务的工具: {tool}（可选: {', '.join(JOB_TOOLS)}）")
+        job = self.job_queue.submit(tool, arguments or {})
+
+        result = {
+            "job_id": job.job_id,
+            "status": job.status,
+            "message": "任务已提交，使用 get_job_status 或 wait_for_jobs 查询结果",
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    def _job_summaries(self, job_ids: Optional[List[str]]) -> Dict[str, Any]:
+        if job_ids is None:
+            return {"jobs": [job.summary() for job in self.job_queue.jobs.values()], "unknown_job_ids": []}
+        jobs = [self.job_queue.get(job_id) for job_id in job_ids]
+        return {
+            "jobs": [job.summary() for job in jobs if job is not None],
+            "unknown_job_ids": [job_id for job_id, job in zip(job_ids, jobs) if job is None],
+        }
+
+    async def _get_job_status(self, job_ids: Optional[List[str]] = None) -> list[TextContent]:
+        """查询后台任务状态"""
+        result = self._job_summaries(job_ids)
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    async def _wait_for_jobs(self, job_ids: List[str], timeout: Optional[float] = None) -> list[TextContent]:
+        """等待后台任务结束"""
+        timeout = min(timeout or self.max_job_wait, self.max_job_wait)
+        all_finished = await self.job_queue.wait(job_ids, timeout)
+        result = {"all_finished": all_finished, **self._job_summaries(job_ids)}
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    async def _cancel_job(self, job_id: str) -> list[TextContent]:
+        """取消后台任务"""
+        cancelled = self.job_queue.cancel(job_id)
+        if cancelled:
+            # 执行中的任务在下一个等待点结束
+            await self.job_queue.wait([job_id], 5.0)
+        job = self.job_queue.get(job_id)
+        result = {
+            "job_id": job_id,
+            "cancelled": cancelled,
+            "status": job.status if job else None,
+            "message": "已取消" if cancelled else "任务不存在或已结束",
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
     async def _list_characters(self) -> list[TextContent]:
         """列出所有人物"""
         characters = self.character_manager.list_characters()
@@ -465,7 +1509,7 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
                 "name": c.name,
                 "description": c.description,
                 "visual_features": c.visual_features.model_dump(),
-                "usage_count": c.metadata.usage_count,
+                **self.character_manager.usage.get(c.character_id),
                 "reference_image": c.reference_image.path
             }
             for c in characters
@@ -486,7 +1530,7 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
                 "name": s.name,
                 "description": s.description,
                 "tags": s.tags,
-                "usage_count": s.metadata.usage_count,
+                **self.scene_manager.usage.get(s.scene_id),
                 "reference_image": s.reference_image.path
             }
             for s in scenes
@@ -497,6 +1541,259 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
             text=json.dumps(result, ensure_ascii=False, indent=2)
         )]
 
+    async def _get_page_previews(self, start_page: int, end_page: Optional[int] = None) -> list[TextContent]:
+        """从页面索引中读取预览图信息"""
+        end_page = start_page if end_page is None else end_page
+        entries = self.page_writer.index.get_range(start_page, end_page)
+        found = {entry["page_number"] for entry in entries}
+
+        result = {
+            "pages": [
+                {
+                    "page_number": entry["page_number"],
+                    "thumbnail": entry.get("thumbnail"),
+                    "preview": entry.get("preview"),
+                    "master": entry.get("master"),
+                    "updated_at": entry.get("updated_at"),
+                }
+                for entry in entries
+            ],
+            "missing_pages": [n for n in range(start_page, end_page + 1) if n not in found],
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    def _chapter_pages(
+        self,
+        json_paths,
+        image_size: Optional[str] = None,
+        aspect_ratio: Optional[str] = None,
+        style: Optional[str] = None,
+        style_reference_image: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        根据生成日志和当前输入判断每页的状态（依赖关系：页面 JSON、参考图、风格参考图和生成参数）
+
+        未指定的参数沿用该页上次生成时的参数，从未生成过的页面使用默认参数
+
+        Returns:
+            每页 {"json_path", "page_number", "status", "params", "reasons", ...}，
+            status 为 done / stale / missing_output / failed / interrupted / running / pending / invalid
+        """
+        if isinstance(json_paths, str):
+            json_paths = [json_paths]
+
+        items = []
+        pages = []
+        for json_file in self._expand_json_paths(json_paths):
+            item = {"json_path": str(json_file)}
+            try:
+                page = self._load_page_file(json_file)
+                item["page_number"] = page.page_number
+                recorded = (self.job_journal.pages.get(page.page_number) or {}).get("inputs") or {}
+                item["params"] = {
+                    "image_size": image_size or recorded.get("image_size", "4K"),
+                    "aspect_ratio": aspect_ratio or recorded.get("aspect_ratio", "3:4"),
+                    "style": style or recorded.get("style", "彩漫风格"),
+                    "style_reference_image": style_reference_image or recorded.get("style_reference_path"),
+                }
+                pages.append((page, item))
+            except Exception as e:
+                item.update(status="invalid", error=str(e))
+            items.append(item)
+
+        # 每个风格参考图只解析一次参考图（通常整章只有一个）
+        reference_sets: Dict[Optional[str], Dict[str, Any]] = {}
+        character_names, scene_names = set(), set()
+        for page, _ in pages:
+            page_characters, page_scenes = self._page_names(page)
+            character_names |= page_characters
+            scene_names |= page_scenes
+
+        for page, item in pages:
+            params = item["params"]
+            style_path = params["style_reference_image"]
+            if style_path not in reference_sets:
+                reference_sets[style_path] = self._build_reference_set(
+                    character_names, scene_names, style_path, load_images=False
+                )
+            inputs = self._page_inputs(
+                page, params["image_size"], params["aspect_ratio"], params["style"], reference_sets[style_path]
+            )
+            page_hash = input_hash(inputs)
+            record = self.job_journal.pages.get(page.page_number)
+            if reference_sets[style_path]["style_error"]:
+                # 上次用过的风格参考图已被删除：需要换一张（或不用）重新生成
+                status = "stale"
+                item["reasons"] = ["风格参考图不存在"]
+            elif record is None:
+                status = "pending"
+            elif self.job_journal.completed_page(page.page_number, page_hash):
+                status = "done"
+                item["image_path"] = record["image_path"]
+            elif record["input_hash"] != page_hash:
+                # 页面内容、参数或参考图在上次生成后有变化
+                status = "stale"
+                item["reasons"] = diff_inputs(record.get("inputs"), inputs)
+            elif record["state"] == PAGE_DONE:
+                status = "missing_output"
+            elif record["state"] == PAGE_RUNNING:
+                status = "running" if page.page_number in self._pages_in_flight else "interrupted"
+            else:
+                status = "failed"
+                item["error"] = record.get("error")
+            item["status"] = status
+            if record is not None:
+                item["last_update"] = record["time"]
+
+        return sorted(items, key=lambda item: item.get("page_number", 0))
+
+    @staticmethod
+    def _count_statuses(items: List[Dict[str, Any]]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for item in items:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        return counts
+
+    async def _get_chapter_status(
+        self,
+        json_paths,
+        image_size: Optional[str] = None,
+        aspect_ratio: Optional[str] = None,
+        style: Optional[str] = None,
+        style_reference_image: Optional[str] = None
+    ) -> list[TextContent]:
+        """查询一章页面的生成进度"""
+        items = self._chapter_pages(json_paths, image_size, aspect_ratio, style, style_reference_image)
+        counts = self._count_statuses(items)
+        result = {
+            "total": len(items),
+            "complete": counts.get("done", 0) == len(items),
+            "counts": counts,
+            "pages": items,
+            "message": f"已完成 {counts.get('done', 0)}/{len(items)} 页",
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    async def _rebuild_stale_pages(
+        self,
+        json_paths,
+        image_size: Optional[str] = None,
+        aspect_ratio: Optional[str] = None,
+        style: Optional[str] = None,
+        style_reference_image: Optional[str] = None,
+        dry_run: bool = False,
+        timeout: Optional[float] = None,
+        max_parallel: Optional[int] = None
+    ) -> list[TextContent]:
+        """只重新生成依赖项有变化、失败、中断或从未生成的页面（类似 make）"""
+        items = self._chapter_pages(json_paths, image_size, aspect_ratio, style, style_reference_image)
+        targets = [item for item in items if item["status"] in REBUILD_STATES]
+        plan = [
+            {key: item[key] for key in ("page_number", "json_path", "status", "params", "reasons") if key in item}
+            for item in targets
+        ]
+        result = {
+            "total": len(items),
+            "up_to_date": sum(1 for item in items if item["status"] == "done"),
+            "to_rebuild": len(targets),
+            "plan": plan,
+        }
+
+        if dry_run or not targets:
+            result["message"] = (
+                f"{len(targets)} 页需要重新生成（未执行）" if targets else "✅ 所有页面都是最新的，无需重新生成"
+            )
+            return [TextContent(
+                type="text",
+                text=json.dumps(result, ensure_ascii=False, indent=2)
+            )]
+
+        # 参数相同的页面一起批量生成（通常整章一组）
+        groups: Dict[tuple, List[str]] = {}
+        for item in targets:
+            params = item["params"]
+            key = (params["image_size"], params["aspect_ratio"], params["style"], params["style_reference_image"])
+            groups.setdefault(key, []).append(item["json_path"])
+
+        pages = []
+        for (group_size, group_ratio, group_style, group_style_image), paths in groups.items():
+            logger.info(f"🔨 重新生成 {len(paths)} 页（{group_size}，{group_ratio}，{group_style}）")
+            batch = await self._generate_comic_pages(
+                paths,
+                image_size=group_size,
+                aspect_ratio=group_ratio,
+                style=group_style,
+                style_reference_image=group_style_image,
+                timeout=timeout,
+                max_parallel=max_parallel
+            )
+            pages.extend(json.loads(batch[0].text)["pages"])
+
+        rebuilt = sum(1 for page in pages if page["status"] == "succeeded")
+        failed = sum(1 for page in pages if page["status"] == "failed")
+        result.update(
+            success=failed == 0,
+            rebuilt=rebuilt,
+            failed=failed,
+            pages=sorted(pages, key=lambda page: page.get("page_number", 0)),
+            message=f"{'✅' if failed == 0 else '⚠️'} 重新生成 {rebuilt}/{len(targets)} 页，{result['up_to_date']} 页无需重新生成",
+        )
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    async def _import_reference_library(
+        self,
+        source_path: Optional[str] = None,
+        overwrite: bool = False
+    ) -> list[TextContent]:
+        """导入 JSON 人物/场景库"""
+        source = Path(source_path) if source_path else self.ref_path
+        result = {
+            "backend": self.character_manager.store.backend,
+            "characters": self.character_manager.import_json_library(source / "characters", overwrite=overwrite),
+            "scenes": self.scene_manager.import_json_library(source / "scenes", overwrite=overwrite),
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
+    async def _get_service_stats(self) -> list[TextContent]:
+        """服务运行统计"""
+        result = {
+            "http": self.gemini_client.get_http_stats(),
+            "cache": self.gemini_client.get_cache_stats(),
+            "resilience": self.gemini_client.get_resilience_stats(),
+            "limiter": self.gemini_client.get_limiter_stats(),
+            "endpoints": self.gemini_client.get_endpoint_stats(),
+            "workers": self.gemini_client.get_worker_stats(),
+            "usage": {
+                "characters": self.character_manager.usage.stats(),
+                "scenes": self.scene_manager.usage.stats(),
+            },
+            "hot_reload": self.reference_watcher.stats() if self.reference_watcher else None,
+            "jobs": self.job_queue.stats(),
+            "journal": self.job_journal.stats(),
+            **self.gemini_client.get_latency_stats(),
+        }
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, indent=2)
+        )]
+
     def _fix_and_parse_json(self, page_json: str) -> dict:
         """尝试修复并解析 JSON，返回解析后的数据"""
         import re
@@ -525,48 +1822,185 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
             # 所有修复尝试失败，抛出原始错误
             raise ValueError(f"JSON 格式错误且无法自动修复: {error_msg}")
 
-    async def _generate_comic_page_logic(
-        self,
-        page: Page,
-        image_size: str,
-        aspect_ratio: str,
-        style: str,
-        style_reference_image: Optional[str] = None
-    ) -> list[TextContent]:
-        """生成漫画页面的核心逻辑（被 generate_comic_page 和 regenerate_page 共享）"""
-        # 收集所有角色和场景
-        all_character_names = set()
-        all_scene_names = set()
-
+    @staticmethod
+    def _page_names(page: Page):
+        """页面中出现的角色名和场景名"""
+        character_names = set()
+        scene_names = set()
         for panel in page.panels:
             for char in panel.characters:
-                all_character_names.add(char.name)
+                character_names.add(char.name)
             if panel.background:
-                all_scene_names.add(panel.background)
-
-        # 收集已有的角色参考图（不自动创建）
-        character_refs = []
-        for char_name in all_character_names:
-            char = self.character_manager.get_character_by_name(char_name)
-            if char:
-                character_refs.append(char.reference_image.base64)
-            else:
-                logger.info(f"ℹ️  角色 '{char_name}' 没有参考图，跳过（不自动生成）")
-
-        # 收集已有的场景参考图（不自动创建）
-        scene_refs = []
-        for scene_name in all_scene_names:
-            scene = self.scene_manager.get_scene_by_name(scene_name)
-            if scene:
-                scene_refs.append(scene.reference_image.base64)
-            else:
-                logger.info(f"ℹ️  场景 '{scene_name}' 没有参考图，跳过（不自动生成）")
+                scene_names.add(panel.background)
+        return character_names, scene_names
+
+    def _build_reference_set(
+        self,
+        character_names,
+        scene_names,
+        style_reference_image: Optional[str] = None,
+        load_images: bool = True
+    ) -> Dict[str, Any]:
+        """
+        解析名称对应的参考图（不自动创建），一批页面共用一份，每个参考图只匹配和读取一次
+
+        Args:
+            load_images: 是否读取图片（只计算输入哈希时不需要）
+
+        Returns:
+            {"characters": {名称: {"id", "sha256", "match", "image"}}, "scenes": {...},
+             "style": [风格参考图], "style_path": 风格参考图路径, "style_sha256": 风格参考图文件的 sha256,
+             "style_error": 风格参考图不存在时的说明}
+        """
+        reference_set = {
+            "characters": {}, "scenes": {}, "style": [], "style_path": None, "style_sha256": None, "style_error": None
+        }
+        for kind, label, names, match_fn, closest_fn in (
+            ("characters", "角色", character_names, self.character_manager.match_character,
+             self.character_manager.closest_character),
+            ("scenes", "场景", scene_names, self.scene_manager.match_scene, self.scene_manager.closest_scene),
+        ):
+            for name in sorted(names):
+                matched = match_fn(name)
+                if matched:
+                    obj, match = matched
+                    reference_set[kind][name] = {
+                        "id": match["id"],
+                        # 旧版数据没有 sha256 时用路径代替
+                        "sha256": obj.reference_image.sha256 or obj.reference_image.path,
+                        "match": {"name": name, **match},
+                        "image": obj.reference_image.load_base64() if load_images else None,
+                    }
+                    if match["method"] != "exact":
+                        logger.info(f"{label} '{name}' 匹配到 '{match['matched']}'（{match['method']}，{match['score']}）")
+                else:
+                    match = {"name": name, "id": None}
+                    candidate = closest_fn(name)
+                    if candidate:
+                        # 相近但不可靠的名称只提示，不使用其参考图
+                        match["candidate"] = candidate
+                        logger.warning(
+                            f"⚠️  {label} '{name}' 没有可靠匹配，最接近的是 '{candidate['matched']}'"
+                            f"（{candidate['method']}，{candidate['score']}），未使用其参考图"
+                        )
+                    else:
+                        logger.info(f"ℹ️  {label} '{name}' 没有参考图，跳过（不自动生成）")
+                    reference_set[kind][name] = {"id": None, "sha256": None, "match": match, "image": None}
 
         # 处理风格参考图
-        style_refs = []
         if style_reference_image:
+            reference_set["style_path"] = style_reference_image
+            if not Path(style_reference_image).is_file():
+                # 不在这里抛出：状态查询把用到它的页面标为过期，生成时这些页面逐页失败
+                reference_set["style_error"] = f"风格参考图不存在: {style_reference_image}"
+                logger.warning(f"⚠️  {reference_set['style_error']}")
+                return reference_set
             logger.info(f"🎨 使用风格参考图: {style_reference_image}")
-            style_refs.append(self.gemini_client._load_image_as_base64(style_reference_image))
+            reference_set["style_sha256"] = hashlib.sha256(Path(style_reference_image).read_bytes()).hexdigest()
+            if load_images:
+                reference_set["style"].append(self.gemini_client._load_image_as_base64(style_reference_image))
+        return reference_set
+
+    def _page_inputs(
+        self,
+        page: Page,
+        image_size: str,
+        aspect_ratio: str,
+        style: str,
+        reference_set: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """页面的输入（依赖项）：页面内容、生成参数和用到的参考图，任一变化都需要重新生成"""
+        character_names, scene_names = self._page_names(page)
+        inputs = {
+            "page": hashlib.sha256(
+                json.dumps(page.model_dump(mode="json"), ensure_ascii=False, sort_keys=True).encode("utf-8")
+            ).hexdigest(),
+            "image_size": image_size,
+            "aspect_ratio": aspect_ratio,
+            "style": style,
+            "style_reference": reference_set["style_sha256"],
+            # 只用于按上次的参数重新生成，不参与哈希（文件内容由 style_reference 判断）
+            "style_reference_path": reference_set["style_path"],
+            "characters": {},
+            "scenes": {},
+            "missing_references": [],
+        }
+        for kind, names in (("characters", character_names), ("scenes", scene_names)):
+            for name in names:
+                resolved = reference_set[kind][name]
+                if resolved["id"] is not None:
+                    inputs[kind][resolved["id"]] = resolved["sha256"]
+                else:
+                    inputs["missing_references"].append(name)
+        inputs["missing_references"].sort()
+        return inputs
+
+    async def _render_page(
+        self,
+        page: Page,
+        image_size: str,
+        aspect_ratio: str,
+        style: str,
+        reference_set: Dict[str, Any],
+        use_cache: bool = True,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """生成一页并保存，返回结果字典（输入未变化且已生成过的页面直接返回日志中的结果）"""
+        if reference_set["style_error"]:
+            raise FileNotFoundError(reference_set["style_error"])
+        inputs = self._page_inputs(page, image_size, aspect_ratio, style, reference_set)
+        page_hash = input_hash(inputs)
+        if use_cache:
+            completed = self.job_journal.completed_page(page.page_number, page_hash)
+            if completed:
+                logger.info(f"⏭️  第 {page.page_number} 页输入未变化，跳过")
+                return {
+                    **completed["result"],
+                    "skipped": True,
+                    "message": f"⏭️ 第 {page.page_number} 页输入未变化，已跳过（使用上次生成的图片）",
+                }
+
+        self._pages_in_flight[page.page_number] += 1
+        self.job_journal.page_started(page.page_number, page_hash, inputs)
+        try:
+            result = await self._render_page_uncached(page, image_size, aspect_ratio, style, reference_set, use_cache, timeout)
+        except Exception as e:
+            # 被取消（服务关闭）时日志中保持执行中，状态查询显示为中断
+            self.job_journal.page_failed(page.page_number, page_hash, str(e), inputs)
+            await self.job_journal.sync()
+            raise
+        finally:
+            self._pages_in_flight[page.page_number] -= 1
+            if not self._pages_in_flight[page.page_number]:
+                del self._pages_in_flight[page.page_number]
+        self.job_journal.page_done(page.page_number, page_hash, result, inputs)
+        await self.job_journal.sync()
+        return result
+
+    async def _render_page_uncached(
+        self,
+        page: Page,
+        image_size: str,
+        aspect_ratio: str,
+        style: str,
+        reference_set: Dict[str, Any],
+        use_cache: bool = True,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """调用 API 生成一页并保存"""
+        all_character_names, all_scene_names = self._page_names(page)
+
+        # 同一角色/场景的多个写法只取一次参考图
+        refs = {"characters": [], "scenes": []}
+        matches = {"characters": [], "scenes": []}
+        used_ids = {"characters": set(), "scenes": set()}
+        for kind, names in (("characters", all_character_names), ("scenes", all_scene_names)):
+            for name in sorted(names):
+                resolved = reference_set[kind][name]
+                matches[kind].append(resolved["match"])
+                if resolved["id"] is not None and resolved["id"] not in used_ids[kind]:
+                    used_ids[kind].add(resolved["id"])
+                    refs[kind].append(resolved["image"])
 
         # 生成图片（所有分镜合并为一张图）
         all_descriptions = []
@@ -593,58 +2027,121 @@ JSON 文件示例：{"page_number": 1, "panels": [{"panel_number": 1, "descripti
 
         # 调用 Gemini API 生成图片
         logger.info(f"🎨 调用 Gemini API 生成图片...")
-        all_refs = character_refs + scene_refs + style_refs
+        all_refs = refs["characters"] + refs["scenes"] + reference_set["style"]
 
-        image_base64 = await self.gemini_client.generate_with_references(
-            prompt=full_description,
-            image_refs=all_refs if all_refs else None,
-            image_size=image_size,
-            aspect_ratio=aspect_ratio
-        )
+        # 响应流式解码后直接写入临时文件，拿到实际 MIME 类型后保存为母版并生成交付版本
+        # （每次生成一个临时文件，同一页的重叠任务互不覆盖）
+        output_path = self.page_writer.download_path(page.page_number)
+        try:
+            image = await self.gemini_client.generate_image(
+                prompt=full_description,
+                image_refs=all_refs if all_refs else None,
+                image_size=image_size,
+                aspect_ratio=aspect_ratio,
+                output_path=output_path,
+                use_cache=use_cache,
+                timeout=timeout
+            )
+            output = await self.page_writer.write(page.page_number, image)
+        finally:
+            # 保存成功时临时文件已移为母版；失败或取消时删除
+            output_path.unlink(missing_ok=True)
+        logger.info(f"图片已保存: {output['image_path']}")
 
-        # 保存图片（漫画页面不压缩）
-        output_dir = Path(self.config.get("storage", {}).get("output_images_path", "./output/pages"))
-        output_path = output_dir / f"page_{page.page_number:03d}.jpg"
-        self.gemini_client.save_base64_image(image_base64, output_path, compress=False)
+        # 使用统计只在内存中累加，定期批量写入
+        self.character_manager.usage.record(used_ids["characters"])
+        self.scene_manager.usage.record(used_ids["scenes"])
 
-        result = {
+        return {
             "success": True,
             "page_number": page.page_number,
             "panels_count": len(page.panels),
-            "image_path": str(output_path),
+            "image_path": output["image_path"],
+            "output": output,
             "characters_used": list(all_character_names),
             "scenes_used": list(all_scene_names),
+            "name_matches": matches,
+            "cache_hit": image.cache_hit,
+            "attempts": image.attempts,
+            "queue_wait_s": image.queue_wait_s,
+            "endpoint": image.endpoint,
+            "latency_s": image.latency_s,
+            "timeouts": image.timeouts,
+            "http_timings": image.http_timings,
             "message": f"✅ 第 {page.page_number} 页漫画已生成！"
         }
 
+    async def _generate_comic_page_logic(
+        self,
+        page: Page,
+        image_size: str,
+        aspect_ratio: str,
+        style: str,
+        style_reference_image: Optional[str] = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None
+    ) -> list[TextContent]:
+        """生成漫画页面的核心逻辑（被 generate_comic_page 和 regenerate_page 共享）"""
+        character_names, scene_names = self._page_names(page)
+        reference_set = self._build_reference_set(character_names, scene_names, style_reference_image)
+        result = await self._render_page(
+            page, image_size, aspect_ratio, style, reference_set, use_cache=use_cache, timeout=timeout
+        )
+
         return [TextContent(
             type="text",
             text=json.dumps(result, ensure_ascii=False, indent=2)
         )]
 
 
-async def main():
-    """启动 MCP 服务器"""
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """命令行参数（覆盖配置中的 transport 部分）"""
+    parser = argparse.ArgumentParser(description="漫画服务 MCP 服务器")
+    parser.add_argument("--transport", choices=["stdio", "http"], help="传输方式（默认读取配置 transport.type）")
+    parser.add_argument("--host", help="HTTP 监听地址")
+    parser.add_argument("--port", type=int, help="HTTP 监听端口")
+    return parser.parse_args(argv)
+
+
+async def main(transport: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None):
+    """
+    启动 MCP 服务器
+
+    Args:
+        transport: "stdio"（每个客户端启动一个进程）或 "http"（一个进程服务多个客户端），默认读取配置
+        host: HTTP 监听地址（覆盖配置）
+        port: HTTP 监听端口（覆盖配置）
+    """
     server_instance = ComicMCPServer()
+    transport_config = dict(server_instance.config.get("transport", {}))
+    transport = transport or transport_config.get("type", "stdio")
+
+    if transport == "http":
+        from .http_transport import serve_http
+
+        if host:
+            transport_config["host"] = host
+        if port:
+            transport_config["port"] = port
+        # 启动和关闭在 ASGI 应用的生命周期中进行
+        await serve_http(server_instance, transport_config)
+        return
 
     # 启动服务器
     from mcp.server.stdio import stdio_server
 
-    async with stdio_server() as (read_stream, write_stream):
-        await server_instance.server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="comic-service",
-                server_version="0.2.0",
-                capabilities=server_instance.server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={}
-                )
+    await server_instance.startup()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server_instance.server.run(
+                read_stream,
+                write_stream,
+                server_instance.initialization_options()
             )
-        )
+    finally:
+        await server_instance.shutdown()
 
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    args = parse_args()
+    asyncio.run(main(args.transport, args.host, args.port))
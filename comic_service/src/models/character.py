@@ -3,11 +3,15 @@
 定义漫画角色的数据结构和参考图管理
 """
 
+import base64
+import hashlib
 from datetime import datetime
 from typing import Optional, Dict, Any
 from pydantic import BaseModel, Field
 from pathlib import Path
 
+from .generation import GeneratedImage
+
 
 class VisualFeatures(BaseModel):
     """人物视觉特征"""
@@ -20,35 +24,93 @@ class VisualFeatures(BaseModel):
     body_type: Optional[str] = Field(None, description="体型")
 
 
+_MIME_BY_SUFFIX = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+
 class ReferenceImage(BaseModel):
-    """参考图数据"""
-    base64: str = Field(description="base64 编码的图片数据")
+    """
+    参考图数据
+
+    JSON 中只保存图片路径和内容哈希，图片字节在首次使用时从文件读取并缓存在内存中。
+    旧版 JSON 内嵌的 base64 仍可读取，由 externalize() 迁移为外部文件
+    """
     path: str = Field(description="图片存储路径")
+    sha256: Optional[str] = Field(None, description="图片文件的 sha256（旧版数据迁移前为空）")
     generated_at: datetime = Field(default_factory=datetime.now, description="生成时间")
     model_used: str = Field(description="使用的模型")
+    base64: Optional[str] = Field(
+        None, exclude=True, repr=False,
+        description="base64 编码的图片数据（data URL，内存缓存，不写入 JSON）"
+    )
+    generation: Optional[GeneratedImage] = Field(
+        None, exclude=True, repr=False,
+        description="本次生成的请求信息（尝试次数、超时、分阶段耗时等，只在生成后的内存对象中，不写入 JSON）"
+    )
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """计算图片内容哈希"""
+        return hashlib.sha256(data).hexdigest()
+
+    @property
+    def needs_migration(self) -> bool:
+        """是否为内嵌 base64 的旧版数据"""
+        return self.sha256 is None
+
+    def load_base64(self) -> str:
+        """
+        获取 base64 图片（data URL），首次调用时从文件读取
+
+        Returns:
+            带 data URL 前缀的 base64 图片
+        """
+        if self.base64 is None:
+            path = Path(self.path)
+            data = path.read_bytes()
+            if self.sha256 and self.hash_bytes(data) != self.sha256:
+                from loguru import logger
+                logger.warning(f"参考图内容与记录的哈希不一致（文件可能被替换）: {path}")
+            mime_type = _MIME_BY_SUFFIX.get(path.suffix.lower(), "image/jpeg")
+            self.base64 = f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+        return self.base64
+
+    def unload(self):
+        """释放内存中的图片数据（下次使用时重新从文件读取）"""
+        if not self.needs_migration:
+            self.base64 = None
+
+    def externalize(self):
+        """
+        迁移旧版数据：图片文件不存在时从内嵌的 base64 写出，并记录内容哈希
+        """
+        path = Path(self.path)
+        if not path.exists():
+            if self.base64 is None:
+                raise FileNotFoundError(f"参考图文件不存在且没有内嵌数据: {path}")
+            encoded = self.base64.split(",", 1)[1] if self.base64.startswith("data:") else self.base64
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(base64.b64decode(encoded))
+        self.sha256 = self.hash_bytes(path.read_bytes())
+        # 以文件内容为准，内存缓存在下次使用时重新读取
+        self.base64 = None
 
 
 class CharacterMetadata(BaseModel):
     """人物元数据"""
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
-    usage_count: int = Field(default=0, description="使用次数")
 
 
 class Character(BaseModel):
     """漫画角色模型"""
     character_id: str = Field(description="角色唯一标识，如 char_liubei")
     name: str = Field(description="角色名称")
+    aliases: list[str] = Field(default_factory=list, description="别名（昵称、称呼等），用于页面中的名称匹配")
     description: str = Field(description="角色描述")
     reference_image: ReferenceImage = Field(description="参考图")
     visual_features: VisualFeatures = Field(description="视觉特征")
     metadata: CharacterMetadata = Field(default_factory=CharacterMetadata)
 
-    def update_usage(self):
-        """更新使用次数"""
-        self.metadata.usage_count += 1
-        self.metadata.updated_at = datetime.now()
-
     def save_to_file(self, directory: Path):
         """保存角色数据到文件"""
         import json
@@ -82,16 +144,12 @@ class Scene(BaseModel):
     """场景模型"""
     scene_id: str = Field(description="场景唯一标识，如 scene_street")
     name: str = Field(description="场景名称")
+    aliases: list[str] = Field(default_factory=list, description="别名（简称、其他写法等），用于页面中的名称匹配")
     description: str = Field(description="场景描述")
     reference_image: ReferenceImage = Field(description="参考图")
     tags: list[str] = Field(default_factory=list, description="场景标签")
     metadata: CharacterMetadata = Field(default_factory=CharacterMetadata)
 
-    def update_usage(self):
-        """更新使用次数"""
-        self.metadata.usage_count += 1
-        self.metadata.updated_at = datetime.now()
-
     def save_to_file(self, directory: Path):
         """保存场景数据到文件"""
         import json
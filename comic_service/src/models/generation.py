@@ -0,0 +1,35 @@
+"""
+图片生成结果模型
+"""
+
+import base64
+from pathlib import Path
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+
+class GeneratedImage(BaseModel):
+    """一次图片生成的结果（图片字节在内存中，或已直接写入文件）"""
+    mime_type: str = Field(description="图片 MIME 类型")
+    size_bytes: int = Field(description="图片字节数")
+    path: Optional[str] = Field(None, description="已写入的文件路径（流式写文件时）")
+    data: Optional[bytes] = Field(None, exclude=True, repr=False, description="图片字节（写入内存时）")
+    cache_hit: bool = Field(False, description="是否命中生成缓存")
+    attempts: int = Field(1, description="请求尝试次数（含重试）")
+    queue_wait_s: float = Field(0.0, description="在客户端限流队列中的等待时间（秒）")
+    endpoint: Optional[str] = Field(None, description="最终成功的 API 端点名称")
+    latency_s: Optional[float] = Field(None, description="成功请求的耗时（秒，不含排队）")
+    timeouts: Optional[Dict[str, Any]] = Field(None, description="本次请求使用的超时及其来源")
+    http_timings: Optional[Dict[str, Any]] = Field(None, description="成功请求的分阶段耗时（命中缓存时为空）")
+
+    def read_bytes(self) -> bytes:
+        """获取图片字节"""
+        if self.data is not None:
+            return self.data
+        if self.path:
+            return Path(self.path).read_bytes()
+        raise ValueError("生成结果中没有图片数据")
+
+    def to_data_url(self) -> str:
+        """转换为 data URL（兼容原有的 base64 接口）"""
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.read_bytes()).decode('utf-8')}"
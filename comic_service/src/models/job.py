@@ -0,0 +1,43 @@
+"""
+后台任务模型
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = {DONE, FAILED, CANCELLED}
+
+
+class Job(BaseModel):
+    """一个后台生成任务"""
+    job_id: str = Field(description="任务 ID")
+    tool: str = Field(description="执行的工具名，如 generate_comic_page")
+    arguments: Dict[str, Any] = Field(default_factory=dict, description="工具参数")
+    status: str = Field(QUEUED, description="queued / running / done / failed / cancelled")
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = Field(None, description="工具返回的结果（完成时）")
+    error: Optional[str] = Field(None, description="错误信息（失败时）")
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def summary(self) -> Dict[str, Any]:
+        """状态摘要（包含结果中的图片路径）"""
+        data = self.model_dump(mode="json", exclude={"result"})
+        if self.started_at:
+            end = self.finished_at or datetime.now()
+            data["elapsed_s"] = round((end - self.started_at).total_seconds(), 2)
+        if self.result is not None:
+            data["result"] = self.result
+        return data
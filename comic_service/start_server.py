@@ -21,7 +21,9 @@ load_dotenv()
 
 async def main():
     """启动 MCP 服务器"""
-    from src.mcp_server import main as server_main
+    from src.mcp_server import main as server_main, parse_args
+
+    args = parse_args()
 
     # 检查 API Key
     api_key = os.getenv("GEMINI_API_KEY")
@@ -36,7 +38,7 @@ async def main():
     print(f"API Key: {api_key[:10]}...")
     print("\nServer started, waiting for connection...\n")
 
-    await server_main()
+    await server_main(args.transport, args.host, args.port)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+Gemini 客户端测试（httpx.MockTransport 模拟 API，不访问网络）
+"""
+
+import asyncio
+import base64
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.endpoints import ApiEndpoint
+from src.image_gen.gemini_client import GeminiImageGenerator
+from src.image_gen.latency import latency_key
+from src.image_gen.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def _response(data: bytes, mime_type: str = "image/png") -> httpx.Response:
+    body = {"candidates": [{"content": {"parts": [
+        {"text": "说明"},
+        {"inlineData": {"mimeType": mime_type, "data": base64.b64encode(data).decode()}},
+    ]}}]}
+    return httpx.Response(200, content=json.dumps(body).encode())
+
+
+def _generator(handler, **kwargs) -> GeminiImageGenerator:
+    """使用模拟传输的生成器（共享客户端提前替换为 MockTransport）"""
+    generator = GeminiImageGenerator(api_key="test", base_url="http://api.test", **kwargs)
+    generator._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return generator
+
+
+def test_shared_pool_and_per_request_timings():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)["contents"][0]["parts"][0]["text"]
+        # 先发出的请求后完成，两个请求的耗时交错
+        await asyncio.sleep(0.2 if prompt == "slow" else 0.01)
+        return _response(prompt.encode() * (1000 if prompt == "slow" else 10))
+
+    async def run():
+        generator = _generator(handler)
+        client = generator._client
+        await generator.start()
+        assert generator._client is client
+
+        slow, fast = await asyncio.gather(
+            generator.generate_image("slow", image_size="1K"),
+            generator.generate_image("fast", image_size="1K"),
+        )
+        assert generator._client is client
+        stats = generator.get_http_stats()
+        await generator.aclose()
+        assert generator._client is None
+        return slow, fast, stats
+
+    slow, fast, stats = asyncio.run(run())
+    assert slow.read_bytes() == b"slow" * 1000 and fast.read_bytes() == b"fast" * 10
+    # 每个结果带自己的耗时，不会读到并发的另一个请求的耗时
+    assert slow.http_timings["total_ms"] >= 200 > fast.http_timings["total_ms"]
+    # last_timings 只是最近完成的请求，用于统计
+    assert stats["requests"] == 2
+    assert stats["last_request"]["total_ms"] == slow.http_timings["total_ms"]
+
+
+def test_generate_with_references_in_memory_and_to_file(tmp_path):
+    png = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return _response(png)
+
+    async def run(stream_responses: bool):
+        generator = _generator(handler, stream_responses=stream_responses)
+        # 内存路径（参考图生成）：返回 data URL，参考图作为 inline_data 发送
+        data_url = await generator.generate_with_references(
+            "人物", image_refs=["data:image/jpeg;base64,QUJD"], image_size="1K"
+        )
+        # 文件路径（页面生成）：直接写入输出文件，不留临时文件
+        output_path = tmp_path / f"stream_{stream_responses}" / "page_001.png"
+        image = await generator.generate_image("页面", image_size="1K", output_path=output_path)
+        await generator.aclose()
+        return data_url, image, output_path
+
+    for stream_responses in (True, False):
+        data_url, image, output_path = asyncio.run(run(stream_responses))
+        assert data_url == "data:image/png;base64," + base64.b64encode(png).decode()
+        assert image.path == str(output_path) and image.data is None
+        assert output_path.read_bytes() == png
+        assert list(output_path.parent.glob("*.part")) == []
+
+    assert requests[0]["contents"][0]["parts"][1] == {"inline_data": {"mime_type": "image/jpeg", "data": "QUJD"}}
+
+
+class _RecordingPolicy(RetryPolicy):
+    """记录退避时间的重试策略"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = []
+
+    def backoff(self, attempt, error):
+        delay = super().backoff(attempt, error)
+        self.delays.append(delay)
+        return delay
+
+
+def _endpoints(*names, **kwargs):
+    return [ApiEndpoint(base_url=f"http://{name}.test", api_key="test", name=name, **kwargs) for name in names]
+
+
+def test_server_error_fails_over_to_other_endpoint():
+    hosts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        if request.url.host == "a.test":
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return _response(b"png")
+
+    policy = _RecordingPolicy()
+    generator = _generator(handler, endpoints=_endpoints("a", "b"), retry_policy=policy)
+    image = asyncio.run(generator.generate_image("页面", image_size="1K"))
+
+    # 503 后立即切换到另一个端点，不退避
+    assert hosts == ["a.test", "b.test"]
+    assert image.attempts == 2 and policy.delays == []
+    a, b = generator.endpoint_pool.endpoints
+    assert (a.failures, b.failures) == (1, 0)
+    assert generator.retry_stats["retries"] == {"server_error": 1}
+
+
+def test_all_endpoints_failing_backs_off_then_raises():
+    hosts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        return httpx.Response(503, headers={"Retry-After": "0"})
+
+    policy = _RecordingPolicy(max_attempts=4)
+    generator = _generator(handler, endpoints=_endpoints("a", "b"), retry_policy=policy)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(generator.generate_image("页面", image_size="1K"))
+
+    # 先切换端点；所有端点都失败后按退避重试，用完尝试次数后抛出
+    assert len(hosts) == 4 and hosts[:2] == ["a.test", "b.test"]
+    assert policy.delays == [0.0, 0.0]
+    assert generator.retry_stats["retries"] == {"server_error": 3}
+
+
+def test_open_breaker_skips_endpoint():
+    hosts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        return _response(b"png")
+
+    endpoints = _endpoints("a", "b")
+    endpoints[0].circuit_breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+    endpoints[0].circuit_breaker.record_failure()
+    generator = _generator(handler, endpoints=endpoints)
+
+    image = asyncio.run(generator.generate_image("页面", image_size="1K"))
+    assert hosts == ["b.test"] and image.attempts == 1
+
+    # 所有端点都熔断时直接失败，不发请求
+    endpoints[1].circuit_breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+    endpoints[1].circuit_breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(generator.generate_image("另一页", image_size="1K"))
+    assert hosts == ["b.test"]
+
+
+def test_hedged_request_to_fast_endpoint(tmp_path):
+    cancelled = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "fast.test":
+            await asyncio.sleep(0.02)
+            return _response(b"fast")
+        try:
+            await asyncio.sleep(0.5)
+        except asyncio.CancelledError:
+            cancelled.append(request.url.host)
+            raise
+        return _response(b"slow")
+
+    # 慢端点权重更高，始终作为首选端点；对冲请求发往快端点
+    endpoints = [
+        ApiEndpoint(base_url="http://slow.test", api_key="test", name="slow", weight=100),
+        ApiEndpoint(base_url="http://fast.test", api_key="test", name="fast"),
+    ]
+    generator = _generator(
+        handler, endpoints=endpoints, hedging_enabled=True, hedging_max_extra_ratio=0.5, hedging_min_samples=10
+    )
+    key = latency_key(generator.model, "1K", 0)
+    for _ in range(20):
+        generator.latency_history.record(key, 0.05)
+
+    async def run():
+        images = []
+        for number in range(1, 5):
+            output_path = tmp_path / f"page_{number:03d}.png"
+            images.append(await generator.generate_image(f"第 {number} 页", image_size="1K", output_path=output_path))
+        await generator.aclose()
+        return images
+
+    images = asyncio.run(run())
+    # 四个请求都超过 p90；对冲次数不超过请求数的 50%，超出预算的请求等待原请求完成
+    assert generator.hedge_stats == {"requests_slow": 4, "hedged": 2, "hedge_wins": 2}
+    assert generator.hedge_stats["hedged"] <= 0.5 * generator.retry_stats["requests"]
+    assert [image.endpoint for image in images] == ["slow", "fast", "slow", "fast"]
+    assert [Path(image.path).read_bytes() for image in images] == [b"slow", b"fast", b"slow", b"fast"]
+    # 落败的原请求被取消，不计入端点故障，也不留临时文件
+    assert cancelled == ["slow.test", "slow.test"]
+    assert endpoints[0].failures == 0
+    assert list(tmp_path.glob("*.part")) == []
@@ -0,0 +1,70 @@
+"""
+生成缓存测试
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加 src 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.generation_cache import GenerationCache
+
+
+def test_key_depends_on_all_inputs():
+    """缓存键覆盖模型、提示词、参考图、大小和长宽比，且忽略 data URL 前缀"""
+    base = GenerationCache.make_key("m", "提示词", ["QUJD"], "2K", "3:4")
+    assert base == GenerationCache.make_key("m", "提示词", ["data:image/jpeg;base64,QUJD"], "2K", "3:4")
+    assert base != GenerationCache.make_key("m2", "提示词", ["QUJD"], "2K", "3:4")
+    assert base != GenerationCache.make_key("m", "提示词2", ["QUJD"], "2K", "3:4")
+    assert base != GenerationCache.make_key("m", "提示词", ["QUJE"], "2K", "3:4")
+    assert base != GenerationCache.make_key("m", "提示词", ["QUJD"], "4K", "3:4")
+    assert base != GenerationCache.make_key("m", "提示词", ["QUJD"], "2K", "16:9")
+
+
+def test_lru_eviction_and_counters():
+    """超过上限时淘汰最久未使用的条目"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GenerationCache(Path(tmp), max_size_mb=2.5 / 1024)  # 2.5KB
+        cache.put_bytes("a", b"a" * 1024, "image/png")
+        cache.put_bytes("b", b"b" * 1024, "image/jpeg")
+
+        # 访问 a 之后，b 成为最久未使用
+        path, mime = cache.get("a")
+        assert mime == "image/png" and path.read_bytes() == b"a" * 1024
+
+        cache.put_bytes("c", b"c" * 1024, "image/png")
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+
+        # 重启后从目录恢复
+        reopened = GenerationCache(Path(tmp), max_size_mb=1)
+        assert reopened.stats()["entries"] == 2
+
+
+def test_hit_reports_format_of_stored_file(tmp_path):
+    """命中缓存时返回缓存文件实际格式的 MIME 类型，而不是写入时声明的类型"""
+    png = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+    avif = b"\0\0\0\x1cftypavif" + b"\0" * 64
+    cache = GenerationCache(tmp_path / "cache")
+
+    # 声明为 AVIF，实际是 PNG（如 AVIF 不可用时回退为 PNG）
+    cache.put_bytes("fallback", png, "image/avif")
+    path, mime = cache.get("fallback")
+    assert (path.suffix, mime) == (".png", "image/png")
+
+    source = tmp_path / "page.avif"
+    source.write_bytes(avif)
+    cache.put_file("avif", source, "image/avif")
+    path, mime = cache.get("avif")
+    assert (path.suffix, mime) == (".avif", "image/avif")
+    assert GenerationCache(tmp_path / "cache").get("avif")[1] == "image/avif"
+
+    # 无法识别的格式不缓存
+    assert cache.put_bytes("unknown", b"GIF89a" + b"\0" * 64, "image/gif") is None
+    assert cache.get("unknown") is None
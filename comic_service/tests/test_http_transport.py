@@ -0,0 +1,68 @@
+"""
+HTTP 传输测试（本机回环，多个客户端共用一个服务实例）
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import uvicorn
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamable_http_client
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.http_transport import create_http_app, security_settings
+
+
+def test_clients_share_one_server(tmp_path, monkeypatch):
+    # 默认配置中的相对路径（参考图库、缓存、输出）都落在临时目录
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setenv("GEMINI_API_BASE_URL", "http://127.0.0.1:9")
+    from src.mcp_server import ComicMCPServer
+
+    server_instance = ComicMCPServer()
+    app = create_http_app(server_instance, security=security_settings("127.0.0.1"))
+
+    async def call(session: ClientSession, name: str, arguments=None) -> dict:
+        result = await session.call_tool(name, arguments or {})
+        return json.loads(result.content[0].text)
+
+    async def streamable_client(url: str):
+        async with streamable_http_client(url) as (read_stream, write_stream, get_session_id):
+            async with ClientSession(read_stream, write_stream) as session:
+                info = await session.initialize()
+                tools = await session.list_tools()
+                submitted = await call(session, "submit_job", {"tool": "generate_comic_page", "arguments": {"json_path": "missing.json"}})
+                return info.serverInfo.name, len(tools.tools), get_session_id(), submitted["job_id"]
+
+    async def legacy_sse_client(url: str):
+        async with sse_client(url) as (read_stream, write_stream):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+                return await call(session, "get_service_stats")
+
+    async def run():
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        serve_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        base = f"http://127.0.0.1:{port}"
+        try:
+            first, second = await asyncio.gather(streamable_client(f"{base}/mcp"), streamable_client(f"{base}/mcp"))
+            stats = await legacy_sse_client(f"{base}/sse")
+        finally:
+            server.should_exit = True
+            await serve_task
+        return first, second, stats
+
+    first, second, stats = asyncio.run(run())
+    assert first[0] == "comic-service" and first[1] == second[1] > 0
+    # 两个独立的会话
+    assert first[2] and second[2] and first[2] != second[2]
+    # 所有会话提交的任务在同一个队列中
+    assert stats["jobs"]["done"] + stats["jobs"]["failed"] + stats["jobs"]["running"] + stats["jobs"]["queued"] == 2
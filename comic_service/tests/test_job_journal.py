@@ -0,0 +1,155 @@
+"""
+生成日志测试
+"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen import job_journal
+from src.image_gen.job_journal import JobJournal, diff_inputs, input_hash
+from src.image_gen.job_queue import JobQueue
+
+
+def test_completed_pages_survive_restart(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    image_path = tmp_path / "page_001.png"
+    image_path.write_bytes(b"png")
+
+    journal = JobJournal(journal_path)
+    journal.page_started(1, "hash_a")
+    journal.page_done(1, "hash_a", {"image_path": str(image_path)})
+    journal.page_started(2, "hash_b")
+    journal.close()
+    # 崩溃时写了一半的行
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"type": "page", "page_')
+
+    journal = JobJournal(journal_path)
+    assert journal.completed_page(1, "hash_a")["image_path"] == str(image_path)
+    assert journal.completed_page(1, "hash_changed") is None
+    assert journal.pages[2]["state"] == "running"
+
+    image_path.unlink()
+    assert journal.completed_page(1, "hash_a") is None
+
+
+def _inputs(**changes):
+    inputs = {
+        "page": "page_hash",
+        "image_size": "4K",
+        "aspect_ratio": "3:4",
+        "style": "彩漫风格",
+        "style_reference": None,
+        "style_reference_path": None,
+        "characters": {"char_a": "sha_a", "char_b": "sha_b"},
+        "scenes": {"scene_street": "sha_street"},
+        "missing_references": ["教室"],
+    }
+    inputs.update(changes)
+    return inputs
+
+
+def test_dependency_changes_are_explained(tmp_path):
+    old = _inputs()
+    assert diff_inputs(old, _inputs()) == []
+    assert input_hash(old) == input_hash(_inputs(style_reference_path="moved/style.png"))
+
+    new = _inputs(
+        image_size="2K",
+        characters={"char_a": "sha_a2", "char_c": "sha_c"},
+        scenes={"scene_street": "sha_street", "scene_classroom": "sha_classroom"},
+        missing_references=[],
+    )
+    assert input_hash(new) != input_hash(old)
+    assert diff_inputs(old, new) == [
+        "image_size: 4K → 2K",
+        "新用到角色参考图: char_c",
+        "不再用到角色参考图: char_b",
+        "角色参考图已更新: char_a",
+        "新用到场景参考图: scene_classroom",
+        "已有参考图: 教室",
+    ]
+
+    # 反向索引：哪些页面用到了某个参考图
+    image_path = tmp_path / "page.png"
+    image_path.write_bytes(b"png")
+    journal = JobJournal(tmp_path / "journal.jsonl")
+    journal.page_done(1, input_hash(old), {"image_path": str(image_path)}, old)
+    journal.page_done(2, input_hash(new), {"image_path": str(image_path)}, new)
+    assert journal.pages_using("characters", "char_a") == {1: "sha_a", 2: "sha_a2"}
+    assert journal.pages_using("scenes", "scene_classroom") == {2: "sha_classroom"}
+    journal.close()
+
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    calls = []
+    slow_pages = {2}
+
+    async def runner(tool, arguments):
+        calls.append(arguments["page"])
+        if arguments["page"] in slow_pages:
+            await asyncio.sleep(10)
+        return {"page": arguments["page"]}
+
+    async def first_run():
+        queue = JobQueue(runner, max_workers=1, journal=JobJournal(journal_path))
+        await queue.start()
+        done = queue.submit("generate_comic_page", {"page": 1})
+        assert await queue.wait([done.job_id], timeout=1)
+        running = queue.submit("generate_comic_page", {"page": 2})
+        queued = queue.submit("generate_comic_page", {"page": 3})
+        await asyncio.sleep(0.05)
+        # 服务关闭：执行中和排队中的任务都没有结束
+        await queue.stop()
+        queue.journal.close()
+        return done.job_id, running.job_id, queued.job_id
+
+    async def second_run(job_ids):
+        queue = JobQueue(runner, max_workers=1, journal=JobJournal(journal_path))
+        await queue.start()
+        assert await queue.wait(list(job_ids), timeout=1)
+        await queue.stop()
+        return queue
+
+    job_ids = asyncio.run(first_run())
+    assert calls == [1, 2]
+
+    slow_pages.clear()
+    queue = asyncio.run(second_run(job_ids))
+    assert queue.resumed == 2
+    assert [queue.get(job_id).status for job_id in job_ids] == ["done", "done", "done"]
+    assert queue.get(job_ids[0]).result == {"page": 1}
+    assert calls == [1, 2, 2, 3]
+
+
+def test_fsync_is_batched_off_the_event_loop(tmp_path, monkeypatch):
+    fsync_threads = []
+    real_fsync = job_journal.os.fsync
+
+    def fsync(fd):
+        fsync_threads.append(threading.get_ident())
+        real_fsync(fd)
+
+    monkeypatch.setattr(job_journal.os, "fsync", fsync)
+
+    async def run():
+        journal = JobJournal(tmp_path / "journal.jsonl")
+        # 追加记录不落盘，页面结束时的并发 sync() 合并为一次 fsync
+        journal.page_started(1, "hash_a")
+        journal.page_started(2, "hash_b")
+        journal.page_failed(1, "hash_a", "错误")
+        journal.page_failed(2, "hash_b", "错误")
+        assert fsync_threads == []
+        await asyncio.gather(journal.sync(), journal.sync())
+        await journal.sync()
+        journal.close()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(fsync_threads) == 1 and fsync_threads[0] != loop_thread
+    assert JobJournal(tmp_path / "journal.jsonl").pages[2]["state"] == "failed"
@@ -0,0 +1,50 @@
+"""
+后台任务队列测试
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.job_queue import JobQueue
+
+
+def test_jobs_run_in_background():
+    async def runner(tool, arguments):
+        await asyncio.sleep(arguments["delay"])
+        if arguments.get("fail"):
+            raise RuntimeError("boom")
+        return {"image_path": f"page_{arguments['page']}.png"}
+
+    async def run():
+        queue = JobQueue(runner, max_workers=2)
+        await queue.start()
+
+        ok = queue.submit("generate_comic_page", {"page": 1, "delay": 0.05})
+        failed = queue.submit("generate_comic_page", {"page": 2, "delay": 0.05, "fail": True})
+        slow = queue.submit("generate_comic_page", {"page": 3, "delay": 10})
+        running = queue.submit("generate_comic_page", {"page": 4, "delay": 10})
+        queued = queue.submit("generate_comic_page", {"page": 5, "delay": 0})
+        assert ok.status == "queued"
+
+        # 两个工作协程：前两个任务结束后第 3、4 个开始，第 5 个仍在排队
+        assert await queue.wait([ok.job_id, failed.job_id], timeout=1)
+        assert not await queue.wait([slow.job_id], timeout=0.05)
+        assert queued.status == "queued"
+        assert queue.cancel(queued.job_id)
+        assert queue.cancel(slow.job_id)
+        assert await queue.wait([slow.job_id], timeout=1)
+        assert running.status == "running"
+
+        # 关闭时取消执行中的任务
+        await queue.stop()
+        assert running.status == "cancelled"
+        return ok, failed, slow, queued
+
+    ok, failed, slow, queued = asyncio.run(run())
+    assert ok.status == "done" and ok.result == {"image_path": "page_1.png"}
+    assert failed.status == "failed" and failed.error == "boom"
+    assert slow.status == "cancelled" and slow.started_at is not None
+    assert queued.status == "cancelled" and queued.started_at is None
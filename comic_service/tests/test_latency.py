@@ -0,0 +1,49 @@
+"""
+延迟历史与自适应超时测试
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加 src 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.latency import LatencyHistory, AdaptiveTimeouts, latency_key
+
+
+def test_percentile_and_persistence():
+    """分位数按最近秩计算，保存后可重新加载"""
+    history = LatencyHistory(max_samples=100)
+    key = latency_key("m", "2K", 3)
+    for value in range(1, 101):
+        history.record(key, float(value))
+    assert history.percentile(key, 0.5) == 50.0
+    assert history.percentile(key, 0.99) == 99.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "history.json"
+        history.save(path)
+        reloaded = LatencyHistory()
+        reloaded.load(path)
+        assert reloaded.count(key) == 100
+
+
+def test_timeout_sources():
+    """显式 > 覆盖 > 历史推导 > 默认值"""
+    history = LatencyHistory()
+    timeouts = AdaptiveTimeouts(
+        history, safety_factor=2.0, min_read=30, max_read=600, min_samples=3,
+        default_read={"4K": 240.0}, overrides={"1K": 45.0}
+    )
+    key = latency_key("m", "4K", 0)
+    assert timeouts.derive(key, "4K")["source"] == "default"
+    assert timeouts.derive(key, "4K")["read_s"] == 240.0
+
+    for value in (50.0, 60.0, 100.0):
+        history.record(key, value)
+    derived = timeouts.derive(key, "4K")
+    assert derived["source"] == "history" and derived["read_s"] == 200.0
+
+    assert timeouts.derive(latency_key("m", "1K", 0), "1K")["read_s"] == 45.0
+    assert timeouts.derive(key, "4K", explicit=90)["source"] == "explicit"
@@ -0,0 +1,55 @@
+"""
+参考图库索引测试
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.manifest import ReferenceManifest
+from src.image_gen.scene_manager import SceneManager
+
+
+def _write_scene(directory: Path, scene_id: str, name: str):
+    (directory / f"{scene_id}.jpg").write_bytes(b"jpeg")
+    record = {
+        "scene_id": scene_id,
+        "name": name,
+        "description": "测试",
+        "reference_image": {"path": str(directory / f"{scene_id}.jpg"), "sha256": "x", "model_used": "m"},
+    }
+    (directory / f"{scene_id}.json").write_text(json.dumps(record, ensure_ascii=False), encoding="utf-8")
+
+
+def test_refresh_is_incremental(tmp_path):
+    _write_scene(tmp_path, "scene_a", "街道")
+    _write_scene(tmp_path, "scene_b", "教室")
+
+    manifest = ReferenceManifest(tmp_path, id_field="scene_id")
+    assert manifest.refresh() == {"added": 2, "updated": 0, "removed": 0, "total": 2}
+
+    # 未变化的目录不重新读取任何文件
+    manifest = ReferenceManifest(tmp_path, id_field="scene_id")
+    assert manifest.refresh() == {"added": 0, "updated": 0, "removed": 0, "total": 2}
+
+    _write_scene(tmp_path, "scene_b", "旧教室")
+    (tmp_path / "scene_a.json").unlink()
+    assert manifest.refresh() == {"added": 0, "updated": 1, "removed": 1, "total": 1}
+    assert manifest.match_name("旧教室")["id"] == "scene_b"
+
+
+def test_manager_materializes_on_demand(tmp_path):
+    _write_scene(tmp_path, "scene_a", "街道")
+    _write_scene(tmp_path, "scene_b", "教室")
+
+    manager = SceneManager(gemini_client=None, storage_dir=tmp_path)
+    assert manager.scenes == {}
+
+    scene = manager.get_scene_by_name("教室")
+    assert scene.scene_id == "scene_b"
+    assert list(manager.scenes) == ["scene_b"]
+
+    assert manager.delete_scene("scene_a")
+    assert [s.scene_id for s in manager.list_scenes()] == ["scene_b"]
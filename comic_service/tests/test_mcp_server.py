@@ -0,0 +1,406 @@
+"""
+MCP 服务器测试（临时目录中运行，不访问网络）
+"""
+
+import asyncio
+import base64
+import io
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # 默认配置中的相对路径（参考图库、缓存、输出）都落在临时目录
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setenv("GEMINI_API_BASE_URL", "http://api.test")
+    from src.mcp_server import ComicMCPServer
+
+    return ComicMCPServer()
+
+
+def _png(color: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (96, 128), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _mock_api(server, handler):
+    """用 MockTransport 模拟 Gemini API；handler(prompt) 返回图片字节，返回 None 时请求失败（400，不重试）"""
+    async def respond(request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)["contents"][0]["parts"][0]["text"]
+        data = await handler(prompt)
+        if data is None:
+            return httpx.Response(400, content=b'{"error": {"message": "bad request"}}')
+        body = {"candidates": [{"content": {"parts": [
+            {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(data).decode()}},
+        ]}}]}
+        return httpx.Response(200, content=json.dumps(body).encode())
+
+    server.gemini_client._client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+
+
+def _write_page(path: Path, page_number: int, character: str):
+    page = {"page_number": page_number, "panels": [{
+        "panel_number": 1, "description": f"第 {page_number} 页", "background": "街道", "camera_angle": "中景",
+        "characters": [{"name": character}],
+    }]}
+    path.write_text(json.dumps(page, ensure_ascii=False), encoding="utf-8")
+
+
+def _result(contents) -> dict:
+    return json.loads(contents[0].text)
+
+
+class _ConcurrencyProbe:
+    """记录同时进行的请求数；提示词包含"失败"时请求失败"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.prompts = []
+
+    async def __call__(self, prompt: str):
+        self.prompts.append(prompt)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return None if "失败" in prompt else _png("red")
+
+
+def _record_progress(server) -> list:
+    """替换进度通知，记录 (progress, total, message)"""
+    notifications = []
+
+    async def report(progress, total=None, message=None):
+        notifications.append((progress, total, message))
+
+    server._progress_reporter = lambda: report
+    return notifications
+
+
+def test_shutdown_closes_sqlite_library(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    from src.mcp_server import ComicMCPServer
+
+    monkeypatch.setattr(ComicMCPServer, "_load_config", lambda self: {"storage": {"backend": "sqlite"}})
+    server = ComicMCPServer()
+    stores = [server.character_manager.store, server.scene_manager.store]
+    assert [store.backend for store in stores] == ["sqlite", "sqlite"]
+
+    async def run():
+        await server.startup()
+        await server.shutdown()
+
+    asyncio.run(run())
+    for store in stores:
+        with pytest.raises(sqlite3.ProgrammingError):
+            store.sync()
+
+
+def test_expand_json_paths(server, tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    for name in ("page_002.json", "page_001.json", "notes.txt"):
+        (pages / name).write_text("{}", encoding="utf-8")
+    other = tmp_path / "extra.json"
+    other.write_text("{}", encoding="utf-8")
+
+    def names(paths):
+        return [path.name for path in server._expand_json_paths(paths)]
+
+    # 相对 glob、绝对 glob、目录、显式文件列表
+    assert names(["pages/page_*.json"]) == ["page_001.json", "page_002.json"]
+    assert names([str(pages / "page_*.json")]) == ["page_001.json", "page_002.json"]
+    assert names(["pages"]) == ["page_001.json", "page_002.json"]
+    assert names([str(other), "pages/page_002.json"]) == ["extra.json", "page_002.json"]
+    # 重复项只保留第一次出现
+    assert names(["pages/page_002.json", str(tmp_path / "pages" / "*.json")]) == ["page_002.json", "page_001.json"]
+
+    with pytest.raises(FileNotFoundError):
+        server._expand_json_paths([str(tmp_path / "missing_*.json")])
+    with pytest.raises(FileNotFoundError):
+        server._expand_json_paths(["missing.json"])
+
+
+def test_rebuild_only_pages_using_updated_reference(server, tmp_path):
+    color = {"current": "red"}
+    prompts = []
+
+    async def handler(prompt: str) -> bytes:
+        prompts.append(prompt)
+        return _png(color["current"])
+
+    _mock_api(server, handler)
+    (tmp_path / "pages").mkdir()
+    for number in range(1, 5):
+        _write_page(tmp_path / "pages" / f"page_{number:03d}.json", number, "小明" if number % 2 else "小红")
+
+    async def run():
+        await server.startup()
+        try:
+            await server._generate_character_reference("小明", "男孩")
+            await server._generate_character_reference("小红", "女孩")
+            first = _result(await server._generate_comic_pages(["pages"], image_size="1K"))
+
+            # 重新生成小红的参考图后，只有用到小红的页面过期
+            color["current"] = "blue"
+            updated = _result(await server._generate_character_reference("小红", "女孩，短发", force_regenerate=True))
+            plan = _result(await server._rebuild_stale_pages(["pages"], dry_run=True))
+            requests_before = len(prompts)
+            rebuilt = _result(await server._rebuild_stale_pages(["pages"]))
+            rebuild_requests = len(prompts) - requests_before
+            status = _result(await server._get_chapter_status(["pages"]))
+            again = _result(await server._rebuild_stale_pages(["pages"]))
+        finally:
+            await server.shutdown()
+        return first, updated, plan, rebuilt, rebuild_requests, status, again
+
+    first, updated, plan, rebuilt, rebuild_requests, status, again = asyncio.run(run())
+    assert first["succeeded"] == 4
+    assert updated["stale_pages"] == [2, 4]
+
+    # dry_run 只列出计划，不生成
+    assert [item["page_number"] for item in plan["plan"]] == [2, 4]
+    assert all(item["status"] == "stale" for item in plan["plan"])
+    assert all(item["reasons"] == [f"角色参考图已更新: {updated['character_id']}"] for item in plan["plan"])
+    assert plan["up_to_date"] == 2 and "rebuilt" not in plan
+
+    # 只重新生成这两页，沿用上次的参数
+    assert rebuilt["rebuilt"] == 2 and rebuild_requests == 2
+    assert [page["page_number"] for page in rebuilt["pages"]] == [2, 4]
+    assert rebuilt["plan"][0]["params"]["image_size"] == "1K"
+
+    assert status["complete"] and status["counts"] == {"done": 4}
+    assert again["to_rebuild"] == 0
+
+
+def test_references_batch(server):
+    probe = _ConcurrencyProbe()
+    _mock_api(server, probe)
+    notifications = _record_progress(server)
+
+    async def run():
+        await server.startup()
+        try:
+            await server._generate_character_reference("小明", "男孩")
+            requests_before = len(probe.prompts)
+            result = _result(await server._generate_references_batch(
+                characters=[
+                    {"character_name": "小明", "description": "男孩"},
+                    {"character_name": "小红", "description": "女孩"},
+                    {"character_name": "小刚", "description": "高个子"},
+                    {"character_name": "小丽", "description": "生成会失败"},
+                ],
+                scenes=[
+                    {"scene_name": "街道", "description": "城市街道"},
+                    {"scene_name": "教室", "description": "明亮的教室"},
+                ],
+                max_parallel=2,
+            ))
+            return result, len(probe.prompts) - requests_before
+        finally:
+            await server.shutdown()
+
+    result, requests = asyncio.run(run())
+    statuses = {item["name"]: item["status"] for item in result["items"]}
+    assert statuses == {"小明": "skipped", "小红": "created", "小刚": "created", "小丽": "failed", "街道": "created", "教室": "created"}
+    assert (result["created"], result["skipped"], result["failed"], result["success"]) == (4, 1, 1, False)
+    # 已存在的不发请求；并发不超过上限
+    assert requests == 5 and probe.max_active == 2
+    # 失败项不影响其他项，也不留下记录
+    assert server.character_manager.get_character(server.character_manager.make_character_id("小丽")) is None
+    assert server.scene_manager.get_scene(server.scene_manager.make_scene_id("教室")) is not None
+    # 每项完成时发送一次进度
+    assert [(progress, total) for progress, total, _ in notifications] == [(n, 6) for n in range(1, 7)]
+    assert sum("failed" in message for _, _, message in notifications) == 1
+
+
+def test_comic_pages_batch(server, tmp_path):
+    probe = _ConcurrencyProbe()
+    _mock_api(server, probe)
+    notifications = _record_progress(server)
+    (tmp_path / "pages").mkdir()
+    for number in range(1, 6):
+        _write_page(tmp_path / "pages" / f"page_{number:03d}.json", number, "小明")
+    page = json.loads((tmp_path / "pages" / "page_003.json").read_text(encoding="utf-8"))
+    page["panels"][0]["description"] = "这一页生成会失败"
+    (tmp_path / "pages" / "page_003.json").write_text(json.dumps(page, ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "pages" / "page_bad.json").write_text('{"panels": []}', encoding="utf-8")
+
+    async def run():
+        await server.startup()
+        try:
+            first = _result(await server._generate_comic_pages(["pages/*.json"], image_size="1K", max_parallel=2))
+            requests_before = len(probe.prompts)
+            second = _result(await server._generate_comic_pages(["pages"], image_size="1K", max_parallel=2))
+            return first, second, len(probe.prompts) - requests_before
+        finally:
+            await server.shutdown()
+
+    first, second, second_requests = asyncio.run(run())
+    # 无效 JSON 和生成失败的页面单独记录，不影响其他页面
+    assert (first["total"], first["succeeded"], first["failed"], first["success"]) == (6, 4, 2, False)
+    failed = [page for page in first["pages"] if page["status"] == "failed"]
+    assert [page.get("page_number") for page in failed] == [None, 3]
+    assert all(Path(page["image_path"]).exists() for page in first["pages"] if page["status"] == "succeeded")
+    assert probe.max_active == 2
+
+    # 再次运行时已完成的页面跳过，只重试失败的页面
+    assert (second["succeeded"], second["skipped"], second["failed"]) == (0, 4, 2)
+    assert second_requests == 1
+
+    # 每次运行每页一次进度（无效页面解析时已计入）
+    assert [(progress, total) for progress, total, _ in notifications[:5]] == [(n, 6) for n in range(2, 7)]
+    assert len(notifications) == 10
+
+
+def test_low_confidence_names_do_not_use_references(server):
+    _mock_api(server, lambda prompt: asyncio.sleep(0, _png("red")))
+
+    async def run():
+        await server.startup()
+        try:
+            await server._generate_character_reference("小明", "男孩")
+            await server._generate_scene_reference("现代城市街道", "城市街道")
+        finally:
+            await server.shutdown()
+
+    asyncio.run(run())
+    reference_set = server._build_reference_set({"小明", "小明的妈妈"}, {"街道背景"})
+    characters = reference_set["characters"]
+    assert characters["小明"]["image"] is not None
+    # 包含名称的其他人物：只给出候选，不使用其参考图
+    mother = characters["小明的妈妈"]
+    assert mother["id"] is None and mother["image"] is None
+    assert mother["match"]["candidate"]["matched"] == "小明" and mother["match"]["candidate"]["low_confidence"]
+    street = reference_set["scenes"]["街道背景"]
+    assert street["match"]["method"] == "substring" and street["image"] is not None
+
+
+def test_overlapping_renders_of_same_page(server, tmp_path):
+    calls = []
+    releases = []
+
+    async def handler(prompt: str) -> bytes:
+        index = len(calls)
+        calls.append(prompt)
+        await releases[index].wait()
+        return _png("red" if index == 0 else "blue")
+
+    _mock_api(server, handler)
+    (tmp_path / "pages").mkdir()
+    _write_page(tmp_path / "pages" / "page_001.json", 1, "小明")
+
+    async def run():
+        releases.extend([asyncio.Event(), asyncio.Event()])
+        await server.startup()
+        try:
+            jobs = [
+                asyncio.create_task(server._generate_comic_pages(["pages"], image_size="1K", force_regenerate=True))
+                for _ in range(2)
+            ]
+            while len(calls) < 2:
+                await asyncio.sleep(0.01)
+            assert server._pages_in_flight[1] == 2
+            releases[0].set()
+            await asyncio.wait(jobs, return_when=asyncio.FIRST_COMPLETED)
+            # 另一个任务仍在生成同一页
+            in_flight = server._pages_in_flight[1]
+            releases[1].set()
+            results = [_result(await job) for job in jobs]
+            return in_flight, results
+        finally:
+            await server.shutdown()
+
+    in_flight, results = asyncio.run(run())
+    assert in_flight == 1 and 1 not in server._pages_in_flight
+    assert all(result["succeeded"] == 1 for result in results)
+    # 两个任务各用自己的临时文件，完成后不留下临时文件
+    assert not list(tmp_path.rglob("*.download"))
+
+
+def test_deleted_style_reference_marks_pages_stale(server, tmp_path):
+    _mock_api(server, lambda prompt: asyncio.sleep(0, _png("red")))
+    (tmp_path / "pages").mkdir()
+    for number in (1, 2):
+        _write_page(tmp_path / "pages" / f"page_{number:03d}.json", number, "小明")
+    style_image = tmp_path / "style.png"
+    style_image.write_bytes(_png("green"))
+
+    async def run():
+        await server.startup()
+        try:
+            await server._generate_comic_pages(["pages/page_001.json"], image_size="1K", style_reference_image=str(style_image))
+            await server._generate_comic_pages(["pages/page_002.json"], image_size="1K")
+            style_image.unlink()
+            status = _result(await server._get_chapter_status(["pages"]))
+            rebuilt = _result(await server._rebuild_stale_pages(["pages"]))
+        finally:
+            await server.shutdown()
+        return status, rebuilt
+
+    status, rebuilt = asyncio.run(run())
+    # 只有用过该风格参考图的页面过期，其他页面不受影响
+    assert status["counts"] == {"done": 1, "stale": 1}
+    assert status["pages"][0]["reasons"] == ["风格参考图不存在"]
+    assert [page["page_number"] for page in rebuilt["pages"]] == [1]
+    assert rebuilt["pages"][0]["status"] == "failed" and "风格参考图不存在" in rebuilt["pages"][0]["error"]
+
+
+def test_reference_tools_report_request_details(server):
+    _mock_api(server, lambda prompt: asyncio.sleep(0, _png("red")))
+
+    async def run():
+        await server.startup()
+        try:
+            character = _result(await server._generate_character_reference("小明", "男孩"))
+            scene = _result(await server._generate_scene_reference("教室", "明亮的教室"))
+            cached = _result(await server._generate_character_reference("小明", "男孩"))
+        finally:
+            await server.shutdown()
+        return character, scene, cached
+
+    character, scene, cached = asyncio.run(run())
+    for result in (character, scene):
+        assert result["attempts"] == 1 and not result["cache_hit"]
+        assert result["timeouts"]["read_s"] > 0 and result["http_timings"] is not None
+    assert cached["cache_hit"] and cached["http_timings"] is None
+
+
+def test_characters_resource_reports_tracked_usage(server):
+    from mcp.types import ReadResourceRequest, ReadResourceRequestParams
+
+    _mock_api(server, lambda prompt: asyncio.sleep(0, _png("red")))
+    read = server.server.request_handlers[ReadResourceRequest]
+
+    async def run():
+        await server.startup()
+        try:
+            created = _result(await server._generate_character_reference("小明", "男孩"))
+            server.character_manager.usage.record([created["character_id"]] * 2)
+            result = await read(ReadResourceRequest(
+                method="resources/read", params=ReadResourceRequestParams(uri="file:///characters")
+            ))
+        finally:
+            await server.shutdown()
+        return json.loads(result.root.contents[0].text)
+
+    characters = asyncio.run(run())
+    assert [c["name"] for c in characters] == ["小明"]
+    assert characters[0]["usage_count"] == 2 and characters[0]["last_used"]
+    assert "usage_count" not in characters[0]["metadata"]
@@ -0,0 +1,105 @@
+"""
+名称索引测试
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.name_index import NameIndex, normalize_name
+
+
+def test_normalize_name():
+    assert normalize_name("　小 明！") == "小明"
+    assert normalize_name("ＡＢＣ") == "abc"
+    assert normalize_name("現代城市街道") == "现代城市街道"
+
+
+def test_match_methods():
+    index = NameIndex()
+    index.add("char_xiaoming", "小明", ["明明"])
+    index.add("scene_street", "现代城市街道")
+
+    assert index.match("小明")["method"] == "exact"
+    assert index.match("明明") == {"id": "char_xiaoming", "matched": "明明", "method": "alias", "score": 1.0}
+    assert index.match("現代城市街道")["method"] == "normalized"
+
+    match = index.match("小明同学")
+    assert (match["id"], match["method"]) == ("char_xiaoming", "substring")
+
+    match = index.match("现代城市的街道")
+    assert (match["id"], match["method"]) == ("scene_street", "fuzzy")
+    assert 0 < match["score"] < index.match("小明同学")["score"]
+
+    assert index.match("小红") is None
+
+
+def test_near_misses_are_not_matched():
+    index = NameIndex()
+    index.add("char_xiaohong", "王小红")
+    index.add("char_liming", "李明")
+    index.add("scene_street", "现代城市街道")
+
+    # 只共用姓氏和"小"字的不同人物
+    assert index.match("王小明") is None
+    # 只共用"城市"的不同场景
+    assert index.match("城市公园") is None
+    # 单个字不做子串匹配
+    assert index.match("李") is None
+    # 放宽阈值后才会模糊匹配
+    loose = NameIndex(min_score=0.5)
+    loose.add("char_xiaohong", "王小红")
+    assert loose.match("王小明")["method"] == "fuzzy"
+
+
+def test_substring_needs_generic_suffix():
+    index = NameIndex()
+    index.add("char_xiaoming", "小明")
+    index.add("scene_classroom", "教室")
+    index.add("scene_street", "现代城市街道")
+
+    # 名称加通用后缀、名称末尾的中心词
+    assert index.match("小明同学")["score"] == 0.9
+    match = index.match("街道背景")
+    assert (match["id"], match["method"]) == ("scene_street", "substring")
+    assert index.closest("街道背景") is None
+
+    # 包含名称的其他人物/场景不匹配，只给出低置信度的候选
+    for query, obj_id in (("小明的妈妈", "char_xiaoming"), ("小明爸爸", "char_xiaoming"), ("教室外走廊", "scene_classroom")):
+        assert index.match(query) is None
+        closest = index.closest(query)
+        assert (closest["id"], closest["low_confidence"]) == (obj_id, True)
+        assert closest["score"] < index.min_score
+    assert index.closest("操场") is None
+
+
+def test_update_and_remove():
+    index = NameIndex()
+    index.add("char_a", "小明", ["明明"])
+    index.add("char_a", "小明", ["阿明"])
+    assert index.match("明明") is None
+    assert index.match("阿明")["id"] == "char_a"
+
+    index.remove("char_a")
+    assert index.match("小明") is None
+
+
+def test_shared_names_survive_removal():
+    index = NameIndex()
+    index.add("char_a", "小明")
+    index.add("char_b", "小 明", ["阿明"])
+    index.add("char_c", "老师", ["阿明"])
+
+    # 同名时取最后添加的对象
+    assert index.match("小明")["id"] == "char_a"
+    assert index.match("小明！")["id"] == "char_b"
+    assert index.match("阿明")["id"] == "char_c"
+
+    # 删除一个对象不影响其他对象共用的名称
+    index.remove("char_c")
+    assert index.match("阿明")["id"] == "char_b"
+    index.remove("char_b")
+    assert index.match("阿明") is None
+    assert index.match("小明！") == {"id": "char_a", "matched": "小明", "method": "normalized", "score": 0.95}
+    assert index.match("小明同学")["id"] == "char_a"
@@ -0,0 +1,91 @@
+"""
+页面输出测试
+"""
+
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.page_writer import PageIndex, PageWriter
+from src.image_gen.workers import ImageWorkerPool
+from src.models.generation import GeneratedImage
+
+
+def _png_bytes(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (30, 60, 90)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_master_keeps_real_format_and_renditions(tmp_path):
+    workers = ImageWorkerPool(max_workers=2)
+    writer = PageWriter(
+        tmp_path,
+        workers,
+        renditions=[{"format": "jpeg", "quality": 80}, {"format": "webp", "quality": 70, "max_width": 256}]
+    )
+    # 旧版本以 .jpg 保存的母版应被替换
+    (tmp_path / "page_001.jpg").write_bytes(b"old")
+
+    png = _png_bytes(512, 512)
+    download = writer.download_path(1)
+    download.write_bytes(png)
+    image = GeneratedImage(mime_type="image/png", size_bytes=len(png), path=str(download))
+
+    try:
+        output = asyncio.run(writer.write(1, image))
+    finally:
+        workers.shutdown()
+
+    assert output["image_path"] == str(tmp_path / "page_001.png")
+    assert (tmp_path / "page_001.png").read_bytes() == png
+    assert not (tmp_path / "page_001.jpg").exists()
+    assert not download.exists()
+
+    jpeg, webp = output["renditions"]
+    assert Image.open(jpeg["path"]).format == "JPEG"
+    assert Image.open(jpeg["path"]).info.get("progressive") == 1
+    assert Image.open(webp["path"]).size == (256, 256)
+    assert all(r["size_bytes"] > 0 and r["encode_s"] >= 0 for r in output["renditions"])
+
+
+def test_master_dropped_when_not_kept(tmp_path):
+    workers = ImageWorkerPool(max_workers=1)
+    writer = PageWriter(tmp_path, workers, keep_master=False, renditions=[{"format": "jpeg", "quality": 80}])
+    png = _png_bytes(64, 64)
+
+    try:
+        output = asyncio.run(writer.write(2, GeneratedImage(mime_type="image/png", size_bytes=len(png), data=png)))
+    finally:
+        workers.shutdown()
+
+    assert output["master"] is None
+    assert output["image_path"].endswith("renditions/page_002.jpg")
+    assert not (tmp_path / "page_002.png").exists()
+
+
+def test_previews_recorded_in_index(tmp_path):
+    workers = ImageWorkerPool(max_workers=2)
+    writer = PageWriter(tmp_path, workers, renditions=[], previews={"preview_width": 512, "thumbnail_width": 128})
+    png = _png_bytes(2048, 1536)
+
+    try:
+        for page_number in (1, 3):
+            asyncio.run(writer.write(page_number, GeneratedImage(mime_type="image/png", size_bytes=len(png), data=png)))
+    finally:
+        workers.shutdown()
+
+    # 重新加载索引，模拟服务重启
+    entries = PageIndex(tmp_path / "page_index.json").get_range(1, 3)
+    assert [entry["page_number"] for entry in entries] == [1, 3]
+
+    entry = entries[0]
+    assert entry["master"]["width"] == 2048
+    assert (entry["preview"]["width"], entry["preview"]["height"]) == (512, 384)
+    assert (entry["thumbnail"]["width"], entry["thumbnail"]["height"]) == (128, 96)
+    assert Image.open(entry["thumbnail"]["path"]).size == (128, 96)
@@ -0,0 +1,73 @@
+"""
+客户端限流测试
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加 src 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.rate_limit import RequestLimiter
+
+
+def test_concurrency_limit_is_fifo():
+    """并发不超过上限，等待者按到达顺序获得名额"""
+    async def run():
+        limiter = RequestLimiter(max_concurrent=2)
+        order = []
+        peak = 0
+
+        async def worker(index: int):
+            nonlocal peak
+            async with limiter.slot():
+                order.append(index)
+                peak = max(peak, limiter.active)
+                await asyncio.sleep(0.01)
+
+        tasks = []
+        for i in range(6):
+            tasks.append(asyncio.create_task(worker(i)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return limiter, order, peak
+
+    limiter, order, peak = asyncio.run(run())
+    assert order == list(range(6))
+    assert peak == 2
+    assert limiter.stats()["queue_depth"] == 0
+    assert limiter.stats()["max_wait_s"] > 0
+
+
+def test_token_bucket_spaces_requests():
+    """令牌用完后按速率放行"""
+    async def run():
+        limiter = RequestLimiter(max_concurrent=10, requests_per_minute=1200, burst=2)  # 20 次/秒
+        started = time.monotonic()
+        for _ in range(4):
+            async with limiter.slot():
+                pass
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    # 前 2 个立即放行，后 2 个各需等待约 50ms
+    assert 0.08 <= elapsed < 0.5
+
+
+def test_cancelled_waiter_does_not_block_queue():
+    """排队中被取消的请求不占用名额"""
+    async def run():
+        limiter = RequestLimiter(max_concurrent=1)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire())
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.wait_for(waiting, 1)
+        return limiter.active
+
+    assert asyncio.run(run()) == 1
@@ -0,0 +1,40 @@
+"""
+参考图外部存储测试
+"""
+
+import base64
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.character_manager import CharacterManager
+
+
+def test_legacy_library_is_migrated(tmp_path):
+    image_bytes = b"\xff\xd8fake-jpeg\xff\xd9"
+    data_url = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode()}"
+    image_path = tmp_path / "char_a.jpg"
+    legacy = {
+        "character_id": "char_a",
+        "name": "阿明",
+        "description": "测试",
+        "reference_image": {"base64": data_url, "path": str(image_path), "model_used": "m"},
+        "visual_features": {"hair_color": "黑", "clothing": "校服"},
+    }
+    (tmp_path / "char_a.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding="utf-8")
+
+    # 图片文件不存在时从内嵌数据写出
+    manager = CharacterManager(gemini_client=None, storage_dir=tmp_path)
+    assert image_path.read_bytes() == image_bytes
+
+    stored = json.loads((tmp_path / "char_a.json").read_text(encoding="utf-8"))
+    assert "base64" not in stored["reference_image"]
+    assert stored["reference_image"]["sha256"]
+
+    # 重启后按需从文件读取
+    manager = CharacterManager(gemini_client=None, storage_dir=tmp_path)
+    reference = manager.get_character("char_a").reference_image
+    assert reference.base64 is None
+    assert reference.load_base64() == data_url
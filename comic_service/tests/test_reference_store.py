@@ -0,0 +1,74 @@
+"""
+参考图库 SQLite 存储测试
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.reference_store import SqliteReferenceStore, ReferenceConflictError
+from src.image_gen.scene_manager import SceneManager
+
+
+def _scene(scene_id: str, name: str, directory: Path) -> dict:
+    return {
+        "scene_id": scene_id,
+        "name": name,
+        "description": "测试",
+        "reference_image": {"path": str(directory / f"{scene_id}.jpg"), "sha256": "x", "model_used": "m"},
+    }
+
+
+def _store(db_path: Path) -> SqliteReferenceStore:
+    store = SqliteReferenceStore(db_path, kind="scene", id_field="scene_id")
+    store.sync()
+    return store
+
+
+def test_stores_see_each_others_writes(tmp_path):
+    db_path = tmp_path / "library.db"
+    first, second = _store(db_path), _store(db_path)
+
+    version = first.save(_scene("scene_a", "街道", tmp_path))
+    assert version == 1
+    assert "scene_a" not in second
+    assert second.check_changes()
+    assert second.match_name("街道")["id"] == "scene_a"
+    assert not second.check_changes()
+
+    # 基于旧版本的写入被拒绝
+    second.save(_scene("scene_a", "老街", tmp_path), expected_version=1)
+    with pytest.raises(ReferenceConflictError):
+        first.save(_scene("scene_a", "新街", tmp_path), expected_version=1)
+    assert first.check_changes()
+    assert first.load("scene_a")["name"] == "老街"
+
+    assert second.delete("scene_a")
+    assert first.check_changes()
+    assert first.ids() == []
+
+
+def test_manager_drops_stale_objects(tmp_path):
+    db_path = tmp_path / "library.db"
+    first = SceneManager(gemini_client=None, storage_dir=tmp_path, store=_store(db_path))
+    second = SceneManager(gemini_client=None, storage_dir=tmp_path, store=_store(db_path))
+
+    json_dir = tmp_path / "json"
+    json_dir.mkdir()
+    for scene_id, name in (("scene_a", "街道"), ("scene_b", "教室")):
+        record = _scene(scene_id, name, tmp_path)
+        (json_dir / f"{scene_id}.json").write_text(json.dumps(record, ensure_ascii=False), encoding="utf-8")
+
+    assert first.import_json_library(json_dir) == {"imported": 2, "skipped": 0, "failed": 0}
+    assert first.import_json_library(json_dir) == {"imported": 0, "skipped": 2, "failed": 0}
+
+    assert second.get_scene_by_name("教室").scene_id == "scene_b"
+    scene = first.get_scene("scene_b")
+    scene.description = "放学后的教室"
+    first._save(scene)
+
+    assert second.get_scene("scene_b").description == "放学后的教室"
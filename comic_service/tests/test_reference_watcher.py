@@ -0,0 +1,50 @@
+"""
+参考图目录热加载测试
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.reference_watcher import ReferenceWatcher
+from src.image_gen.scene_manager import SceneManager
+
+
+def _write_scene(directory: Path, scene_id: str, name: str):
+    (directory / f"{scene_id}.jpg").write_bytes(b"jpeg")
+    record = {
+        "scene_id": scene_id,
+        "name": name,
+        "description": "测试",
+        "reference_image": {"path": str(directory / f"{scene_id}.jpg"), "sha256": "x", "model_used": "m"},
+    }
+    (directory / f"{scene_id}.json").write_text(json.dumps(record, ensure_ascii=False), encoding="utf-8")
+
+
+def test_polling_picks_up_changes(tmp_path):
+    _write_scene(tmp_path, "scene_a", "街道")
+    manager = SceneManager(gemini_client=None, storage_dir=tmp_path)
+    assert manager.get_scene("scene_a").name == "街道"
+
+    async def run():
+        watcher = ReferenceWatcher([manager], debounce=0.1, poll_interval=0.05, use_inotify=False)
+        await watcher.start()
+        await asyncio.sleep(0.1)
+
+        # 一批连续的修改合并为一次更新
+        _write_scene(tmp_path, "scene_b", "教室")
+        _write_scene(tmp_path, "scene_a", "老街")
+        for _ in range(40):
+            await asyncio.sleep(0.05)
+            if watcher.reloads:
+                break
+        await watcher.stop()
+        return watcher
+
+    watcher = asyncio.run(run())
+    assert watcher.reloads == 1
+    assert manager.get_scene_by_name("教室").scene_id == "scene_b"
+    assert manager.get_scene("scene_a").name == "老街"
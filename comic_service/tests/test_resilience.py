@@ -0,0 +1,75 @@
+"""
+重试策略与熔断器测试
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+# 添加 src 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.resilience import (
+    RetryPolicy, CircuitBreaker, CircuitOpenError, classify_error,
+    RATE_LIMIT, SERVER_ERROR, TIMEOUT, CLIENT_ERROR
+)
+
+
+def _status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://example.com")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def test_classify_and_should_retry():
+    """429/5xx 重试，4xx 不重试，超时只重试有限次"""
+    policy = RetryPolicy(max_attempts=4, timeout_retries=1)
+    assert classify_error(_status_error(429)) == RATE_LIMIT
+    assert classify_error(_status_error(503)) == SERVER_ERROR
+    assert classify_error(_status_error(400)) == CLIENT_ERROR
+    assert classify_error(httpx.ReadTimeout("timeout")) == TIMEOUT
+    assert classify_error(ValueError("x")) is None
+
+    assert policy.should_retry(RATE_LIMIT, attempt=1, timeouts=0)
+    assert not policy.should_retry(SERVER_ERROR, attempt=4, timeouts=0)
+    assert not policy.should_retry(CLIENT_ERROR, attempt=1, timeouts=0)
+    assert policy.should_retry(TIMEOUT, attempt=1, timeouts=1)
+    assert not policy.should_retry(TIMEOUT, attempt=2, timeouts=2)
+
+
+def test_backoff_honors_retry_after():
+    """有 Retry-After 时按其等待，否则在指数上限内抖动"""
+    policy = RetryPolicy(base_delay=1.0, max_delay=30.0)
+    assert policy.backoff(1, _status_error(429, {"Retry-After": "7"})) == 7.0
+    assert policy.backoff(1, _status_error(429, {"Retry-After": "999"})) == 30.0
+    for attempt in range(1, 6):
+        assert 0 <= policy.backoff(attempt, _status_error(503)) <= min(30.0, 2 ** (attempt - 1))
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """连续失败后熔断，冷却后放行一个探测请求"""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    try:
+        breaker.before_request()
+        raise AssertionError("熔断中应当拒绝请求")
+    except CircuitOpenError:
+        pass
+
+    time.sleep(0.06)
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    try:
+        breaker.before_request()
+        raise AssertionError("半开状态只放行一个探测请求")
+    except CircuitOpenError:
+        pass
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
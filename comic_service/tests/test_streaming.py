@@ -0,0 +1,72 @@
+"""
+流式响应解码测试
+"""
+
+import base64
+import io
+import random
+import sys
+from pathlib import Path
+
+# 添加 src 目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.streaming import InlineImageStreamDecoder, find_inline_mime_type
+
+
+def _build_body(data: bytes, escape_slash: bool = False) -> bytes:
+    b64 = base64.b64encode(data).decode()
+    if escape_slash:
+        b64 = b64.replace("/", "\\/")
+    return (
+        '{"candidates": [{"content": {"parts": [{"text": "说明"}, '
+        '{"inlineData": {"mimeType": "image/png", "data": "%s"}}]}}]}' % b64
+    ).encode("utf-8")
+
+
+def _decode(body: bytes, chunk_sizes) -> InlineImageStreamDecoder:
+    decoder = InlineImageStreamDecoder(io.BytesIO())
+    pos = 0
+    while pos < len(body):
+        size = next(chunk_sizes)
+        decoder.feed(body[pos:pos + size])
+        pos += size
+    decoder.close()
+    return decoder
+
+
+def test_decode_random_chunks():
+    """任意切块都能还原图片字节，骨架中 data 被置空"""
+    rng = random.Random(0)
+    data = bytes(rng.randrange(256) for _ in range(5000))
+
+    for escape_slash in (False, True):
+        body = _build_body(data, escape_slash)
+        for _ in range(50):
+            decoder = _decode(body, iter(lambda: rng.randint(1, 64), None))
+            assert decoder.found
+            assert decoder.sink.getvalue() == data
+
+            result = decoder.skeleton_json()
+            assert result["candidates"][0]["content"]["parts"][1]["inlineData"]["data"] == ""
+            assert find_inline_mime_type(result) == "image/png"
+
+
+def test_no_inline_data_keeps_full_skeleton():
+    """没有 inlineData 时完整保留响应，供 Markdown 图片回退解析"""
+    body = b'{"candidates": [{"content": {"parts": [{"text": "![img](data:image/png;base64,AAAA)"}]}}]}'
+    decoder = _decode(body, iter(lambda: 7, None))
+    assert not decoder.found
+    assert decoder.skeleton_json()["candidates"][0]["content"]["parts"][0]["text"].endswith("AAAA)")
+
+
+def test_truncated_response_raises():
+    """图片数据未结束时报错"""
+    body = _build_body(b"x" * 300)[:200]
+    decoder = InlineImageStreamDecoder(io.BytesIO())
+    decoder.feed(body)
+    try:
+        decoder.close()
+    except ValueError:
+        return
+    raise AssertionError("截断的响应应当报错")
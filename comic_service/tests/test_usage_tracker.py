@@ -0,0 +1,59 @@
+"""
+参考图使用统计测试
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen.reference_store import JsonReferenceStore, SqliteReferenceStore
+from src.image_gen.usage_tracker import UsageTracker
+
+
+def test_usage_is_written_in_batches(tmp_path):
+    store = JsonReferenceStore(tmp_path, id_field="scene_id")
+    tracker = UsageTracker(store, flush_interval=0)
+
+    for _ in range(3):
+        tracker.record(["scene_a", "scene_b"])
+    tracker.record(["scene_a"])
+    assert not store.usage_path.exists()
+    assert tracker.get("scene_a")["usage_count"] == 4
+
+    assert tracker.flush() == 2
+    assert tracker.flush() == 0
+    assert store.load_usage()["scene_b"]["usage_count"] == 3
+
+    # 重启后从存储读取
+    tracker = UsageTracker(JsonReferenceStore(tmp_path, id_field="scene_id"))
+    tracker.record(["scene_b"])
+    tracker.record(["scene_b"])
+    assert [u["id"] for u in tracker.hottest()] == ["scene_b", "scene_a"]
+    assert tracker.get("scene_b")["usage_count"] == 5
+
+
+def test_stop_flushes_pending(tmp_path):
+    async def run():
+        tracker = UsageTracker(JsonReferenceStore(tmp_path, id_field="scene_id"), flush_interval=60)
+        await tracker.start()
+        tracker.record(["scene_a"])
+        await tracker.stop()
+        return tracker.store.load_usage()
+
+    assert asyncio.run(run())["scene_a"]["usage_count"] == 1
+
+
+def test_sqlite_counts_from_processes_add_up(tmp_path):
+    db_path = tmp_path / "library.db"
+    first = UsageTracker(SqliteReferenceStore(db_path, kind="scene", id_field="scene_id"))
+    second = UsageTracker(SqliteReferenceStore(db_path, kind="scene", id_field="scene_id"))
+
+    first.record(["scene_a"])
+    second.record(["scene_a"])
+    second.record(["scene_a"])
+    first.flush()
+    second.flush()
+
+    assert second.get("scene_a")["usage_count"] == 3
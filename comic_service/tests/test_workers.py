@@ -0,0 +1,103 @@
+"""
+图片处理工作池测试
+"""
+
+import asyncio
+import base64
+import io
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.image_gen import image_processing
+from src.image_gen.workers import ImageWorkerPool
+
+
+def _png_data_url(width: int, height: int) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (width, height), (200, 40, 40, 255)).save(buffer, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def test_compress_in_thread_pool():
+    pool = ImageWorkerPool(kind="thread", max_workers=2)
+
+    async def run():
+        return await asyncio.gather(*[
+            pool.run(image_processing.compress_base64_image, _png_data_url(2048, 1024), max_width=1024)
+            for _ in range(3)
+        ])
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    for result in results:
+        assert result.startswith("data:image/jpeg;base64,")
+        img = Image.open(io.BytesIO(base64.b64decode(result.split(",", 1)[1])))
+        assert img.size == (1024, 512)
+    assert pool.stats()["completed"] == 3
+
+
+def test_save_in_process_pool(tmp_path):
+    pool = ImageWorkerPool(kind="process", max_workers=1)
+    output = tmp_path / "ref.jpg"
+
+    try:
+        saved = asyncio.run(pool.run(image_processing.save_base64_image, _png_data_url(64, 64), output))
+    finally:
+        pool.shutdown()
+
+    assert saved == output
+    assert Image.open(output).format == "JPEG"
+
+
+def test_ingest_reference_writes_same_bytes(tmp_path):
+    output = tmp_path / "char.jpg"
+    result = image_processing.ingest_reference(_png_data_url(1600, 800), output)
+
+    data = base64.b64decode(result["data_url"].split(",", 1)[1])
+    assert output.read_bytes() == data
+    assert result["size_bytes"] == len(data)
+    assert Image.open(output).size == (1024, 512)
+
+
+def test_resize_modes_produce_target_size():
+    buffer = io.BytesIO()
+    Image.new("RGB", (4096, 2048), (10, 120, 200)).save(buffer, format="JPEG")
+    jpeg = buffer.getvalue()
+
+    for mode in image_processing.RESIZE_MODES:
+        img = image_processing.load_resized(jpeg, max_width=1024, resize_mode=mode)
+        assert img.size == (1024, 512)
+        assert img.mode == "RGB"
+
+    try:
+        image_processing.load_resized(jpeg, resize_mode="turbo")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知策略应抛出 ValueError")
+
+
+def test_balanced_drafts_jpeg_at_half_size(monkeypatch):
+    decoded = []
+    resize = Image.Image.resize
+
+    def record(self, *args, **kwargs):
+        decoded.append(self.size)
+        return resize(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "resize", record)
+
+    for width in (1792, 2048, 3584, 4096):
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, width), (10, 120, 200)).save(buffer, format="JPEG")
+        image_processing.load_resized(buffer.getvalue(), max_width=1024, resize_mode="balanced")
+
+    # 不到 2 倍全尺寸解码；2 倍以上按 1/2 解码，4 倍时保留 2 倍余量
+    assert [size[0] for size in decoded] == [1792, 1024, 1792, 2048]